@@ -0,0 +1,110 @@
+"""
+Per-prefix cost of labelled unicast NLRI encoding: the netaddr based
+IPv4LabelledUnicast.construct of the baseline tree (copied verbatim
+below) vs the current construct, which goes through the batch encoder.
+
+Both are called the way update.py calls them, with a list of
+{prefix: label} dicts. The prefixes are /16, /24 and /32 only, the
+baseline rounds other lengths up to whole octets and cannot encode /8.
+
+    python benchmarks/bench_nlri_encode.py [count ...]
+"""
+import os
+import struct
+import sys
+import time
+
+import netaddr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message.attribute.nlri.labelledunicast import IPv4LabelledUnicast
+
+REPEAT = 3
+
+
+class BaselineIPv4LabelledUnicast(object):
+    """
+    construct and generate_nlri_subobj as in the baseline commit
+    """
+
+    @classmethod
+    def construct(cls,bgp_prefix_sid_list):
+        nlri = b''
+        for prefix_label in bgp_prefix_sid_list:
+            for prefix,label_value in prefix_label.items():
+                nlri += cls.generate_nlri_subobj(prefix,label_value)
+        return nlri
+
+    @staticmethod
+    def generate_nlri_subobj(prefix,label_value):
+        packed_sub_obj = b''
+        BOS=1
+        label = label_value
+        prefix_sid,prefix_mask = prefix.split("/")
+        if int(prefix_mask) % 8 == 0:
+            prefix_len = int (int(prefix_mask) / 8)
+        else:
+            prefix_len = int (int(prefix_mask) / 8) + 1
+        length = ((prefix_len + 3) * 8) << 24
+        label_stack_msg = (label << 4 | BOS)
+        len_label_obj = length | label_stack_msg
+        packed_len_label_obj = struct.pack("!I",len_label_obj)
+        if prefix_len == 4:
+            packed_ip_obj = netaddr.IPAddress(prefix_sid).packed
+        elif prefix_len == 3:
+            ip_obj = netaddr.IPAddress(prefix_sid)
+            ip_obj1 = ip_obj >> 16
+            packed_sub_ip_obj1 = struct.pack('!H',ip_obj1)
+            prefix_sid1 = ip_obj & 0x0000FF00
+            prefix_sid2 = prefix_sid1 >> 8
+            packed_sub_ip_obj2 = struct.pack('!B',prefix_sid2)
+            packed_ip_obj = packed_sub_ip_obj1+packed_sub_ip_obj2
+        elif prefix_len == 2:
+            ip_obj = netaddr.IPAddress(prefix_sid)
+            prefix_sid1 = ip_obj >> 16
+            packed_ip_obj = struct.pack('!H',prefix_sid1)
+        elif prefix_len == 1:
+            ip_obj = netaddr.IPAddress(prefix_sid)
+            prefix_sid1 = ip_obj >> 24
+            packed_ip_obj = struct.pack('!B',ip_obj)
+        packed_sub_obj = packed_len_label_obj + packed_ip_obj
+
+        return packed_sub_obj
+
+
+def make_routes(count):
+    routes = []
+    for i in range(count):
+        prefix_len = (16, 24, 32)[i % 3]
+        network = ((10 << 24) | (i * 2654435761 >> 8)) & (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF
+        routes.append({'%s/%s' % (netaddr.IPAddress(network), prefix_len): i & 0xFFFFF})
+    return routes
+
+
+def timeit(func, routes):
+    """
+    :return: best of REPEAT runs in seconds, and the result
+    """
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(routes)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(counts):
+    print('%10s %18s %18s %8s' % ('prefixes', 'baseline ns/pfx', 'current ns/pfx', 'speedup'))
+    for count in counts:
+        routes = make_routes(count)
+        baseline_time, baseline = timeit(BaselineIPv4LabelledUnicast.construct, routes)
+        current_time, current = timeit(IPv4LabelledUnicast.construct, routes)
+        assert current == baseline
+        print('%10d %18.0f %18.0f %7.1fx' % (
+            count, baseline_time / count * 1e9, current_time / count * 1e9, baseline_time / current_time))
+
+
+if __name__ == '__main__':
+    main([int(c) for c in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,56 @@
+"""
+Memory per route of core.rib.AdjRIB and insert/lookup/withdraw speed.
+
+    python benchmarks/bench_rib_memory.py [routes]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.rib import AdjRIB
+from message.attribute.nlri.prefix import MASKS
+
+
+def make_prefixes(count):
+    random.seed(4271)
+    lengths = [32] * 6 + [24] * 3 + [16]
+    prefixes = set()
+    while len(prefixes) < count:
+        prefix_len = random.choice(lengths)
+        prefixes.add((random.getrandbits(32) & MASKS[prefix_len], prefix_len))
+    return list(prefixes)
+
+
+def main(count):
+    prefixes = make_prefixes(count)
+    attr_sets = [{1: 0, 2: [(2, [65000 + i])], 5: 100} for i in range(16)]
+
+    start = time.perf_counter()
+    rib = AdjRIB()
+    for i, prefix in enumerate(prefixes):
+        rib.insert(prefix, attr_sets[i & 15], 16000 + (i & 0xFFFF))
+    insert_time = time.perf_counter() - start
+    # trie arrays plus the interned attribute sets
+    used = rib.memory_usage() + sum(sys.getsizeof(s) for s in rib.attr_sets.sets)
+
+    start = time.perf_counter()
+    for network, _ in prefixes[:100000]:
+        rib.longest_match(network)
+    lookup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for prefix in prefixes:
+        rib.withdraw(prefix)
+    withdraw_time = time.perf_counter() - start
+
+    print('routes=%d nodes=%d' % (count, len(rib.network)))
+    print('memory %.1f MB, %.1f bytes/route' % (used / 1e6, float(used) / count))
+    print('insert %.2f us, lpm %.2f us, withdraw %.2f us per route' % (
+        insert_time / count * 1e6, lookup_time / min(count, 100000) * 1e6, withdraw_time / count * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,98 @@
+"""
+Keepalive/hold timer churn for many peers, one heap entry per timer
+(what reactor.callLater does) vs core.timerwheel.TimerWheel.
+
+    python benchmarks/bench_timer_wheel.py [peers]
+"""
+import heapq
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.timerwheel import TimerWheel
+
+KEEPALIVE = 30
+HOLD = 90
+SIMULATED_SECONDS = 300
+
+
+class HeapTimers(object):
+    """
+    callLater style timers: every reset pushes a new heap entry and
+    cancels the old one lazily
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.heap = []
+        self.seq = 0
+
+    def reset(self, timer, seconds):
+        self.seq += 1
+        timer[0] = self.seq
+        heapq.heappush(self.heap, (self.clock() + seconds, self.seq, timer))
+
+    def run(self):
+        now = self.clock()
+        while self.heap and self.heap[0][0] <= now:
+            _, seq, timer = heapq.heappop(self.heap)
+            if timer[0] == seq:
+                timer[1]()
+
+
+def run_heap(peers, now):
+    timers = HeapTimers(lambda: now[0])
+    fired = [0]
+    for _ in range(peers):
+        ka = [0, None]
+
+        def on_ka(ka=ka):
+            fired[0] += 1
+            timers.reset(ka, KEEPALIVE)
+        ka[1] = on_ka
+        timers.reset(ka, KEEPALIVE)
+        hold = [0, lambda: None]
+        timers.reset(hold, HOLD)
+        # every received keepalive re-arms the hold timer
+        for _ in range(10):
+            timers.reset(hold, HOLD)
+    for second in range(SIMULATED_SECONDS):
+        now[0] = second
+        timers.run()
+    return fired[0]
+
+
+def run_wheel(peers, now):
+    wheel = TimerWheel(resolution=1.0, clock=lambda: now[0])
+    fired = [0]
+    for _ in range(peers):
+        ka = wheel.timer(None)
+
+        def on_ka(ka=ka):
+            fired[0] += 1
+            ka.reset(KEEPALIVE)
+        ka.callable = on_ka
+        ka.reset(KEEPALIVE)
+        hold = wheel.timer(lambda: None)
+        hold.reset(HOLD)
+        for _ in range(10):
+            hold.reset(HOLD)
+    for second in range(SIMULATED_SECONDS):
+        now[0] = second
+        wheel.tick()
+    return fired[0]
+
+
+def main(peers):
+    for name, func in (('heap (callLater)', run_heap), ('timer wheel', run_wheel)):
+        start = time.perf_counter()
+        fired = func(peers, [0.0])
+        elapsed = time.perf_counter() - start
+        print('%-18s peers=%d keepalives fired=%d %.3fs (%.2f us/timer op)' % (
+            name, peers, fired, elapsed, elapsed / (peers * 12 + fired) * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
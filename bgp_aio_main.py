@@ -0,0 +1,67 @@
+import functools
+import logging
+
+from core.aio import AsyncioSpeaker, run
+from core.config import ConfigReloader
+from core.metrics import Metrics
+from core.profiling import PROFILER
+from core.offload import CodecPool
+from core.timerwheel import TimerWheel
+from core.workers import Supervisor, reuseport_socket
+
+BGPADDR='0.0.0.0'
+BGPPORT=179
+MY_ASN=1
+BGP_ID='172.16.2.1'
+HOLD_TIME=180
+# >1 forks that many SO_REUSEPORT workers, None for one per core
+WORKERS=1
+# >0 runs bulk UPDATE encode/decode in that many processes
+CODEC_WORKERS=0
+# bytes of UPDATEs below which encode/decode stays in the event loop
+OFFLOAD_THRESHOLD=64*1024
+# Prometheus metrics on http://METRICS_ADDR:METRICS_PORT/metrics, worker n
+# listens on METRICS_PORT+n, None disables them
+METRICS_ADDR='127.0.0.1'
+METRICS_PORT=9179
+# unix socket taking profiling commands ("start", "stop", "report"),
+# worker n appends .n, None disables it. SIGUSR1 toggles profiling too.
+PROFILE_CONTROL='bgp-profile.sock'
+# stack samples of a profiling run, worker n appends .n, None disables sampling
+PROFILE_SAMPLES='bgp-profile.folded'
+MY_CAPABILITY={'route_refresh': False, 'four_bytes_as': False, 'cisco_route_refresh': False, 'afi_safi': [(1, 4)], 'graceful_restart': False}
+
+
+def bgp_worker(worker_id,config):
+    codec_pool = None
+    if CODEC_WORKERS:
+        codec_pool = CodecPool(CODEC_WORKERS,OFFLOAD_THRESHOLD)
+    if PROFILE_SAMPLES is not None:
+        PROFILER.default_sample_path = '%s.%s' % (PROFILE_SAMPLES,worker_id)
+    metrics = None
+    metrics_address = None
+    if METRICS_PORT is not None:
+        metrics = Metrics(PROFILER)
+        metrics_address = (METRICS_ADDR,METRICS_PORT+worker_id)
+    profile_control = None
+    if PROFILE_CONTROL is not None:
+        profile_control = '%s.%s' % (PROFILE_CONTROL,worker_id)
+    speaker = AsyncioSpeaker(MY_ASN,BGP_ID,MY_CAPABILITY,hold_time=HOLD_TIME,
+                             timer_wheel=TimerWheel(),codec_pool=codec_pool,config=config,metrics=metrics,
+                             profiler=PROFILER)
+    run(speaker,sock=reuseport_socket(BGPADDR,BGPPORT),metrics_address=metrics_address,
+        profile_control=profile_control)
+
+
+def main (workers=WORKERS):
+    logging.basicConfig(level=logging.INFO)
+    # loaded once before forking, the workers share it copy-on-write
+    config = ConfigReloader('BGP_PREFIX_SID.json')
+    if workers == 1:
+        bgp_worker(0,config)
+    else:
+        Supervisor(functools.partial(bgp_worker,config=config),workers).run()
+
+
+if __name__ == '__main__':
+    main()
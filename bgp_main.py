@@ -1,62 +1,206 @@
 __author__ = 'dipsingh'
 
+import functools
 import json
+import logging
+import os
+import signal
 import socket
 import gevent
 import json
 import time
 from bgp_parse import BGPHandler as BGPHandler
+from bgp_parse import MY_CAPABILITY
 from bgp_send import BGPSend as BGPSend
 from message.update import Update
+from core.config import ConfigReloader
+from core.framer import BGPFramer
+from core.metrics import Metrics, serve_metrics
+from core.profiling import PROFILER, serve_control
+from core.outqueue import KeyedQueue, OutQueue
+from core.timerwheel import TimerWheel
+from core.updategroup import UpdateGroupManager, negotiated_capabilities
+from core.workers import Supervisor, reuseport_socket
+from common import constants as bgp_cons
+from common.log import MessageSummary, RateLimitedLogger
 from gevent import monkey
+from gevent.event import Event
 monkey.patch_socket()
 
 MAXCLIENTS = 10
 BGPADDR='0.0.0.0'
 BGPPORT=179
+# >1 forks that many SO_REUSEPORT workers, None for one per core
+WORKERS=1
+# seconds between checks of the config file for changes
+CONFIG_INTERVAL=5
 
-def send_bgp_ka(client_sock,bgp_handler):
+LOG = logging.getLogger(__name__)
+LOG_LIMITED = RateLimitedLogger(LOG)
+# seconds between "N messages sent" log lines
+SUMMARY_INTERVAL=60
+# Prometheus metrics on http://METRICS_ADDR:METRICS_PORT/metrics, worker n
+# listens on METRICS_PORT+n, None disables them
+METRICS_ADDR='127.0.0.1'
+METRICS_PORT=9179
+# unix socket taking profiling commands ("start", "stop", "report"),
+# worker n appends .n, None disables it. SIGUSR1 toggles profiling too.
+PROFILE_CONTROL='bgp-profile.sock'
+# stack samples of a profiling run, worker n appends .n, None disables sampling
+PROFILE_SAMPLES='bgp-profile.folded'
+
+TIMER_WHEEL = TimerWheel()
+METRICS = Metrics(PROFILER)
+UPDATE_GROUPS = UpdateGroupManager(METRICS)
+SENT = MessageSummary(LOG,SUMMARY_INTERVAL)
+
+def drive_timer_wheel(wheel):
+    while True:
+        wheel.tick()
+        gevent.sleep(wheel.resolution)
+
+def write_out_queue(out_queue,wakeup):
+    while True:
+        wakeup.wait()
+        wakeup.clear()
+        out_queue.drain()
+
+def feed_out_queue(out_queue,backlog,ready,resumed):
+    # UPDATEs wait in backlog (references to the update group's encoded
+    # messages) while the output queue is above its high watermark, a
+    # newer UPDATE of the same route replaces a waiting one
     while True:
-        client_sock.send(bgp_handler.bgp_send_ka())
-        print ("KeepAlive Sent")
-        gevent.sleep(bgp_handler._bgp_ka)
-
-def parse_config(pce_config_file):
-    bgp_prefix_sid_list = list()
-    with open(pce_config_file) as data_file:
-        msg_dict= json.load(data_file)
-    for key in msg_dict:
-        if key == 'BGP_PREFIX_SID':
-            for prefix_sid in data[key]:
-                for bgp_prefix in prefix_sid:
-                    bgp_prefix_sid_list.append((bgp_prefix,prefix_sid[bgp_prefix]))
-    return (tuple(bgp_prefix_sid_list),msg_dict)
-
-
-
-def bgp_handler(client_sock,parsed_prefix_list,msg_dict):
-    print ("Message Recieved from ",client_sock[1])
-    bgp_handler= BGPHandler()
-    bgp_send = BGPSend()
-    message_recvd = client_sock[0].recv(1000)
-    open_msg=bgp_handler.parse_recvd_msg(message_recvd)
-    client_sock[0].send(open_msg)
-    ka_greenlet = gevent.spawn(send_bgp_ka,client_sock[0],bgp_handler)
-
-    send_upd_msg = Update.construct(msg_dict)
-    print ("sending Update Message",send_upd_msg)
-    client_sock[0].send(send_upd_msg)
-
-
-
-def main ():
-    bgp_server_sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
-    parsed_prefix_list,msg_dict =parse_config('BGP_PREFIX_SID.json')
-    bgp_server_sock.bind((BGPADDR,BGPPORT))
-    bgp_server_sock.listen(MAXCLIENTS)
+        ready.wait()
+        ready.clear()
+        while backlog:
+            if out_queue.paused:
+                resumed.clear()
+                resumed.wait()
+                continue
+            key,msg = backlog.popleft()
+            out_queue.enqueue(msg,key)
+
+def send_bgp_ka(out_queue,bgp_handler,ka_timer,peer_metrics):
+    out_queue.enqueue_keepalive(bgp_handler.bgp_send_ka())
+    SENT.count('KEEPALIVE',bgp_cons.HDR_LEN)
+    peer_metrics.sent(bgp_cons.MSG_KEEPALIVE,bgp_cons.HDR_LEN)
+    ka_timer.reset(bgp_handler._bgp_ka)
+
+def advertise_config(msg_dict,updates):
+    for update in updates:
+        UPDATE_GROUPS.advertise(update)
+        for peer_id in UPDATE_GROUPS.peer_group:
+            METRICS.peer(peer_id).count_advertised(update)
+
+def watch_config(config):
+    while True:
+        gevent.sleep(CONFIG_INTERVAL)
+        config.check()
+
+
+
+def send_update(backlog,ready,peer_metrics,add_path):
+    def send(msg):
+        backlog.append(msg,Update.route_key(msg,add_path))
+        ready.set()
+        SENT.count('UPDATE',len(msg))
+        peer_metrics.sent(bgp_cons.MSG_UPDATE,len(msg))
+    return send
+
+def bgp_handler(client_sock,config):
+    # peers are known by IP address, as in the asyncio speaker
+    peer_id = client_sock[1][0]
+    LOG_LIMITED.info('[%s]TCP Connection established',peer_id)
+    ka_timer = None
+    greenlets = []
+    joined = False
+    try:
+        bgp_handler= BGPHandler()
+        framer = BGPFramer()
+        frames = framer.read_frames(client_sock[0])
+        peer_metrics = METRICS.peer(peer_id)
+        open_msg = None
+        for msg_type,msg in frames:
+            peer_metrics.received(msg_type,bgp_cons.HDR_LEN+len(msg))
+            if msg_type == bgp_cons.MSG_OPEN:
+                open_msg = bgp_handler.process_msg(msg_type,msg)
+                break
+        if open_msg is None:
+            return
+        # the OPEN goes out before the queue (and its priority KEEPALIVEs) starts
+        client_sock[0].sendall(open_msg)
+        peer_metrics.sent(bgp_cons.MSG_OPEN,len(open_msg))
+        wakeup = Event()
+        ready = Event()
+        resumed = Event()
+        backlog = KeyedQueue()
+        out_queue = OutQueue(client_sock[0],notify=wakeup.set,on_resume=resumed.set)
+        greenlets.append(gevent.spawn(write_out_queue,out_queue,wakeup))
+        greenlets.append(gevent.spawn(feed_out_queue,out_queue,backlog,ready,resumed))
+        peer_metrics.queue_depth = lambda: out_queue.pending_bytes + backlog.nbytes
+        ka_timer = TIMER_WHEEL.timer(lambda: send_bgp_ka(out_queue,bgp_handler,ka_timer,peer_metrics))
+        ka_timer.reset(0)
+
+        capabilities = negotiated_capabilities(MY_CAPABILITY,bgp_handler.peer_open["Capabilities"])
+        update_group = UPDATE_GROUPS.join(peer_id,send_update(backlog,ready,peer_metrics,capabilities['add_path']),capabilities)
+        joined = True
+        update_group.send_table(peer_id,config.msg_dict)
+        peer_metrics.count_advertised(config.msg_dict)
+
+        # drain whatever the peer sends (keepalives) until it closes
+        for msg_type,msg in frames:
+            peer_metrics.received(msg_type,bgp_cons.HDR_LEN+len(msg))
+    except Exception as e:
+        LOG_LIMITED.error('[%s]session failed: %s',peer_id,e)
+    finally:
+        if ka_timer is not None:
+            ka_timer.cancel()
+        gevent.killall(greenlets)
+        if joined:
+            UPDATE_GROUPS.leave(peer_id)
+        client_sock[0].close()
+        LOG_LIMITED.info('[%s]TCP Connection lost',peer_id)
+
+
+
+def serve(bgp_server_sock,config):
+    gevent.spawn(drive_timer_wheel,TIMER_WHEEL)
+    config.on_change = advertise_config
+    gevent.signal_handler(signal.SIGHUP,config.reload)
+    gevent.spawn(watch_config,config)
     while True:
         client_sock = bgp_server_sock.accept()
-        gevent.spawn(bgp_handler,client_sock,parsed_prefix_list,msg_dict)
+        gevent.spawn(bgp_handler,client_sock,config)
+
+
+def profile_control_socket(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(5)
+    return sock
+
+def bgp_worker(worker_id,config):
+    if PROFILE_SAMPLES is not None:
+        PROFILER.default_sample_path = '%s.%s' % (PROFILE_SAMPLES,worker_id)
+    gevent.signal_handler(signal.SIGUSR1,PROFILER.toggle)
+    gevent.signal_handler(signal.SIGUSR2,PROFILER.log_report)
+    if PROFILE_CONTROL is not None:
+        gevent.spawn(serve_control,PROFILER,profile_control_socket('%s.%s' % (PROFILE_CONTROL,worker_id)))
+    if METRICS_PORT is not None:
+        gevent.spawn(serve_metrics,METRICS,socket.create_server((METRICS_ADDR,METRICS_PORT+worker_id)))
+    serve(reuseport_socket(BGPADDR,BGPPORT,MAXCLIENTS),config)
+
+
+def main (workers=WORKERS):
+    logging.basicConfig(level=logging.INFO)
+    # loaded once before forking, the workers share it copy-on-write
+    config = ConfigReloader('BGP_PREFIX_SID.json')
+    if workers == 1:
+        bgp_worker(0,config)
+    else:
+        Supervisor(functools.partial(bgp_worker,config=config),workers).run()
 
 
 if __name__ == '__main__':
@@ -1,23 +1,32 @@
+import logging
 import struct
+from common.log import RateLimitedLogger
 from message.open import Open as Open
 from message.keepalive import KeepAlive as KeepAlive
 import netaddr
 
+LOG = RateLimitedLogger(logging.getLogger(__name__))
+# capabilities sent in our OPEN
+MY_CAPABILITY = {'route_refresh': False, 'four_bytes_as': False, 'cisco_route_refresh': False, 'afi_safi': [(1, 4)], 'graceful_restart': False}
 
 class BGPHandler(object):
     def __init__(self):
         self._bgp_ka= 10
+        self.peer_open = None
 
     def parse_recvd_msg(self,message):
         msg_len,msg_type,msg = self.common_header(message)
-        my_capability = {'route_refresh': False, 'four_bytes_as': False, 'cisco_route_refresh': False, 'afi_safi': [(1, 4)], 'graceful_restart': False}
+        return self.process_msg(msg_type,msg)
+
+    def process_msg(self,msg_type,msg):
         if msg_type == 1:
-            parsed_open_message = self.open_parse(msg)
+            parsed_open_message = self.open_parse(bytes(msg))
+            self.peer_open = parsed_open_message
             if parsed_open_message["Capabilities"]["afi_safi"][0] == (1,4):
-                open_msg = self.send_open(my_capability)
+                open_msg = self.send_open(MY_CAPABILITY)
                 return open_msg
             else:
-                print ("Neighbor doesnt have v4 Labelled Unicast enabled",parsed_open_message["Capabilities"]["afi_safi"][0])
+                LOG.warning("Neighbor doesnt have v4 Labelled Unicast enabled, afi/safi %s",parsed_open_message["Capabilities"]["afi_safi"][0])
 
     def common_header(self,message):
         length,msg_type = struct.unpack('!HB',message[16:19])
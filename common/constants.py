@@ -75,6 +75,10 @@ BGPTYPE_LINK_STATE = 99
 BGPTYPE_ATTRIBUTE_SET = 128
 BGP_PREFIX_SID = 40 # 40
 
+# BGP Prefix-SID TLV types (RFC 8669)
+BGP_PREFIX_SID_LABEL_INDEX = 1
+BGP_PREFIX_SID_ORIGINATOR_SRGB = 3
+
 #  VPN Route Target  #
 BGP_EXT_COM_RT_0 = 0x0002  # Route Target,Format AS(2bytes):AN(4bytes)
 BGP_EXT_COM_RT_1 = 0x0102  # Route Target,Format IPv4 address(4bytes):AN(2bytes)
@@ -0,0 +1,132 @@
+"""
+Logging helpers for per message code paths.
+
+Nothing here formats a message unless the record is going to be
+emitted: arguments are passed to logging lazily, hex dumps are only
+rendered by HexDump.__str__, and RateLimitedLogger drops records of a
+call site that logs faster than its budget before they are built.
+"""
+import binascii
+import logging
+import sys
+import time
+
+
+class HexDump(object):
+    """
+    Lazy hex rendering of packed bytes, LOG.debug('%s', HexDump(msg))
+    costs nothing when DEBUG is off
+    """
+
+    __slots__ = ('data', 'limit')
+
+    def __init__(self, data, limit=256):
+        self.data = data
+        self.limit = limit
+
+    def __str__(self):
+        data = bytes(self.data[:self.limit])
+        text = binascii.hexlify(data).decode()
+        if len(self.data) > self.limit:
+            text += '...(%s bytes)' % len(self.data)
+        return text
+
+
+class RateLimitedLogger(object):
+    """
+    Wraps a logger and lets every call site emit at most burst records per
+    interval seconds. Records over the budget are counted, the next one
+    emitted from that call site is preceded by how many were suppressed.
+
+    A call site is the (file, line) of the caller unless key is passed.
+    """
+
+    def __init__(self, logger, interval=10.0, burst=5, clock=time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        # key -> [window start, records emitted, records suppressed]
+        self.sites = {}
+
+    def _allow(self, key):
+        now = self.clock()
+        site = self.sites.get(key)
+        if site is None or now - site[0] >= self.interval:
+            suppressed = site[2] if site is not None else 0
+            self.sites[key] = [now, 1, 0]
+            return True, suppressed
+        if site[1] < self.burst:
+            site[1] += 1
+            return True, 0
+        site[2] += 1
+        return False, 0
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        frame = sys._getframe(1)
+        stacklevel = 2
+        # skip the debug()/info()/... wrappers below
+        if frame.f_code.co_filename == __file__:
+            frame = frame.f_back
+            stacklevel = 3
+        key = kwargs.pop('key', None)
+        if key is None:
+            key = (frame.f_code.co_filename, frame.f_lineno)
+        allowed, suppressed = self._allow(key)
+        if not allowed:
+            return
+        # records point at the caller, not at this module
+        kwargs.setdefault('stacklevel', stacklevel)
+        if suppressed:
+            self.logger.log(level, '%s similar messages suppressed', suppressed, stacklevel=kwargs['stacklevel'])
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+
+class MessageSummary(object):
+    """
+    Counts messages instead of logging each of them and logs one
+    "N <type> messages (B bytes) sent in the last S seconds" line per
+    message type every interval seconds.
+    """
+
+    def __init__(self, logger, interval=60.0, verb='sent', level=logging.INFO, clock=time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self.verb = verb
+        self.level = level
+        self.clock = clock
+        # message type -> [messages, bytes]
+        self.counts = {}
+        self.started = clock()
+
+    def count(self, msg_type, nbytes=0):
+        counts = self.counts.get(msg_type)
+        if counts is None:
+            counts = self.counts[msg_type] = [0, 0]
+        counts[0] += 1
+        counts[1] += nbytes
+        if self.clock() - self.started >= self.interval:
+            self.flush()
+
+    def flush(self):
+        now = self.clock()
+        if self.logger.isEnabledFor(self.level):
+            for msg_type, (messages, nbytes) in sorted(self.counts.items()):
+                self.logger.log(self.level, '%s %s messages (%s bytes) %s in the last %.0f seconds',
+                                messages, msg_type, nbytes, self.verb, now - self.started)
+        self.counts = {}
+        self.started = now
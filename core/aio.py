@@ -0,0 +1,341 @@
+import asyncio
+import collections
+import logging
+import os
+import signal
+import socket
+import traceback
+
+from common import constants as bgp_cons
+from common import exception as excep
+from core.fsm import FSM
+from core.outqueue import KeyedQueue
+from core.rib import LocRIB
+from core.session import BGPSession
+from core.updategroup import UpdateGroupManager
+from message.update import Update
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+LOG = logging.getLogger(__name__)
+
+
+class AsyncioTimer(object):
+    """
+    BGPTimer interface on top of loop.call_later
+    """
+
+    def __init__(self, call_able, loop=None):
+        self.handle = None
+        self.callable = call_able
+        self.loop = loop
+
+    def cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def reset(self, seconds_fromnow):
+        self.cancel()
+        loop = self.loop or asyncio.get_running_loop()
+        self.handle = loop.call_later(seconds_fromnow, self._fire)
+
+    def _fire(self):
+        self.handle = None
+        self.callable()
+
+    def active(self):
+        return self.handle is not None
+
+
+class AsyncioBGP(BGPSession, asyncio.Protocol):
+    """
+    One peer session on an asyncio transport, data_received comes from BGPSession
+    """
+
+    def __init__(self, factory):
+        super(AsyncioBGP, self).__init__()
+        self.factory = factory
+        self.transport = None
+        self.paused = False
+        # UPDATEs held back while the transport is paused, written in order,
+        # a newer UPDATE of the same route replaces a waiting one
+        self._backlog = KeyedQueue()
+        # UPDATE batches being decoded by the codec pool, applied in order
+        self._decoding = collections.deque()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.peer_id = transport.get_extra_info('peername')[0]
+        self.factory.peers[self.peer_id] = self
+        self.bind_metrics()
+        if self.metrics is not None:
+            self.metrics.queue_depth = self.queue_depth
+        LOG.info("[%s]TCP Connection established", self.peer_id)
+        self.fsm = FSM(protocol=self, hold_time=self.factory.hold_time, timer_cls=self.factory.timer_cls)
+        self.fsm.connection_made()
+
+    def connection_lost(self, exc):
+        self.disconnected = True
+        self._backlog = KeyedQueue()
+        LOG.info("[%s]TCP Connection lost", self.peer_id)
+        self.fsm.connection_lost()
+        self.release_peer()
+        if self.factory.peers.get(self.peer_id) is self:
+            del self.factory.peers[self.peer_id]
+
+    def data_received(self, data):
+        pool = self.factory.codec_pool
+        if pool is None:
+            return super(AsyncioBGP, self).data_received(data)
+        try:
+            self.framer.feed(data)
+            # a large read is split in threshold sized jobs spread over the workers
+            batch = []
+            batch_bytes = 0
+            for msg_type, msg in self.framer.frames():
+                if msg_type == bgp_cons.MSG_UPDATE:
+                    # the hold timer restarts now, not once the UPDATE is decoded
+                    self.msg_recv_stat['Updates'] += 1
+                    if self.metrics is not None:
+                        self.metrics.received(msg_type, bgp_cons.HDR_LEN + len(msg))
+                    self.fsm.update_received()
+                    batch.append(bytes(msg))
+                    batch_bytes += len(msg)
+                    if batch_bytes >= pool.threshold:
+                        self._submit_decode(pool, batch)
+                        batch = []
+                        batch_bytes = 0
+                else:
+                    self.receive_message(msg_type, msg)
+            if batch:
+                self._submit_decode(pool, batch)
+        except excep.NotificationSent as e:
+            LOG.error(e)
+            LOG.debug(traceback.format_exc())
+            self.fsm.error(e)
+
+    def _submit_decode(self, pool, batch):
+        future = asyncio.wrap_future(pool.submit_decode(batch, self.fourbytesas, self.add_path_ipv4_receive))
+        self._decoding.append(future)
+        future.add_done_callback(self._updates_decoded)
+
+    def _updates_decoded(self, future):
+        while self._decoding and self._decoding[0].done():
+            future = self._decoding.popleft()
+            if self.disconnected:
+                continue
+            try:
+                for result in future.result():
+                    self.apply_update(result)
+            except excep.NotificationSent as e:
+                LOG.error(e)
+                self.fsm.error(e)
+            except Exception as e:
+                LOG.error('[%s]UPDATE decode failed: %s', self.peer_id, e)
+                self.close_connection()
+
+    def connection_established(self):
+        pool = self.factory.codec_pool
+        msg_dict = self.factory.msg_dict
+        if pool is None or not msg_dict:
+            return super(AsyncioBGP, self).connection_established()
+        self.factory.loc_rib.add_peer(self.peer_id, self._adj_rib_in, self.peer_bgp_id)
+        group = self.factory.update_groups.join(self.peer_id, self.send_update, self.capabilities)
+        if group.msg_dict is msg_dict:
+            group.send_table(self.peer_id, msg_dict)
+        else:
+            future = asyncio.wrap_future(pool.submit_encode(msg_dict, group.asn4, group.add_path))
+            future.add_done_callback(lambda f: self._table_encoded(group, msg_dict, f))
+        self.count_advertised(msg_dict)
+
+    def _table_encoded(self, group, msg_dict, future):
+        if self.disconnected or group.members.get(self.peer_id) is None:
+            return
+        try:
+            messages = future.result()
+        except Exception as e:
+            LOG.error('[%s]UPDATE encode failed: %s', self.peer_id, e)
+            self.close_connection()
+            return
+        if group.msg_dict is not msg_dict:
+            group.seed(msg_dict, messages)
+        group.send_table(self.peer_id, msg_dict)
+
+    def queue_depth(self):
+        return self.transport.get_write_buffer_size() + self._backlog.nbytes
+
+    def send_update(self, msg):
+        if self.paused or self._backlog:
+            self._backlog.append(msg, Update.route_key(msg, self.add_path_ipv4_send))
+            return
+        super(AsyncioBGP, self).send_update(msg)
+
+    def pause_writing(self):
+        # transport buffer above its high watermark, UPDATEs wait in the backlog
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        send_update = super(AsyncioBGP, self).send_update
+        while self._backlog and not self.paused and not self.disconnected:
+            send_update(self._backlog.popleft()[1])
+
+
+class AsyncioSpeaker(object):
+    """
+    asyncio counterpart of core.factory.BGPFactory.
+
+    Every session lives in one event loop, peer timers are loop.call_later
+    handles (or a shared TimerWheel when one is given). With a
+    core.offload.CodecPool bulk UPDATE encode/decode runs in its worker
+    processes. With a core.config.ConfigReloader the config is reloaded
+    on SIGHUP or when the file changes and only the difference is sent.
+    With a core.metrics.Metrics every session is counted in it and
+    serve_metrics() exports it over HTTP. A core.profiling.Profiler is
+    toggled with SIGUSR1 (SIGUSR2 logs its report) and by the commands
+    sent to serve_profile_control().
+    """
+
+    def __init__(self, my_asn, bgp_id, my_capability, hold_time=bgp_cons.HOLD_TIME, msg_dict=None,
+                 timer_wheel=None, codec_pool=None, config=None, config_interval=5, metrics=None,
+                 profiler=None):
+        self.my_asn = my_asn
+        self.bgp_id = bgp_id
+        self.my_capability = my_capability
+        self.hold_time = hold_time
+        self.msg_dict = msg_dict
+        self.peers = {}
+        self.loc_rib = LocRIB()
+        self.metrics = metrics
+        self.profiler = profiler
+        self.update_groups = UpdateGroupManager(metrics)
+        self.timer_wheel = timer_wheel
+        self.timer_cls = timer_wheel.timer if timer_wheel is not None else AsyncioTimer
+        self.codec_pool = codec_pool
+        self.config = config
+        self.config_interval = config_interval
+        if config is not None:
+            self.msg_dict = config.msg_dict
+            config.on_change = self.apply_config
+        self.server = None
+        self._tick_handle = None
+
+    def _tick(self):
+        self.timer_wheel.tick()
+        self._tick_handle = asyncio.get_running_loop().call_later(self.timer_wheel.resolution, self._tick)
+
+    def _check_config(self):
+        self.config.check()
+        asyncio.get_running_loop().call_later(self.config_interval, self._check_config)
+
+    def apply_config(self, msg_dict, updates):
+        """
+        New config loaded, send the difference to the established peers
+        """
+        self.msg_dict = msg_dict
+        for update in updates:
+            self.update_groups.advertise(update)
+            for peer_id, peer in self.peers.items():
+                if peer_id in self.update_groups.peer_group:
+                    peer.count_advertised(update)
+
+    def build_protocol(self):
+        return AsyncioBGP(self)
+
+    async def serve(self, host='0.0.0.0', port=179, sock=None, **kwargs):
+        """
+        Start listening, extra keyword arguments go to loop.create_server
+        :param sock: already listening socket (e.g. core.workers.reuseport_socket), overrides host/port
+        """
+        loop = asyncio.get_running_loop()
+        if self.timer_wheel is not None and self._tick_handle is None:
+            self._tick_handle = loop.call_later(self.timer_wheel.resolution, self._tick)
+        if self.config is not None:
+            loop.add_signal_handler(signal.SIGHUP, self.config.reload)
+            loop.call_later(self.config_interval, self._check_config)
+        if self.profiler is not None:
+            loop.add_signal_handler(signal.SIGUSR1, self.profiler.toggle)
+            loop.add_signal_handler(signal.SIGUSR2, self.profiler.log_report)
+        if sock is not None:
+            self.server = await loop.create_server(self.build_protocol, sock=sock, **kwargs)
+        else:
+            self.server = await loop.create_server(self.build_protocol, host, port, **kwargs)
+        LOG.info('listening on %s', self.server.sockets[0].getsockname())
+        return self.server
+
+    async def _metrics_request(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+            writer.write(self.metrics.http_response(request))
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            LOG.debug('metrics request failed: %s', e)
+        finally:
+            writer.close()
+
+    async def serve_metrics(self, host='127.0.0.1', port=9179):
+        """
+        Export self.metrics in the Prometheus text format on http://host:port/metrics
+        """
+        server = await asyncio.start_server(self._metrics_request, host, port)
+        LOG.info('metrics on http://%s:%s/metrics', host, port)
+        return server
+
+    async def _profile_command(self, reader, writer):
+        try:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            writer.write((self.profiler.command(line.decode(errors='replace')) + '\n').encode())
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError) as e:
+            LOG.debug('profile control request failed: %s', e)
+        finally:
+            writer.close()
+
+    async def serve_profile_control(self, path):
+        """
+        Accept core.profiling.Profiler.command() lines on a unix socket,
+        e.g. echo start | nc -U path
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._profile_command, path)
+        LOG.info('profile control on %s', path)
+        return server
+
+    async def serve_forever(self, host='0.0.0.0', port=179, sock=None, **kwargs):
+        server = await self.serve(host, port, sock, **kwargs)
+        async with server:
+            await server.serve_forever()
+
+
+def new_event_loop():
+    """
+    uvloop when it is installed, the default asyncio loop otherwise
+    """
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def run(speaker, host='0.0.0.0', port=179, sock=None, metrics_address=None, profile_control=None):
+    """
+    :param metrics_address: (host, port) of the metrics endpoint, needs speaker.metrics
+    :param profile_control: unix socket path for profiling commands, needs speaker.profiler
+    """
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        if metrics_address is not None:
+            loop.run_until_complete(speaker.serve_metrics(*metrics_address))
+        if profile_control is not None:
+            loop.run_until_complete(speaker.serve_profile_control(profile_control))
+        loop.run_until_complete(speaker.serve_forever(host, port, sock))
+    finally:
+        loop.close()
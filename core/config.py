@@ -0,0 +1,629 @@
+import bisect
+import json
+import logging
+import os
+import socket
+import struct
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from common import constants as bgp_cons
+from core.labels import LabelIndexAllocator
+from message.attribute.bgpprefixsid import BGPPrefixSid
+from message.attribute.nlri.labelledunicast import BOS
+from message.attribute.nlri.labelledunicast import IPv4LabelledUnicast
+from message.attribute.nlri.prefix import MASKS
+
+LOG = logging.getLogger(__name__)
+
+# label indexes are written as 20 bit MPLS labels
+MAX_LABEL_INDEX = (1 << 20) - 1
+# path of the labelled routes inside the JSON config
+SID_PATH = ('attr', str(bgp_cons.BGPTYPE_MP_REACH_NLRI), 'BGP_PREFIX_SID')
+_CHUNK_SIZE = 1 << 16
+_IPV4 = struct.Struct('!I')
+# one route of a PrefixSidTable: network, prefix length, label index
+RECORD = struct.Struct('!IBI')
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([('network', '>u4'), ('prefix_len', 'u1'), ('index', '>u4')])
+
+
+def validate_prefix_sid(prefix, index):
+    """
+    :param index: label index, None to have one assigned from the SRGB
+    :return: (prefix, index) when valid
+    :raise ValueError: malformed prefix, host bits set or index out of range
+    """
+    try:
+        address, prefix_len = prefix.split('/')
+        prefix_len = int(prefix_len)
+        if address.count('.') != 3 or not 0 <= prefix_len <= 32:
+            raise ValueError
+        network = struct.unpack('!I', socket.inet_aton(address))[0]
+    except (ValueError, OSError, AttributeError):
+        raise ValueError('invalid prefix %r' % (prefix,))
+    if network & ~MASKS[prefix_len] & 0xffffffff:
+        raise ValueError('host bits set in prefix %r' % (prefix,))
+    if index is None:
+        return prefix, index
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index <= MAX_LABEL_INDEX:
+        raise ValueError('label index %r of %s out of range' % (index, prefix))
+    return prefix, index
+
+
+class _JSONStream(object):
+    """
+    Pull JSON values one at a time from a file read in chunks
+    """
+
+    def __init__(self, data_file, chunk_size=_CHUNK_SIZE):
+        self.file = data_file
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError('unexpected end of JSON')
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError('expected %r at %r' % (chars, self.buf[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _walk(stream, path, header):
+    """
+    Copy the JSON object at the stream into header, except the
+    SID_PATH array whose {prefix: index} entries are yielded instead.
+    """
+    stream.expect('{')
+    if stream.peek() == '}':
+        stream.pos += 1
+        return
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        key_path = path + (key,)
+        if key_path == SID_PATH:
+            header[key] = []
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.pos += 1
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(',]') == ']':
+                        break
+        elif key_path == SID_PATH[:len(key_path)] and stream.peek() == '{':
+            header[key] = {}
+            for prefix_sid in _walk(stream, key_path, header[key]):
+                yield prefix_sid
+        else:
+            header[key] = stream.value()
+        if stream.expect(',}') == '}':
+            return
+
+
+def iter_json_prefix_sids(path, header=None):
+    """
+    Stream the attr.14.BGP_PREFIX_SID entries of a JSON config
+    :param header: dict filled with everything else in the file
+    :return: generator of validated (prefix, index)
+    """
+    header = {} if header is None else header
+    with open(path) as data_file:
+        for prefix_sid in _walk(_JSONStream(data_file), (), header):
+            for prefix, index in prefix_sid.items():
+                yield validate_prefix_sid(prefix, index)
+
+
+def iter_csv_prefix_sids(path):
+    """
+    Stream a "prefix,index" (or whitespace separated) per line file,
+    blank lines and # comments are skipped, "auto" asks for an index
+    :return: generator of validated (prefix, index)
+    """
+    with open(path) as data_file:
+        for line_no, line in enumerate(data_file, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            fields = line.replace(',', ' ').split()
+            try:
+                if len(fields) != 2:
+                    raise ValueError('expected "prefix,index"')
+                yield validate_prefix_sid(fields[0], None if fields[1] == 'auto' else int(fields[1]))
+            except ValueError as e:
+                raise ValueError('%s line %s: %s' % (path, line_no, e))
+
+
+def iter_prefix_sids(path):
+    """
+    (prefix, index) pairs from a JSON config or a .csv/.txt route file
+    """
+    if os.path.splitext(path)[1] in ('.csv', '.txt'):
+        return iter_csv_prefix_sids(path)
+    return iter_json_prefix_sids(path)
+
+
+class PrefixSidTable(object):
+    """
+    Immutable copy of the labelled routes of a loaded config, stands in
+    for the BGP_PREFIX_SID list.
+
+    Routes are packed back to back as (network, prefix length, label
+    index) records in the core.snapshot record format, sorted by
+    (network, prefix length), about 9 bytes per route. The config file
+    is read once, later edits only take effect through a reload.
+    Iterates as the [{prefix: index}, ...] list it replaces, pairs()
+    skips the per route dict and pack_nlri() encodes the NLRI of the
+    whole table in one vectorized pass.
+    """
+
+    def __init__(self, data, count, offset=0, index=None):
+        """
+        :param data: buffer holding the records
+        :param count: number of records
+        :param offset: offset of the first record in data
+        :param index: first record of every first network octet (257
+            entries), computed when not given
+        """
+        self.data = data
+        self.count = count
+        self.records_offset = offset
+        if index is None:
+            first_octets = [network >> 24 for network, _, _ in self.records()]
+            index = tuple(bisect.bisect_left(first_octets, octet) for octet in range(257))
+        self.index = index
+        # prefix -> label index of the routes configured without one
+        self.assigned = {}
+        self.allocator = None
+        # BGP_PREFIX_SID_FILE the routes were read from, if any
+        self.sid_file = None
+        self._nlri = None
+
+    @classmethod
+    def from_pairs(cls, prefix_sids):
+        """
+        :param prefix_sids: iterable of validated (prefix, index), later duplicates win
+        """
+        keys = array('Q')
+        indexes = array('q')
+        for prefix, index in prefix_sids:
+            keys.append(_prefix_key(prefix))
+            indexes.append(index)
+        return cls.from_keys(keys, indexes)
+
+    @classmethod
+    def from_keys(cls, keys, indexes):
+        """
+        :param keys: network << 8 | prefix length of every route
+        :param indexes: label index of every key, later duplicates win
+        """
+        return cls.pack(*_sorted_routes(keys, indexes))
+
+    @classmethod
+    def pack(cls, keys, indexes):
+        """
+        :param keys: sorted, unique network << 8 | prefix length
+        :param indexes: label index of every key
+        """
+        if numpy is not None:
+            keys = numpy.asarray(keys, dtype=numpy.uint64)
+            records = numpy.empty(len(keys), dtype=RECORD_DTYPE)
+            records['network'] = keys >> 8
+            records['prefix_len'] = keys & 0xff
+            records['index'] = indexes
+            index = tuple(numpy.searchsorted(keys >> 32, numpy.arange(257)).tolist())
+            return cls(records.tobytes(), len(records), index=index)
+        data = bytearray(RECORD.size * len(keys))
+        for i, (key, index) in enumerate(zip(keys, indexes)):
+            RECORD.pack_into(data, i * RECORD.size, key >> 8, key & 0xff, index)
+        return cls(bytes(data), len(keys))
+
+    def __len__(self):
+        return self.count
+
+    def records(self):
+        """
+        :return: (network, prefix_len, index) of every route, in order
+        """
+        end = self.records_offset + self.count * RECORD.size
+        return RECORD.iter_unpack(memoryview(self.data)[self.records_offset:end])
+
+    def array(self):
+        """
+        Zero copy NumPy structured array over the records
+        """
+        if numpy is None:
+            raise ImportError('numpy is required for %s.array' % type(self).__name__)
+        return numpy.frombuffer(self.data, dtype=RECORD_DTYPE, count=self.count, offset=self.records_offset)
+
+    def pairs(self):
+        for network, prefix_len, index in self.records():
+            yield '%s/%s' % (socket.inet_ntoa(_IPV4.pack(network)), prefix_len), index
+
+    def __iter__(self):
+        for prefix, index in self.pairs():
+            yield {prefix: index}
+
+    def lookup(self, network, prefix_len):
+        """
+        :return: label index of the exact prefix or None
+        """
+        octet = network >> 24
+        low, high = self.index[octet], self.index[octet + 1]
+        key = network << 8 | prefix_len
+        while low < high:
+            mid = (low + high) // 2
+            mid_network, mid_len, index = RECORD.unpack_from(self.data, self.records_offset + mid * RECORD.size)
+            mid_key = mid_network << 8 | mid_len
+            if mid_key == key:
+                return index
+            if mid_key < key:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+
+    def _encode(self, srgb):
+        # length, 3 octet label, network octets, trimmed to each prefix length
+        routes = self.array()
+        prefix_len = routes['prefix_len'].astype(numpy.int64)
+        sizes = 4 + ((prefix_len + 7) >> 3)
+        if srgb is not None:
+            label = (srgb.label_array(routes['index']) << 4) | BOS
+        else:
+            label = (routes['index'].astype(numpy.uint32) << 4) | BOS
+        network = routes['network'].astype(numpy.uint32)
+        wide = numpy.empty((self.count, 8), dtype=numpy.uint8)
+        wide[:, 0] = 24 + prefix_len
+        wide[:, 1] = label >> 16
+        wide[:, 2] = label >> 8
+        wide[:, 3] = label
+        for i in range(4):
+            wide[:, 4 + i] = network >> (24 - 8 * i)
+        keep = numpy.arange(8) < sizes[:, None]
+        return wide[keep].tobytes(), numpy.cumsum(sizes)
+
+    def pack_nlri(self, room, srgb=None):
+        """
+        Same output as Update.pack_nlri over the table, without a Python
+        object per route
+        :param srgb: maps label indexes to labels, labels are the indexes without one
+        :return: generator of NLRI byte strings of at most room octets
+        """
+        if numpy is None:
+            from message.update import Update
+            for nlri in Update.pack_nlri((IPv4LabelledUnicast.generate_nlri_subobj(
+                    prefix, srgb.label(index) if srgb is not None else index)
+                    for prefix, index in self.pairs()), room):
+                yield nlri
+            return
+        if self._nlri is None or self._nlri[0] != srgb:
+            self._nlri = (srgb,) + self._encode(srgb)
+        _, data, ends = self._nlri
+        start = 0
+        while start < len(data):
+            end = int(ends[numpy.searchsorted(ends, start + room, side='right') - 1])
+            yield data[start:end]
+            start = end
+
+    def pack_nlri_by_index(self, room, srgb=None):
+        """
+        Same output as Update.pack_nlri_by_index over the table: routes
+        sharing a label index are packed together, each group in blobs of
+        at most room octets
+        :return: generator of (label index, NLRI byte string)
+        """
+        from message.update import Update
+        if numpy is None:
+            for group in Update.pack_nlri_by_index(self.pairs(), room, srgb):
+                yield group
+            return
+        if self._nlri is None or self._nlri[0] != srgb:
+            self._nlri = (srgb,) + self._encode(srgb)
+        _, data, ends = self._nlri
+        ends_list = ends.tolist()
+        starts = [0] + ends_list[:-1]
+        indexes = self.array()['index']
+        # stable, routes of one index stay in prefix order
+        order = numpy.argsort(indexes, kind='stable')
+        sorted_indexes = indexes[order]
+        bounds = numpy.flatnonzero(numpy.diff(sorted_indexes)) + 1
+        first = 0
+        for last in bounds.tolist() + [len(order)]:
+            group = order[first:last].tolist()
+            if len(group) == 1:
+                yield int(sorted_indexes[first]), data[starts[group[0]]:ends_list[group[0]]]
+            else:
+                nlri = (data[starts[route]:ends_list[route]] for route in group)
+                for nlri_hex in Update.pack_nlri(nlri, room):
+                    yield int(sorted_indexes[first]), nlri_hex
+            first = last
+
+
+def _prefix_key(prefix):
+    address, prefix_len = prefix.split('/')
+    return _IPV4.unpack(socket.inet_aton(address))[0] << 8 | int(prefix_len)
+
+
+def _key_prefix(key):
+    return '%s/%s' % (socket.inet_ntoa(_IPV4.pack(key >> 8)), key & 0xff)
+
+
+def _sorted_routes(keys, indexes):
+    """
+    :param keys: array('Q') of network << 8 | prefix length
+    :param indexes: array('q') of label indexes
+    :return: (keys, indexes) sorted by key, of equal keys only the last one
+    """
+    if numpy is not None:
+        keys = numpy.frombuffer(keys, dtype=numpy.uint64) if len(keys) else numpy.zeros(0, dtype=numpy.uint64)
+        indexes = numpy.frombuffer(indexes, dtype=numpy.int64) if len(indexes) else numpy.zeros(0, dtype=numpy.int64)
+        order = numpy.argsort(keys, kind='stable')
+        keys = keys[order]
+        last = numpy.append(keys[1:] != keys[:-1], True) if len(keys) else numpy.zeros(0, dtype=bool)
+        return keys[last], indexes[order][last]
+    routes = dict(zip(keys, indexes))
+    keys = sorted(routes)
+    return keys, [routes[key] for key in keys]
+
+
+def _collect(routes, keys, indexes):
+    # routes without a label index are collected as index -1
+    for prefix, index in routes:
+        keys.append(_prefix_key(prefix))
+        indexes.append(-1 if index is None else index)
+
+
+def load_config(path, assigned=None):
+    """
+    Load a config and copy its labelled routes into a PrefixSidTable.
+
+    The routes come from the BGP_PREFIX_SID list of the file, or from
+    the file named by "BGP_PREFIX_SID_FILE" next to it (JSON or
+    "prefix,index" lines), and are validated in one streaming pass
+    without a Python object per route. With an SRGB in the
+    BGP_PREFIX_SID attribute the label indexes of the whole table are
+    checked for conflicts at once and routes without an index are
+    assigned free ones. A binary snapshot (core.snapshot) is mapped
+    instead of parsed.
+    :param assigned: {prefix: label index} assigned by the previous load
+        (see assigned_indexes()), routes without an index keep theirs
+        while it is still free
+    :raise ValueError: invalid JSON, prefix or label index
+    """
+    from core import snapshot
+    if snapshot.is_snapshot(path):
+        return snapshot.load_snapshot(path)
+    msg_dict = {}
+    keys = array('Q')
+    indexes = array('q')
+    _collect(iter_json_prefix_sids(path, msg_dict), keys, indexes)
+    mp_reach = msg_dict.get('attr', {}).get(SID_PATH[1])
+    if mp_reach is None:
+        return msg_dict
+    sid_file = mp_reach.pop('BGP_PREFIX_SID_FILE', None)
+    if sid_file is not None:
+        sid_file = os.path.join(os.path.dirname(path), sid_file)
+        keys = array('Q')
+        indexes = array('q')
+        _collect(iter_prefix_sids(sid_file), keys, indexes)
+    keys, indexes = _sorted_routes(keys, indexes)
+    if numpy is not None:
+        auto = numpy.flatnonzero(indexes < 0).tolist()
+    else:
+        auto = [position for position, index in enumerate(indexes) if index < 0]
+
+    srgb = config_srgb(msg_dict)
+    allocator = None
+    previous = assigned or {}
+    assigned = {}
+    if srgb is not None:
+        allocator = LabelIndexAllocator(srgb)
+        if numpy is not None:
+            allocator.reserve_table(indexes[indexes >= 0])
+        else:
+            allocator.reserve_table([index for index in indexes if index >= 0])
+        # keep the previous assignments first, new routes then get the lowest free indexes
+        unassigned = []
+        for position in auto:
+            prefix = _key_prefix(int(keys[position]))
+            index = previous.get(prefix)
+            if index is not None and 0 <= index < srgb.size and index not in allocator:
+                indexes[position] = assigned[prefix] = allocator.reserve(index)
+            else:
+                unassigned.append((position, prefix))
+        for position, prefix in unassigned:
+            indexes[position] = assigned[prefix] = allocator.allocate()
+    elif auto:
+        raise ValueError('%s routes without a label index need an SRGB' % len(auto))
+    table = PrefixSidTable.pack(keys, indexes)
+    table.allocator = allocator
+    table.assigned = assigned
+    table.sid_file = sid_file
+    mp_reach['BGP_PREFIX_SID'] = table
+    return msg_dict
+
+
+def assigned_indexes(msg_dict):
+    """
+    :return: {prefix: label index} of the routes load_config() assigned an index
+    """
+    routes = (msg_dict.get('attr') or {}).get(SID_PATH[1], {}).get('BGP_PREFIX_SID')
+    return dict(getattr(routes, 'assigned', None) or {})
+
+
+def config_srgb(msg_dict):
+    """
+    :return: the SRGB of the BGP_PREFIX_SID attribute, None when not configured
+    """
+    for type_code, value in (msg_dict.get('attr') or {}).items():
+        if int(type_code) == bgp_cons.BGP_PREFIX_SID:
+            return BGPPrefixSid.srgb(value)
+    return None
+
+
+def _split(msg_dict):
+    """
+    :return: (attributes without MP_REACH_NLRI, MP_REACH_NLRI without its
+        routes, {prefix: label index})
+    """
+    attr = {}
+    mp_reach = {}
+    prefix_sids = {}
+    for type_code, value in (msg_dict.get('attr') or {}).items():
+        if int(type_code) == bgp_cons.BGPTYPE_MP_REACH_NLRI:
+            mp_reach = dict((k, v) for k, v in value.items() if k != 'BGP_PREFIX_SID')
+            routes = value.get('BGP_PREFIX_SID', ())
+            if hasattr(routes, 'pairs'):
+                prefix_sids.update(routes.pairs())
+            else:
+                for prefix_sid in routes:
+                    prefix_sids.update(prefix_sid)
+        else:
+            attr[int(type_code)] = value
+    return attr, mp_reach, prefix_sids
+
+
+def prefix_sids(msg_dict):
+    """
+    :return: {prefix: label index} of the labelled routes in msg_dict
+    """
+    return _split(msg_dict)[2]
+
+
+def diff_config(old, new):
+    """
+    Work out the UPDATEs taking peers from the old to the new config.
+
+    Only prefixes whose label index changed (or that are new) are
+    announced again and removed prefixes are withdrawn with
+    MP_UNREACH_NLRI. A change to any other attribute (or the next hop)
+    re-announces every prefix.
+    :return: list of message dictionaries for Update.construct_chunks
+    """
+    old_attr, old_mp_reach, old_sids = _split(old)
+    new_attr, new_mp_reach, new_sids = _split(new)
+    if old_attr != new_attr or old_mp_reach != new_mp_reach:
+        announce = new_sids
+    else:
+        announce = dict((prefix, index) for prefix, index in new_sids.items() if old_sids.get(prefix) != index)
+    withdraw = [prefix for prefix in old_sids if prefix not in new_sids]
+
+    updates = []
+    if withdraw:
+        updates.append({'attr': {bgp_cons.BGPTYPE_MP_UNREACH_NLRI: {'withdraw': withdraw}}})
+    if announce:
+        mp_reach = dict(new_mp_reach)
+        mp_reach['BGP_PREFIX_SID'] = [{prefix: index} for prefix, index in announce.items()]
+        attr = dict(new_attr)
+        attr[bgp_cons.BGPTYPE_MP_REACH_NLRI] = mp_reach
+        updates.append({'attr': attr})
+    return updates
+
+
+class ConfigReloader(object):
+    """
+    Holds the current prefix-SID config and reloads it on demand (SIGHUP)
+    or when check() sees the file, or the BGP_PREFIX_SID_FILE it names,
+    modified.
+
+    on_change(msg_dict, updates) is called with the new config and the
+    diff from diff_config() so only changed routes are sent to peers.
+    Routes without a configured label index keep the one assigned by the
+    previous load. A config that fails to load is logged and the old one
+    kept.
+    """
+
+    def __init__(self, path, on_change=None):
+        self.path = path
+        self.on_change = on_change
+        self.msg_dict = load_config(path)
+        # (mtime, size) of every file in files() when last loaded
+        self.stamp = self._stamp()
+        self.reloads = 0
+
+    def files(self, msg_dict=None):
+        """
+        :return: the files msg_dict (default the current config) was loaded from
+        """
+        msg_dict = self.msg_dict if msg_dict is None else msg_dict
+        routes = (msg_dict.get('attr') or {}).get(SID_PATH[1], {}).get('BGP_PREFIX_SID')
+        sid_file = getattr(routes, 'sid_file', None)
+        return (self.path,) if sid_file is None else (self.path, sid_file)
+
+    def _stamp(self, msg_dict=None):
+        return tuple((stat.st_mtime, stat.st_size) for stat in map(os.stat, self.files(msg_dict)))
+
+    def check(self):
+        """
+        Reload when a file changed since the last load
+        """
+        try:
+            stamp = self._stamp()
+        except OSError as e:
+            LOG.error('cannot stat %s: %s', ', '.join(self.files()), e)
+            return None
+        if stamp != self.stamp:
+            return self.reload()
+        return None
+
+    def reload(self):
+        """
+        :return: the UPDATE message dictionaries sent for the change
+        """
+        try:
+            self.stamp = self._stamp()
+            msg_dict = load_config(self.path, assigned_indexes(self.msg_dict))
+            if self.files(msg_dict) != self.files():
+                self.stamp = self._stamp(msg_dict)
+        except (OSError, ValueError) as e:
+            LOG.error('config reload of %s failed, keeping the old one: %s', self.path, e)
+            return None
+        updates = diff_config(self.msg_dict, msg_dict)
+        self.msg_dict = msg_dict
+        self.reloads += 1
+        LOG.info('reloaded %s, %s UPDATE set(s) to send', self.path, len(updates))
+        if self.on_change is not None:
+            self.on_change(msg_dict, updates)
+        return updates
@@ -0,0 +1,36 @@
+from twisted.internet import protocol
+
+from common import constants as bgp_cons
+from core.protocol import BGP
+from core.rib import LocRIB
+from core.updategroup import UpdateGroupManager
+
+
+class BGPFactory(protocol.ServerFactory):
+    """
+    Builds one BGP protocol (and FSM) per accepted peer connection
+    """
+    protocol = BGP
+
+    def __init__(self, my_asn, bgp_id, my_capability, hold_time=bgp_cons.HOLD_TIME, msg_dict=None, metrics=None):
+        self.my_asn = my_asn
+        self.bgp_id = bgp_id
+        self.my_capability = my_capability
+        self.hold_time = hold_time
+        # routes advertised to every peer once Established
+        self.msg_dict = msg_dict
+        self.peer_addr = None
+        self.peers = {}
+        # best paths across all peers, fed from their Adj-RIB-In
+        self.loc_rib = LocRIB()
+        # core.metrics.Metrics counting every session, or None
+        self.metrics = metrics
+        # peers sharing capabilities get the same encoded UPDATEs
+        self.update_groups = UpdateGroupManager(metrics)
+
+    def buildProtocol(self, addr):
+        proto = protocol.ServerFactory.buildProtocol(self, addr)
+        proto.factory = self
+        self.peer_addr = addr.host
+        self.peers[addr.host] = proto
+        return proto
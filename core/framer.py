@@ -0,0 +1,90 @@
+import struct
+
+from common import constants as bgp_cons
+from common import exception as excep
+
+_HEADER = struct.Struct('!16sHB')
+_MARKER = b'\xff' * bgp_cons.BGP_MARKER_SIZE
+
+
+class BGPFramer(object):
+    """
+    Splits a BGP byte stream into messages.
+
+    Data is received into one preallocated bytearray with recv_into, a
+    partial message is kept across reads and only moved to the front of
+    the buffer when the free space runs low. Frames are yielded as
+    (type, memoryview of the message body) without copying, a frame is
+    only valid until the next recv()/feed() call.
+    """
+
+    def __init__(self, bufsize=bgp_cons.BGP_MAX_PACKET_SIZE * 16):
+        if bufsize < bgp_cons.BGP_MAX_PACKET_SIZE:
+            bufsize = bgp_cons.BGP_MAX_PACKET_SIZE
+        self.buffer = bytearray(bufsize)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def _make_room(self):
+        # always keep room for at least one complete message
+        if len(self.buffer) - self.end < bgp_cons.BGP_MAX_PACKET_SIZE:
+            pending = self.end - self.start
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+            self.start = 0
+            self.end = pending
+
+    def recv(self, sock):
+        """
+        Read once from sock into the buffer
+        :return: number of bytes read, 0 when the peer closed the connection
+        """
+        self._make_room()
+        nbytes = sock.recv_into(self.view[self.end:])
+        self.end += nbytes
+        return nbytes
+
+    def feed(self, data):
+        """
+        Append data received by other means (e.g. Twisted or asyncio
+        data_received), the buffer grows when data does not fit in it
+        """
+        self._make_room()
+        if len(data) > len(self.buffer) - self.end:
+            # frames yielded before keep viewing the old buffer
+            pending = self.end - self.start
+            buffer = bytearray(max(len(self.buffer) * 2, pending + len(data) + bgp_cons.BGP_MAX_PACKET_SIZE))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+            self.start = 0
+            self.end = pending
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def frames(self):
+        """
+        Yield every complete (msg_type, msg_body) in the buffer
+        """
+        while self.end - self.start >= bgp_cons.BGP_HEADER_SIZE:
+            marker, length, msg_type = _HEADER.unpack_from(self.view, self.start)
+            if marker != _MARKER:
+                raise excep.MessageHeaderError(sub_error=bgp_cons.ERR_MSG_HDR_CONN_NOT_SYNC, data='')
+            if length < bgp_cons.BGP_HEADER_SIZE or length > bgp_cons.BGP_MAX_PACKET_SIZE:
+                raise excep.MessageHeaderError(sub_error=bgp_cons.ERR_MSG_HDR_BAD_MSG_LEN,
+                                               data=struct.pack('!H', length))
+            if self.end - self.start < length:
+                break
+            body = self.view[self.start + bgp_cons.BGP_HEADER_SIZE:self.start + length]
+            self.start += length
+            yield msg_type, body
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def read_frames(self, sock):
+        """
+        Yield frames from sock until the peer closes the connection
+        """
+        while self.recv(sock):
+            for frame in self.frames():
+                yield frame
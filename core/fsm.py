@@ -0,0 +1,220 @@
+import logging
+
+from common import constants as bgp_cons
+from common import exception as excep
+
+LOG = logging.getLogger(__name__)
+
+
+class FSM(object):
+    """
+    RFC 4271 BGP finite state machine for one peer.
+
+        Idle -> Connect/Active -> OpenSent -> OpenConfirm -> Established
+
+    The FSM owns the connect retry, hold and keepalive timers and calls
+    back into the protocol to send messages and drop the connection.
+    The protocol must provide send_open(), send_keepalive(),
+    send_notification(error, sub_error, data), connection_established()
+    and close_connection(). timer_cls is anything with the BGPTimer
+    interface (cancel/reset/active), core.timer.BGPTimer by default.
+    """
+
+    def __init__(self, protocol=None, hold_time=bgp_cons.HOLD_TIME,
+                 connect_retry_time=bgp_cons.CONNECT_RETRY_TIME, timer_cls=None):
+        if timer_cls is None:
+            # Twisted reactor timers unless the caller brings its own
+            from core.timer import BGPTimer as timer_cls
+        self.protocol = protocol
+        self._state = bgp_cons.ST_IDLE
+
+        self.my_hold_time = hold_time
+        self.hold_time = hold_time
+        self.keep_alive_time = hold_time / 3
+        self.connect_retry_time = connect_retry_time
+
+        self.connect_retry_counter = 0
+        self.connect_retry_timer = timer_cls(self.connect_retry_time_event)
+        self.hold_timer = timer_cls(self.hold_time_event)
+        self.keep_alive_timer = timer_cls(self.keep_alive_time_event)
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, new_state):
+        old_state = self._state
+        if old_state == new_state:
+            return
+        # counted on the peer's core.metrics.PeerMetrics, it outlives this FSM
+        metrics = getattr(self.protocol, 'metrics', None)
+        if metrics is not None:
+            metrics.state_changed(old_state, new_state)
+        LOG.info('[%s]State is now:%s', self.peer, bgp_cons.stateDescr[new_state])
+        self._state = new_state
+
+    @property
+    def peer(self):
+        return getattr(self.protocol, 'peer_id', None)
+
+    def stop_timers(self):
+        self.connect_retry_timer.cancel()
+        self.hold_timer.cancel()
+        self.keep_alive_timer.cancel()
+
+    # ---------------------------- Administrative events ---------------------------- #
+
+    def manual_start(self):
+        """
+        Event 1: start the peer, wait for (or initiate) the TCP connection
+        """
+        if self.state == bgp_cons.ST_IDLE:
+            self.connect_retry_counter = 0
+            self.connect_retry_timer.reset(self.connect_retry_time)
+            self.state = bgp_cons.ST_CONNECT
+
+    def manual_stop(self):
+        """
+        Event 2: send CEASE and drop the session
+        """
+        if self.state != bgp_cons.ST_IDLE:
+            if self.state in (bgp_cons.ST_OPENSENT, bgp_cons.ST_OPENCONFIRM, bgp_cons.ST_ESTABLISHED):
+                self.protocol.send_notification(bgp_cons.ERR_CEASE, 0)
+            self.stop_timers()
+            self.connect_retry_counter = 0
+            self.protocol.close_connection()
+            self.state = bgp_cons.ST_IDLE
+
+    # ------------------------------ Timer events ------------------------------------ #
+
+    def connect_retry_time_event(self):
+        """
+        Event 9: connect retry timer expired
+        """
+        if self.state in (bgp_cons.ST_CONNECT, bgp_cons.ST_ACTIVE):
+            self.connect_retry_counter += 1
+            self.connect_retry_timer.reset(self.connect_retry_time)
+            self.state = bgp_cons.ST_CONNECT
+
+    def hold_time_event(self):
+        """
+        Event 10: nothing heard from the peer within the hold time
+        """
+        if self.state in (bgp_cons.ST_OPENSENT, bgp_cons.ST_OPENCONFIRM, bgp_cons.ST_ESTABLISHED):
+            LOG.warning('[%s]Hold timer expired', self.peer)
+            self.protocol.send_notification(bgp_cons.ERR_HOLD_TIMER_EXPIRED, 0)
+            self.connect_retry_counter += 1
+            self.stop_timers()
+            self.protocol.close_connection()
+            self.state = bgp_cons.ST_IDLE
+
+    def keep_alive_time_event(self):
+        """
+        Event 11: time to send a KEEPALIVE
+        """
+        if self.state in (bgp_cons.ST_OPENCONFIRM, bgp_cons.ST_ESTABLISHED):
+            self.protocol.send_keepalive()
+            self.keep_alive_timer.reset(self.keep_alive_time)
+
+    # ------------------------------ Connection events ------------------------------- #
+
+    def connection_made(self):
+        """
+        Event 16/17: TCP connection up, send OPEN
+        """
+        if self.state in (bgp_cons.ST_IDLE, bgp_cons.ST_CONNECT, bgp_cons.ST_ACTIVE):
+            self.connect_retry_timer.cancel()
+            self.protocol.send_open()
+            # large hold time until the peer's OPEN tells us its hold time
+            self.hold_timer.reset(bgp_cons.LARGER_HOLD_TIME)
+            self.state = bgp_cons.ST_OPENSENT
+
+    def connection_lost(self):
+        """
+        Event 18: TCP connection gone
+        """
+        self.stop_timers()
+        if self.state == bgp_cons.ST_IDLE:
+            # we dropped it ourselves (hold timer, NOTIFICATION, error), already counted
+            return
+        if self.state in (bgp_cons.ST_CONNECT, bgp_cons.ST_OPENSENT):
+            self.connect_retry_timer.reset(self.connect_retry_time)
+            self.state = bgp_cons.ST_ACTIVE
+        else:
+            self.connect_retry_counter += 1
+            self.state = bgp_cons.ST_IDLE
+
+    # ------------------------------ Message events ---------------------------------- #
+
+    def open_received(self, hold_time):
+        """
+        Event 19: valid OPEN received, negotiate the hold time
+        :param hold_time: hold time from the peer's OPEN
+        """
+        if self.state != bgp_cons.ST_OPENSENT:
+            raise excep.FSMError(sub_error=0, data='')
+        if 0 < hold_time < 3:
+            raise excep.OpenMessageError(sub_error=bgp_cons.ERR_MSG_OPEN_UNACCPT_HOLD_TIME, data=hold_time)
+        self.hold_time = min(self.my_hold_time, hold_time)
+        self.keep_alive_time = self.hold_time / 3
+        self.connect_retry_timer.cancel()
+        self.protocol.send_keepalive()
+        if self.hold_time:
+            self.keep_alive_timer.reset(self.keep_alive_time)
+            self.hold_timer.reset(self.hold_time)
+        else:
+            self.hold_timer.cancel()
+        self.state = bgp_cons.ST_OPENCONFIRM
+
+    def keep_alive_received(self):
+        """
+        Event 26: KEEPALIVE received
+        """
+        if self.state == bgp_cons.ST_OPENCONFIRM:
+            self._restart_hold_timer()
+            self.state = bgp_cons.ST_ESTABLISHED
+            self.protocol.connection_established()
+        elif self.state == bgp_cons.ST_ESTABLISHED:
+            self._restart_hold_timer()
+        else:
+            raise excep.FSMError(sub_error=0, data='')
+
+    def update_received(self):
+        """
+        Event 27: UPDATE received
+        """
+        if self.state != bgp_cons.ST_ESTABLISHED:
+            raise excep.FSMError(sub_error=0, data='')
+        self._restart_hold_timer()
+
+    def message_sent(self):
+        """
+        An UPDATE or KEEPALIVE went out, the next KEEPALIVE can wait
+        """
+        if self.state == bgp_cons.ST_ESTABLISHED and self.hold_time:
+            self.keep_alive_timer.reset(self.keep_alive_time)
+
+    def notification_received(self):
+        """
+        Event 24/25: peer sent NOTIFICATION, session is gone
+        """
+        self.stop_timers()
+        self.connect_retry_counter += 1
+        self.protocol.close_connection()
+        self.state = bgp_cons.ST_IDLE
+
+    def error(self, notification):
+        """
+        Message error detected locally, send NOTIFICATION and drop the session
+        :param notification: NotificationSent exception
+        """
+        self.protocol.send_notification(notification.error, notification.sub_error, notification.data)
+        self.stop_timers()
+        self.connect_retry_counter += 1
+        self.protocol.close_connection()
+        self.state = bgp_cons.ST_IDLE
+
+    def _restart_hold_timer(self):
+        if self.hold_time:
+            self.hold_timer.reset(self.hold_time)
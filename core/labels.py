@@ -0,0 +1,161 @@
+import logging
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from message.attribute.bgpprefixsid import SRGB
+
+LOG = logging.getLogger(__name__)
+
+_WORD_BITS = 64
+_FULL_WORD = (1 << _WORD_BITS) - 1
+
+
+class LabelIndexAllocator(object):
+    """
+    Tracks used label indexes of an SRGB in a bitmap.
+
+    allocate() returns the lowest free index in amortized O(1): a hint
+    points at the first word that may have a free bit and only moves back
+    when an index below it is released. Contiguous blocks and whole table
+    conflict checks use NumPy when it is available.
+    """
+
+    def __init__(self, srgb):
+        self.srgb = srgb
+        self.words = array('Q', [0]) * ((srgb.size + _WORD_BITS - 1) // _WORD_BITS)
+        # bits past the end of the SRGB are never free
+        tail = srgb.size % _WORD_BITS
+        if tail:
+            self.words[-1] = _FULL_WORD ^ ((1 << tail) - 1)
+        self.hint = 0
+        self.used = 0
+
+    def __contains__(self, index):
+        return 0 <= index < self.srgb.size and bool(self.words[index >> 6] >> (index & 63) & 1)
+
+    def reserve(self, index):
+        """
+        Mark a configured index as used
+        :raise ValueError: outside the SRGB or already used
+        """
+        self.srgb.validate(index)
+        word, bit = index >> 6, 1 << (index & 63)
+        if self.words[word] & bit:
+            raise ValueError('label index %s already in use' % index)
+        self.words[word] |= bit
+        self.used += 1
+        return index
+
+    def release(self, index):
+        word, bit = index >> 6, 1 << (index & 63)
+        if self.words[word] & bit:
+            self.words[word] &= ~bit & _FULL_WORD
+            self.used -= 1
+            self.hint = min(self.hint, word)
+
+    def allocate(self):
+        """
+        :return: the lowest free label index
+        :raise ValueError: SRGB exhausted
+        """
+        words = self.words
+        word = self.hint
+        while word < len(words) and words[word] == _FULL_WORD:
+            word += 1
+        self.hint = word
+        if word == len(words):
+            raise ValueError('SRGB exhausted (%s indexes)' % self.srgb.size)
+        value = words[word]
+        # lowest zero bit
+        bit = (~value & (value + 1)).bit_length() - 1
+        words[word] = value | (1 << bit)
+        self.used += 1
+        return word * _WORD_BITS + bit
+
+    def _free_mask(self):
+        bits = numpy.unpackbits(numpy.frombuffer(self.words, dtype='<u8').view(numpy.uint8), bitorder='little')
+        return bits[:self.srgb.size] == 0
+
+    def allocate_block(self, count):
+        """
+        :return: first index of count contiguous free indexes, all marked used
+        :raise ValueError: no free run that long
+        """
+        if numpy is not None:
+            free = numpy.concatenate(([False], self._free_mask(), [False])).astype(numpy.int8)
+            edges = numpy.diff(free)
+            starts = numpy.flatnonzero(edges == 1)
+            ends = numpy.flatnonzero(edges == -1)
+            fits = numpy.flatnonzero(ends - starts >= count)
+            if not len(fits):
+                raise ValueError('no block of %s free label indexes' % count)
+            first = int(starts[fits[0]])
+        else:
+            first, run = None, 0
+            for index in range(self.srgb.size):
+                run = 0 if index in self else run + 1
+                if run == count:
+                    first = index - count + 1
+                    break
+            if first is None:
+                raise ValueError('no block of %s free label indexes' % count)
+        for index in range(first, first + count):
+            self.reserve(index)
+        return first
+
+    def reserve_table(self, indexes):
+        """
+        Reserve every configured index of a table in one pass
+        :raise ValueError: the table has conflicts, see find_conflicts()
+        """
+        conflicts = self.find_conflicts(indexes)
+        if conflicts['out_of_range'] or conflicts['duplicates'] or conflicts['in_use']:
+            raise ValueError('label index conflicts: %s' % dict(
+                (k, v[:10]) for k, v in conflicts.items()))
+        if numpy is not None:
+            used = numpy.zeros(len(self.words) * _WORD_BITS, dtype=numpy.uint8)
+            used[numpy.asarray(indexes, dtype=numpy.int64)] = 1
+            packed = numpy.packbits(used, bitorder='little').view('<u8')
+            for word in numpy.flatnonzero(packed):
+                self.words[word] |= int(packed[word])
+            self.used += len(indexes)
+        else:
+            for index in indexes:
+                self.reserve(index)
+
+    def find_conflicts(self, indexes):
+        """
+        Check the label indexes of a whole table at once
+        :param indexes: sequence of label indexes, one per prefix
+        :return: {'out_of_range': [position, ...],
+                  'duplicates': [index used by more than one prefix, ...],
+                  'in_use': [index already allocated, ...]}
+        """
+        if numpy is None:
+            seen = set()
+            out_of_range, duplicates, in_use = [], set(), []
+            for position, index in enumerate(indexes):
+                if not 0 <= index < self.srgb.size:
+                    out_of_range.append(position)
+                elif index in seen:
+                    duplicates.add(index)
+                else:
+                    seen.add(index)
+                    if index in self:
+                        in_use.append(index)
+            return {'out_of_range': out_of_range, 'duplicates': sorted(duplicates), 'in_use': in_use}
+        indexes = numpy.asarray(indexes, dtype=numpy.int64)
+        valid = (indexes >= 0) & (indexes < self.srgb.size)
+        checked = numpy.sort(indexes[valid])
+        duplicates = numpy.unique(checked[1:][checked[1:] == checked[:-1]])
+        in_use = numpy.unique(checked[~self._free_mask()[checked]]) if len(checked) else checked
+        return {'out_of_range': numpy.flatnonzero(~valid).tolist(),
+                'duplicates': duplicates.tolist(),
+                'in_use': in_use.tolist()}
+
+    def stats(self):
+        return {'size': self.srgb.size, 'used': self.used, 'free': self.srgb.size - self.used}
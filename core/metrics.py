@@ -0,0 +1,287 @@
+"""
+Message, byte and prefix counters per peer and message type, exported
+in the Prometheus text format (version 0.0.4).
+
+Counters are plain ints mutated from the event loop (or greenlet) that
+owns the session, there are no locks on the hot path. Totals over all
+peers are sums of the per peer series, a peer that reconnects keeps
+counting in the same series.
+"""
+import bisect
+import logging
+import time
+
+from common import constants as bgp_cons
+
+LOG = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# seconds, encode/decode of one UPDATE up to a full table
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MSG_TYPES = {
+    bgp_cons.MSG_OPEN: 'open',
+    bgp_cons.MSG_UPDATE: 'update',
+    bgp_cons.MSG_NOTIFICATION: 'notification',
+    bgp_cons.MSG_KEEPALIVE: 'keepalive',
+    bgp_cons.MSG_ROUTEREFRESH: 'route_refresh',
+    bgp_cons.MSG_CISCOROUTEREFRESH: 'route_refresh',
+}
+
+
+class Histogram(object):
+    """
+    Cumulative histogram, observe() is one bisect and two additions
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # one slot per bucket and one for +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer(object):
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class PeerMetrics(object):
+    """
+    Counters of one peer, keyed by message type number
+    """
+
+    def __init__(self, peer_id):
+        self.peer_id = peer_id
+        self.messages_sent = {}
+        self.bytes_sent = {}
+        self.messages_received = {}
+        self.bytes_received = {}
+        self.prefixes_advertised = 0
+        self.prefixes_withdrawn = 0
+        self.prefixes_received = 0
+        self.prefixes_withdrawn_received = 0
+        self.decode_seconds = Histogram()
+        # callable returning the bytes waiting to be written to the peer
+        self.queue_depth = None
+        # FSM state and transitions, {(from state, to state): count}
+        self.state = bgp_cons.ST_IDLE
+        self.transitions = {}
+        self.established = 0
+        self.flaps = 0
+
+    def sent(self, msg_type, nbytes):
+        self.messages_sent[msg_type] = self.messages_sent.get(msg_type, 0) + 1
+        self.bytes_sent[msg_type] = self.bytes_sent.get(msg_type, 0) + nbytes
+
+    def received(self, msg_type, nbytes):
+        self.messages_received[msg_type] = self.messages_received.get(msg_type, 0) + 1
+        self.bytes_received[msg_type] = self.bytes_received.get(msg_type, 0) + nbytes
+
+    def count_advertised(self, msg_dict):
+        """
+        Count the labelled routes advertised (or withdrawn) by a config
+        msg_dict, a full table or one reload diff
+        """
+        for type_code, value in (msg_dict.get('attr') or {}).items():
+            if int(type_code) == bgp_cons.BGPTYPE_MP_REACH_NLRI:
+                self.prefixes_advertised += len(value['BGP_PREFIX_SID'])
+            elif int(type_code) == bgp_cons.BGPTYPE_MP_UNREACH_NLRI:
+                self.prefixes_withdrawn += len(value['withdraw'])
+
+    def state_changed(self, old_state, new_state):
+        """
+        Called by core.fsm.FSM on every state change of the peer's session
+        """
+        key = (old_state, new_state)
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        if new_state == bgp_cons.ST_ESTABLISHED:
+            self.established += 1
+        elif old_state == bgp_cons.ST_ESTABLISHED:
+            self.flaps += 1
+        self.state = new_state
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in sorted(labels.items()))
+
+
+def _render_histogram(lines, name, histogram, **labels):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+        cumulative += count
+        lines.append('%s_bucket%s %s' % (name, _labels(le=bound, **labels), cumulative))
+    lines.append('%s_sum%s %r' % (name, _labels(**labels), histogram.sum))
+    lines.append('%s_count%s %s' % (name, _labels(**labels), cumulative))
+
+
+class Metrics(object):
+    """
+    Registry of the peers of one speaker (one worker process)
+    """
+
+    def __init__(self, profiler=None):
+        self.peers = {}
+        # core.profiling.Profiler whose sections are exported too
+        self.profiler = profiler
+        # time to encode a table (or a config diff) for one update group
+        self.encode_seconds = Histogram()
+        self.started = time.time()
+
+    def peer(self, peer_id):
+        metrics = self.peers.get(peer_id)
+        if metrics is None:
+            metrics = self.peers[peer_id] = PeerMetrics(peer_id)
+        return metrics
+
+    def render(self):
+        """
+        :return: the registry in the Prometheus text format
+        """
+        lines = []
+        peers = sorted(self.peers.values(), key=lambda metrics: str(metrics.peer_id))
+        for name, attr, doc in (
+                ('bgp_messages_sent_total', 'messages_sent', 'BGP messages sent'),
+                ('bgp_bytes_sent_total', 'bytes_sent', 'bytes of BGP messages sent'),
+                ('bgp_messages_received_total', 'messages_received', 'BGP messages received'),
+                ('bgp_bytes_received_total', 'bytes_received', 'bytes of BGP messages received')):
+            lines.append('# HELP %s %s' % (name, doc))
+            lines.append('# TYPE %s counter' % name)
+            for metrics in peers:
+                for msg_type, value in sorted(getattr(metrics, attr).items()):
+                    lines.append('%s%s %s' % (name, _labels(peer=metrics.peer_id, type=MSG_TYPES.get(
+                        msg_type, msg_type)), value))
+        for name, attr, doc in (
+                ('bgp_prefixes_advertised_total', 'prefixes_advertised', 'prefixes advertised to the peer'),
+                ('bgp_prefixes_withdrawn_total', 'prefixes_withdrawn', 'prefixes withdrawn from the peer'),
+                ('bgp_prefixes_received_total', 'prefixes_received', 'prefixes received from the peer'),
+                ('bgp_prefixes_withdrawn_received_total', 'prefixes_withdrawn_received',
+                 'prefixes withdrawn by the peer')):
+            lines.append('# HELP %s %s' % (name, doc))
+            lines.append('# TYPE %s counter' % name)
+            for metrics in peers:
+                lines.append('%s%s %s' % (name, _labels(peer=metrics.peer_id), getattr(metrics, attr)))
+
+        lines.append('# HELP bgp_fsm_transitions_total BGP FSM state changes')
+        lines.append('# TYPE bgp_fsm_transitions_total counter')
+        for metrics in peers:
+            for (old_state, new_state), value in sorted(metrics.transitions.items()):
+                lines.append('bgp_fsm_transitions_total%s %s' % (_labels(
+                    peer=metrics.peer_id, **{'from': bgp_cons.stateDescr[old_state],
+                                             'to': bgp_cons.stateDescr[new_state]}), value))
+        for name, attr, doc in (
+                ('bgp_session_established_total', 'established', 'sessions that reached Established'),
+                ('bgp_session_flaps_total', 'flaps', 'Established sessions that went down')):
+            lines.append('# HELP %s %s' % (name, doc))
+            lines.append('# TYPE %s counter' % name)
+            for metrics in peers:
+                lines.append('%s%s %s' % (name, _labels(peer=metrics.peer_id), getattr(metrics, attr)))
+        lines.append('# HELP bgp_session_up 1 while the session is Established')
+        lines.append('# TYPE bgp_session_up gauge')
+        for metrics in peers:
+            lines.append('bgp_session_up%s %s' % (_labels(peer=metrics.peer_id),
+                                                  int(metrics.state == bgp_cons.ST_ESTABLISHED)))
+
+        lines.append('# HELP bgp_output_queue_bytes bytes waiting to be written to the peer')
+        lines.append('# TYPE bgp_output_queue_bytes gauge')
+        for metrics in peers:
+            if metrics.queue_depth is not None:
+                lines.append('bgp_output_queue_bytes%s %s' % (_labels(peer=metrics.peer_id), metrics.queue_depth()))
+
+        lines.append('# HELP bgp_update_decode_seconds time to decode one received UPDATE')
+        lines.append('# TYPE bgp_update_decode_seconds histogram')
+        for metrics in peers:
+            _render_histogram(lines, 'bgp_update_decode_seconds', metrics.decode_seconds, peer=metrics.peer_id)
+        lines.append('# HELP bgp_update_encode_seconds time to encode UPDATEs for one update group')
+        lines.append('# TYPE bgp_update_encode_seconds histogram')
+        _render_histogram(lines, 'bgp_update_encode_seconds', self.encode_seconds)
+        if self.profiler is not None:
+            sections = sorted(self.profiler.sections.values(), key=lambda section: section.name)
+            for kind in ('wall', 'cpu'):
+                name = 'bgp_profile_%s_seconds' % kind
+                lines.append('# HELP %s %s time per call of a profiled code path' % (name, kind))
+                lines.append('# TYPE %s histogram' % name)
+                for section in sections:
+                    _render_histogram(lines, name, getattr(section, kind), section=section.name)
+
+        lines.append('# HELP bgp_start_time_seconds start of the speaker since the epoch')
+        lines.append('# TYPE bgp_start_time_seconds gauge')
+        lines.append('bgp_start_time_seconds %r' % self.started)
+        return '\n'.join(lines) + '\n'
+
+    def http_response(self, request):
+        """
+        Answer one HTTP request, GET /metrics is the only resource
+        :param request: the request bytes, at least the request line
+        :return: the whole response
+        """
+        try:
+            method, path = request.split(b'\r\n', 1)[0].split()[:2]
+        except ValueError:
+            return _response('400 Bad Request', 'bad request\n')
+        if method not in (b'GET', b'HEAD'):
+            return _response('405 Method Not Allowed', 'method not allowed\n')
+        if path.split(b'?', 1)[0] != b'/metrics':
+            return _response('404 Not Found', 'not found\n')
+        return _response('200 OK', self.render(), head=method == b'HEAD')
+
+
+def _response(status, body, head=False):
+    body = body.encode()
+    header = ('HTTP/1.0 %s\r\nContent-Type: %s\r\nContent-Length: %s\r\nConnection: close\r\n\r\n' %
+              (status, CONTENT_TYPE, len(body))).encode()
+    return header if head else header + body
+
+
+def _read_request(sock):
+    request = b''
+    while b'\r\n\r\n' not in request and len(request) < 8192:
+        data = sock.recv(4096)
+        if not data:
+            break
+        request += data
+    return request
+
+
+def serve_metrics(metrics, sock):
+    """
+    Answer scrapes on a listening socket forever, blocking (run it in a
+    greenlet or thread)
+    """
+    while True:
+        conn, _ = sock.accept()
+        try:
+            conn.settimeout(5)
+            conn.sendall(metrics.http_response(_read_request(conn)))
+        except (OSError, ValueError) as e:
+            LOG.debug('metrics request failed: %s', e)
+        finally:
+            conn.close()
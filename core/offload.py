@@ -0,0 +1,224 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import time
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from core.config import RECORD
+from core.config import SID_PATH
+from core.config import PrefixSidTable
+from core.snapshot import SidSnapshot
+from message.update import Update
+
+LOG = logging.getLogger(__name__)
+
+# bytes of UPDATE messages (in or out) below which work stays in the
+# caller, well under the 256 KiB asyncio reads per data_received
+OFFLOAD_THRESHOLD = 64 * 1024
+# rough encoded size of one labelled prefix, used to size encode jobs
+_LABELLED_ROUTE_BYTES = 12
+
+
+def estimate_size(msg_dict):
+    """
+    Rough encoded size of msg_dict, cheap enough to call from the event loop
+    """
+    size = 5 * (len(msg_dict.get('nlri') or ()) + len(msg_dict.get('withdraw') or ()))
+    for type_code, value in (msg_dict.get('attr') or {}).items():
+        if isinstance(value, dict) and 'BGP_PREFIX_SID' in value:
+            size += _LABELLED_ROUTE_BYTES * len(value['BGP_PREFIX_SID'])
+    return size
+
+
+def _disown(shm):
+    # attaching registers the block with the resource tracker again,
+    # only the side that unlinks it may stay registered
+    resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+def _with_table(msg_dict, routes):
+    # copy of msg_dict whose BGP_PREFIX_SID is routes, the original is left alone
+    msg_dict = dict(msg_dict)
+    msg_dict[SID_PATH[0]] = attr = dict(msg_dict[SID_PATH[0]])
+    attr[SID_PATH[1]] = dict(attr[SID_PATH[1]])
+    attr[SID_PATH[1]][SID_PATH[2]] = routes
+    return msg_dict
+
+
+def _prefix_sid_table(msg_dict):
+    mp_reach = (msg_dict.get(SID_PATH[0]) or {}).get(SID_PATH[1])
+    routes = mp_reach.get(SID_PATH[2]) if isinstance(mp_reach, dict) else None
+    return routes if isinstance(routes, PrefixSidTable) else None
+
+
+def _share_table(table):
+    """
+    Copy the records of a core.config.PrefixSidTable into a shared memory block
+    """
+    size = table.count * RECORD.size
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    shm.buf[:size] = memoryview(table.data)[table.records_offset:table.records_offset + size]
+    return shm
+
+
+def _attach_table(name, count, index):
+    shm = shared_memory.SharedMemory(name=name)
+    _disown(shm)
+    try:
+        return PrefixSidTable(bytes(shm.buf[:count * RECORD.size]), count, index=index)
+    finally:
+        shm.close()
+
+
+def _encode_job(msg_dict, asn4, addpath, table=None):
+    """
+    Worker side: encode msg_dict and hand the messages back in a shared memory block
+    :param table: (shared memory name, count, index) of the prefix-SID
+        table left out of msg_dict, see _share_table
+    """
+    if table is not None:
+        msg_dict = _with_table(msg_dict, _attach_table(*table))
+    messages = list(Update.construct_chunks(msg_dict, asn4=asn4, addpath=addpath))
+    total = sum(len(msg) for msg in messages)
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+    offset = 0
+    for msg in messages:
+        shm.buf[offset:offset + len(msg)] = msg
+        offset += len(msg)
+    name = shm.name
+    shm.close()
+    _disown(shm)
+    return name, [len(msg) for msg in messages]
+
+
+def _decode_job(t, name, lengths, asn4, add_path_remote, add_path_local):
+    """
+    Worker side: parse the UPDATE bodies laid out back to back in shared memory
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    _disown(shm)
+    try:
+        results = []
+        offset = 0
+        for length in lengths:
+            result = Update.parse(t, bytes(shm.buf[offset:offset + length]), asn4,
+                                  add_path_remote, add_path_local)
+            # the caller still has the raw message
+            result['hex'] = None
+            results.append(result)
+            offset += length
+        return results
+    finally:
+        shm.close()
+
+
+class CodecPool(object):
+    """
+    Runs bulk UPDATE encode/decode in worker processes so the event loop
+    only frames messages and runs timers.
+
+    Raw message bytes and prefix-SID tables travel through shared memory
+    (snapshots by path) instead of being pickled, jobs smaller than
+    threshold bytes run inline. submit_*
+    return concurrent.futures.Future objects either way (asyncio callers
+    wrap them with asyncio.wrap_future).
+    """
+
+    def __init__(self, max_workers=None, threshold=OFFLOAD_THRESHOLD):
+        self.threshold = threshold
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('fork'))
+        self.offloaded = 0
+        self.inline = 0
+
+    @staticmethod
+    def _done(value):
+        future = concurrent.futures.Future()
+        future.set_result(value)
+        return future
+
+    @staticmethod
+    def _chain(job, finish):
+        # runs in the executor's management thread, off the event loop
+        future = concurrent.futures.Future()
+
+        def done(job_future):
+            try:
+                future.set_result(finish(job_future.result()))
+            except Exception as e:
+                future.set_exception(e)
+        job.add_done_callback(done)
+        return future
+
+    def submit_encode(self, msg_dict, asn4=False, addpath=False):
+        """
+        :return: Future of the list of encoded UPDATE messages
+        """
+        if estimate_size(msg_dict) < self.threshold:
+            self.inline += 1
+            return self._done(list(Update.construct_chunks(msg_dict, asn4=asn4, addpath=addpath)))
+        self.offloaded += 1
+
+        def finish(job_result):
+            name, lengths = job_result
+            shm = shared_memory.SharedMemory(name=name)
+            try:
+                messages = []
+                offset = 0
+                for length in lengths:
+                    messages.append(bytes(shm.buf[offset:offset + length]))
+                    offset += length
+                return messages
+            finally:
+                shm.close()
+                shm.unlink()
+        table = _prefix_sid_table(msg_dict)
+        if table is None or isinstance(table, SidSnapshot):
+            return self._chain(self.executor.submit(_encode_job, msg_dict, asn4, addpath), finish)
+        shm = _share_table(table)
+
+        def release(job_future):
+            shm.close()
+            shm.unlink()
+        job = self.executor.submit(_encode_job, _with_table(msg_dict, None), asn4, addpath,
+                                   (shm.name, table.count, table.index))
+        job.add_done_callback(release)
+        return self._chain(job, finish)
+
+    def submit_decode(self, messages, asn4=False, add_path_remote=False, add_path_local=False):
+        """
+        :param messages: UPDATE message bodies (bytes)
+        :return: Future of the list of Update.parse results, in order
+        """
+        t = time.time()
+        total = sum(len(msg) for msg in messages)
+        if total < self.threshold:
+            self.inline += 1
+            return self._done([Update.parse(t, msg, asn4, add_path_remote, add_path_local)
+                               for msg in messages])
+        self.offloaded += 1
+        shm = shared_memory.SharedMemory(create=True, size=total)
+        offset = 0
+        for msg in messages:
+            shm.buf[offset:offset + len(msg)] = msg
+            offset += len(msg)
+        lengths = [len(msg) for msg in messages]
+
+        def release(job_future):
+            shm.close()
+            shm.unlink()
+
+        def finish(results):
+            for msg, result in zip(messages, results):
+                result['hex'] = msg
+            return results
+        job = self.executor.submit(_decode_job, t, shm.name, lengths, asn4, add_path_remote, add_path_local)
+        job.add_done_callback(release)
+        return self._chain(job, finish)
+
+    def stats(self):
+        return {'offloaded': self.offloaded, 'inline': self.inline, 'threshold': self.threshold}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,207 @@
+import collections
+import errno
+import logging
+import socket
+
+LOG = logging.getLogger(__name__)
+
+# keep each sendmsg() below the kernel's IOV_MAX and a sane size
+_MAX_IOV = 512
+_MAX_BATCH_BYTES = 256 * 1024
+
+
+class _Unkeyed(object):
+    # key of a message queued without one, equal only to itself
+    __slots__ = ()
+
+
+class KeyedQueue(object):
+    """
+    FIFO of unsent messages. A message appended with a key (e.g.
+    message.update.Update.route_key()) replaces the queued one with the
+    same key and moves to the back, the latest state of a route wins and
+    is never sent ahead of an older message that also carries it.
+    """
+
+    def __init__(self):
+        # key -> message, unkeyed messages get a key of their own
+        self.messages = collections.OrderedDict()
+        self.nbytes = 0
+        self.replaced = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages.values())
+
+    def append(self, msg, key=None):
+        """
+        :return: bytes added to the queue, less than len(msg) when a message was replaced
+        """
+        if key is None:
+            key = _Unkeyed()
+        old = self.messages.pop(key, None)
+        self.messages[key] = msg
+        added = len(msg)
+        if old is not None:
+            self.replaced += 1
+            added -= len(old)
+        self.nbytes += added
+        return added
+
+    def popleft(self):
+        """
+        :return: (key, message) of the oldest message, key is None for unkeyed ones
+        """
+        key, msg = self.messages.popitem(last=False)
+        self.nbytes -= len(msg)
+        return (None if isinstance(key, _Unkeyed) else key), msg
+
+
+class OutQueue(object):
+    """
+    Per peer outbound message queue.
+
+    Queued messages are written with one sendmsg() (writev) call per
+    flush, partial writes are resumed on the next flush so the stream is
+    never corrupted. KEEPALIVEs jump ahead of queued UPDATEs so a busy
+    peer does not hit its hold timer. An UPDATE queued with a key (see
+    KeyedQueue) replaces an unsent UPDATE with the same key, the latest
+    state wins. Producers stop queueing UPDATEs while `paused`, set once
+    more than high_watermark bytes are pending and cleared (calling
+    on_resume) when the backlog drops under low_watermark.
+    """
+
+    def __init__(self, sock, high_watermark=1024 * 1024, low_watermark=256 * 1024, notify=None,
+                 on_resume=None):
+        self.sock = sock
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        # called whenever something is queued, e.g. to wake a writer
+        self.notify = notify
+        # called when paused is cleared, e.g. to wake a producer
+        self.on_resume = on_resume
+        self.priority = collections.deque()
+        self.pending = KeyedQueue()
+        self.partial = None
+        self.pending_bytes = 0
+        self.paused = False
+        self.sent_bytes = 0
+        self.sent_messages = 0
+        self.writes = 0
+
+    def __len__(self):
+        return len(self.priority) + len(self.pending) + (1 if self.partial is not None else 0)
+
+    def _queued(self, nbytes):
+        self.pending_bytes += nbytes
+        if not self.paused and self.pending_bytes > self.high_watermark:
+            self.paused = True
+            LOG.debug('output queue above high watermark (%s bytes)', self.pending_bytes)
+        if self.notify is not None:
+            self.notify()
+
+    def enqueue(self, msg, key=None):
+        """
+        Queue an UPDATE (or any message) behind the ones already queued
+        :param key: replacement key, an unsent message with the same key is dropped
+        """
+        self._queued(self.pending.append(msg, key))
+
+    def enqueue_keepalive(self, msg):
+        self.priority.append(msg)
+        self._queued(len(msg))
+
+    def _batch(self):
+        buffers = []
+        nbytes = 0
+        if self.partial is not None:
+            buffers.append(self.partial)
+            nbytes += len(self.partial)
+        for msg in self.priority:
+            if len(buffers) >= _MAX_IOV or nbytes >= _MAX_BATCH_BYTES:
+                break
+            buffers.append(msg)
+            nbytes += len(msg)
+        for msg in self.pending:
+            if len(buffers) >= _MAX_IOV or nbytes >= _MAX_BATCH_BYTES:
+                break
+            buffers.append(msg)
+            nbytes += len(msg)
+        return buffers
+
+    def _write(self, buffers):
+        if hasattr(self.sock, 'sendmsg'):
+            return self.sock.sendmsg(buffers)
+        return self.sock.send(b''.join(buffers))
+
+    def flush(self):
+        """
+        Write as much as the socket takes in one coalesced call
+        :return: bytes written
+        """
+        buffers = self._batch()
+        if not buffers:
+            return 0
+        try:
+            written = self._write(buffers)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            raise
+        self.writes += 1
+        self.sent_bytes += written
+        self.pending_bytes -= written
+        remaining = written
+
+        # drop what went out, keep the unsent tail of a partially sent message
+        if self.partial is not None:
+            if remaining < len(self.partial):
+                self.partial = self.partial[remaining:]
+                remaining = 0
+            else:
+                remaining -= len(self.partial)
+                self.partial = None
+                self.sent_messages += 1
+        while remaining and self.priority:
+            msg = self.priority.popleft()
+            if remaining < len(msg):
+                self.partial = memoryview(msg)[remaining:]
+                remaining = 0
+            else:
+                remaining -= len(msg)
+                self.sent_messages += 1
+        while remaining and self.pending:
+            _, msg = self.pending.popleft()
+            if remaining < len(msg):
+                self.partial = memoryview(msg)[remaining:]
+                remaining = 0
+            else:
+                remaining -= len(msg)
+                self.sent_messages += 1
+
+        if self.paused and self.pending_bytes < self.low_watermark:
+            self.paused = False
+            LOG.debug('output queue below low watermark (%s bytes)', self.pending_bytes)
+            if self.on_resume is not None:
+                self.on_resume()
+        return written
+
+    def drain(self):
+        """
+        Flush until the queue is empty, for blocking (or gevent) sockets
+        """
+        while len(self):
+            self.flush()
+
+    def stats(self):
+        return {
+            'queued_messages': len(self),
+            'queued_bytes': self.pending_bytes,
+            'paused': self.paused,
+            'sent_messages': self.sent_messages,
+            'sent_bytes': self.sent_bytes,
+            'replaced': self.pending.replaced,
+            'writes': self.writes,
+        }
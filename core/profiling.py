@@ -0,0 +1,345 @@
+"""
+Hot path profiling that can be switched on and off in a running speaker.
+
+While profiling is on, the codec entry points in HOOKS are replaced by
+wrappers recording wall and CPU time per call into histograms. They are
+restored when it is turned off, so a speaker that is not being profiled
+runs the original functions. Generators are timed per next(), only the
+work done inside them is counted, not their consumer's.
+
+An optional sampling profiler records the stack of the profiled thread
+every few milliseconds and writes it in the collapsed format of
+flamegraph.pl / speedscope when profiling stops. Time spent in netaddr
+and other libraries shows up there.
+
+Profiling is toggled with SIGUSR1 (SIGUSR2 logs the report) or with the
+one line commands of command(), e.g. over serve_control(). Processes of
+a core.offload.CodecPool are not profiled.
+"""
+import collections
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+
+from core.metrics import Histogram
+from core.outqueue import OutQueue
+from core.session import BGPSession
+from message.attribute.mpreachnlri import MpReachNLRI
+from message.attribute.nlri.labelledunicast import IPv4LabelledUnicast
+from message.update import Update
+
+LOG = logging.getLogger(__name__)
+
+# seconds, from one encoded route to a full table
+PROFILE_BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SAMPLE_INTERVAL = 0.005
+
+# section name, owner, attribute
+HOOKS = (
+    ('update.construct_chunks', Update, 'construct_chunks'),
+    ('update.construct_attributes', Update, 'construct_attributes'),
+    ('update.construct_prefix_v4', Update, 'construct_prefix_v4'),
+    ('update.parse', Update, 'parse'),
+    ('nlri.generate_nlri_subobj', IPv4LabelledUnicast, 'generate_nlri_subobj'),
+    ('mp_reach.construct', MpReachNLRI, 'construct'),
+    ('mp_reach.parse', MpReachNLRI, 'parse'),
+    ('session.send_update', BGPSession, 'send_update'),
+    ('socket.write', OutQueue, '_write'),
+)
+
+
+class Section(object):
+    """
+    Wall and CPU time histograms of one profiled code path
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = Histogram(PROFILE_BUCKETS)
+        self.cpu = Histogram(PROFILE_BUCKETS)
+
+    def record(self, wall, cpu):
+        self.wall.observe(wall)
+        self.cpu.observe(cpu)
+
+    def stats(self):
+        calls = self.wall.count
+        return {'calls': calls, 'wall': self.wall.sum, 'cpu': self.cpu.sum,
+                'mean': self.wall.sum / calls if calls else 0.0}
+
+
+class _Timing(object):
+    __slots__ = ('section', 'wall', 'cpu')
+
+    def __init__(self, section):
+        self.section = section
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.section.record(time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+        return False
+
+
+class _Untimed(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_UNTIMED = _Untimed()
+
+
+def _timed(func, section):
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def timed_generator(*args, **kwargs):
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    wall, cpu = time.perf_counter(), time.thread_time()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        section.record(time.perf_counter() - wall, time.thread_time() - cpu)
+                    yield item
+            finally:
+                generator.close()
+        return timed_generator
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            section.record(time.perf_counter() - wall, time.thread_time() - cpu)
+    return timed
+
+
+class Sampler(object):
+    """
+    Samples the stack of one thread from a background thread
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%s)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='bgp-profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, path):
+        """
+        Write the collapsed stacks ("frame;frame;frame count" per line)
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as data_file:
+            for stack, count in self.stacks.most_common():
+                data_file.write('%s %s\n' % (stack, count))
+        os.replace(tmp_path, path)
+
+
+class Profiler(object):
+    """
+    Owns the profiled sections and installs / removes the HOOKS wrappers
+    """
+
+    def __init__(self, hooks=HOOKS, sample_path=None):
+        self.hooks = hooks
+        self.sections = {}
+        self.enabled = False
+        self.started = None
+        # stack samples are written here when start() is not given a path
+        self.default_sample_path = sample_path
+        self.sample_path = None
+        self.sampler = None
+        # (owner, attribute, original class __dict__ value) of installed hooks
+        self._originals = []
+
+    def get_section(self, name):
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(name)
+        return section
+
+    def section(self, name):
+        """
+        Context manager timing a block into the section name while
+        profiling is on, a shared no-op otherwise
+        """
+        if not self.enabled:
+            return _UNTIMED
+        return _Timing(self.get_section(name))
+
+    def profiled(self, name):
+        """
+        Decorator timing every call while profiling is on
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timing(self.get_section(name)):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _install(self):
+        for name, owner, attr in self.hooks:
+            original = owner.__dict__[attr]
+            section = self.get_section(name)
+            if isinstance(original, classmethod):
+                wrapped = classmethod(_timed(original.__func__, section))
+            elif isinstance(original, staticmethod):
+                wrapped = staticmethod(_timed(original.__func__, section))
+            else:
+                wrapped = _timed(original, section)
+            setattr(owner, attr, wrapped)
+            self._originals.append((owner, attr, original))
+
+    def _uninstall(self):
+        while self._originals:
+            owner, attr, original = self._originals.pop()
+            setattr(owner, attr, original)
+
+    def start(self, sample_path=None):
+        """
+        Turn profiling on, the histograms of an earlier run are kept
+        :param sample_path: also run the sampling profiler, its stacks are written there on stop()
+        """
+        if self.enabled:
+            return False
+        sample_path = sample_path or self.default_sample_path
+        self._install()
+        self.enabled = True
+        self.started = time.monotonic()
+        self.sample_path = sample_path
+        if sample_path is not None:
+            self.sampler = Sampler()
+            self.sampler.start()
+        LOG.info('profiling started%s', ', sampling to %s' % sample_path if sample_path else '')
+        return True
+
+    def stop(self):
+        if not self.enabled:
+            return False
+        self._uninstall()
+        self.enabled = False
+        if self.sampler is not None:
+            self.sampler.stop()
+            try:
+                self.sampler.write(self.sample_path)
+                LOG.info('%s stack samples written to %s', self.sampler.samples, self.sample_path)
+            except OSError as e:
+                LOG.error('cannot write stack samples to %s: %s', self.sample_path, e)
+            self.sampler = None
+        LOG.info('profiling stopped after %.1f seconds', time.monotonic() - self.started)
+        return True
+
+    def toggle(self, sample_path=None):
+        if self.enabled:
+            self.stop()
+        else:
+            self.start(sample_path)
+
+    def reset(self):
+        self.sections = {}
+
+    def report(self):
+        """
+        :return: one line per section, most wall time first
+        """
+        lines = ['%-32s %10s %12s %12s %12s' % ('section', 'calls', 'wall s', 'cpu s', 'mean us')]
+        stats = sorted(((name, section.stats()) for name, section in self.sections.items()),
+                       key=lambda item: -item[1]['wall'])
+        for name, stat in stats:
+            lines.append('%-32s %10d %12.4f %12.4f %12.2f' % (
+                name, stat['calls'], stat['wall'], stat['cpu'], stat['mean'] * 1e6))
+        return '\n'.join(lines)
+
+    def log_report(self):
+        LOG.info('profile report:\n%s', self.report())
+
+    def command(self, line):
+        """
+        Control commands: "start", "stop", "toggle", "reset", "report".
+        Stack samples go to default_sample_path only, a client cannot
+        choose where the speaker writes.
+        :return: reply text
+        """
+        words = line.split()
+        if not words:
+            return 'empty command'
+        if len(words) > 1:
+            return '%s takes no argument' % words[0]
+        if words[0] == 'start':
+            return 'started' if self.start() else 'already running'
+        if words[0] == 'stop':
+            return 'stopped' if self.stop() else 'not running'
+        if words[0] == 'toggle':
+            self.toggle()
+            return 'started' if self.enabled else 'stopped'
+        if words[0] == 'reset':
+            self.reset()
+            return 'reset'
+        if words[0] == 'report':
+            return self.report()
+        return 'unknown command %r' % words[0]
+
+
+PROFILER = Profiler()
+
+
+def serve_control(profiler, sock):
+    """
+    Answer one command per connection on a listening (unix) socket
+    forever, blocking (run it in a greenlet or thread)
+    """
+    while True:
+        conn, _ = sock.accept()
+        try:
+            conn.settimeout(5)
+            line = conn.recv(4096).decode(errors='replace')
+            conn.sendall((profiler.command(line) + '\n').encode())
+        except (OSError, ValueError) as e:
+            LOG.debug('profile control request failed: %s', e)
+        finally:
+            conn.close()
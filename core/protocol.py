@@ -1,60 +1,34 @@
-
-
 import logging
-import traceback
-import struct
-import time
-import netaddr
+
 from twisted.internet import protocol
 
-from bgp.common import constants as bgp_cons
-from bgp.message.open import Open
-from bgp.message.keepalive import KeepAlive
-from bgp.message.update import Update
-from bgp.message.notification import Notification
-from bgp.message.route_refresh import RouteRefresh
-from bgp.common import exception as excep
+from common import constants as bgp_cons
+from core.fsm import FSM
+from core.session import BGPSession
 
 LOG = logging.getLogger(__name__)
 
-class BGP(protocol.Protocol):
-    def __init__(self):
-        self.fsm = None
-        self.peer_id = None
-
-        self.disconnected = False
-        self.receive_buffer = b''
-        self.fourbytesas = False
-        self.add_path_ipv4_receive = False
-        self.add_path_ipv4_send = False
-
-        self.msg_sent_stat = {
-            'Opens': 0,
-            'Notifications': 0,
-            'Updates': 0,
-            'Keepalives': 0,
-            'RouteRefresh': 0
-        }
-        self.msg_recv_stat = {
-            'Opens': 0,
-            'Notifications': 0,
-            'Updates': 0,
-            'Keepalives': 0,
-            'RouteRefresh': 0
-        }
-        # Adj-rib-in
-        self._adj_rib_in = {}
-
-        # Adj-rib-out
-        self._adj_rib_out = {}
-
+class BGP(BGPSession, protocol.Protocol):
     def connectionMade(self):
         self.transport.setTcpNoDelay(True)
-        LOG.info("[%s]TCP Connection established", self.factory.peer_addr)
-        
-
-
-
-
-
-
+        # the peer's IP address, as in the asyncio and gevent speakers
+        self.peer_id = self.transport.getPeer().host
+        self.bind_metrics()
+        LOG.info("[%s]TCP Connection established", self.peer_id)
+        if self.fsm is None:
+            self.fsm = FSM(protocol=self, hold_time=getattr(self.factory, 'hold_time', bgp_cons.HOLD_TIME))
+        self.fsm.connection_made()
+
+    def connectionLost(self, reason=None):
+        self.disconnected = True
+        LOG.info("[%s]TCP Connection lost", self.peer_id)
+        if self.fsm is not None:
+            self.fsm.connection_lost()
+        self.release_peer()
+
+    def dataReceived(self, data):
+        self.data_received(data)
+
+    def close_connection(self):
+        if not self.disconnected:
+            self.transport.loseConnection()
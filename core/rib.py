@@ -0,0 +1,411 @@
+import logging
+import struct
+from array import array
+from collections import OrderedDict
+from socket import inet_aton
+
+from common import constants as bgp_cons
+
+from message.attribute.attribute_cache import AttributeCache
+from message.attribute.nlri.prefix import IPv4Prefix
+from message.attribute.nlri.prefix import MASKS
+
+LOG = logging.getLogger(__name__)
+
+NO_LABEL = 0xFFFFFFFF
+_NONE = -1
+_IPV4 = struct.Struct('!I')
+
+
+class RouteEntry(object):
+    """
+    One route of a RIB, attributes is the interned (shared) attribute set
+    """
+    __slots__ = ('prefix', 'attributes', 'label')
+
+    def __init__(self, prefix, attributes, label=None):
+        self.prefix = prefix
+        self.attributes = attributes
+        self.label = label
+
+    def __eq__(self, other):
+        return (isinstance(other, RouteEntry) and self.prefix == other.prefix and
+                self.attributes is other.attributes and self.label == other.label)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'RouteEntry(%s, label=%s, attributes=%r)' % (self.prefix, self.label, self.attributes)
+
+
+class AttributeSetTable(object):
+    """
+    Interned path attribute sets, routes only keep the integer id.
+    Sets are reference counted and dropped with their last route.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.sets = []
+        self.refs = []
+        self.free = []
+        self._last = (None, None)
+
+    def intern(self, attr_dict):
+        """
+        :param attr_dict: {type_code: value}
+        :return: attribute set id
+        """
+        # routes of one UPDATE share the same dict, skip normalizing it again
+        if attr_dict is self._last[0]:
+            key = self._last[1]
+        else:
+            key = AttributeCache.make_key(attr_dict)[1]
+            self._last = (attr_dict, key)
+        attr_id = self.ids.get(key)
+        if attr_id is None:
+            if self.free:
+                attr_id = self.free.pop()
+                self.sets[attr_id] = attr_dict
+                self.refs[attr_id] = 0
+            else:
+                attr_id = len(self.sets)
+                self.sets.append(attr_dict)
+                self.refs.append(0)
+            self.ids[key] = attr_id
+        self.refs[attr_id] += 1
+        return attr_id
+
+    def release(self, attr_id):
+        self.refs[attr_id] -= 1
+        if not self.refs[attr_id]:
+            del self.ids[AttributeCache.make_key(self.sets[attr_id])[1]]
+            self.sets[attr_id] = None
+            self.free.append(attr_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class AdjRIB(object):
+    """
+    Per peer Adj-RIB-In/Adj-RIB-Out as a path compressed IPv4 radix trie
+    keyed on (network int, prefix_len).
+
+    Nodes live in parallel typed arrays (network, prefix length, two child
+    indexes, attribute set id, label) instead of one Python object each,
+    which keeps a full table at a few tens of bytes per route. Lookups
+    return RouteEntry objects referencing the interned attribute set.
+    Insert, withdraw and longest prefix match walk at most 32 levels.
+    """
+
+    def __init__(self, attr_sets=None):
+        # shared between the RIBs of all peers when passed in
+        self.attr_sets = attr_sets if attr_sets is not None else AttributeSetTable()
+        self.network = array('I')
+        self.prefix_len = array('B')
+        self.child = (array('i'), array('i'))
+        self.attr = array('i')
+        self.label = array('I')
+        self.free = []
+        self.count = 0
+        # node 0 is 0.0.0.0/0 and always present
+        self._alloc(0, 0, _NONE, NO_LABEL)
+
+    def _alloc(self, network, prefix_len, attr_id, label):
+        if self.free:
+            node = self.free.pop()
+            self.network[node] = network
+            self.prefix_len[node] = prefix_len
+            self.child[0][node] = _NONE
+            self.child[1][node] = _NONE
+            self.attr[node] = attr_id
+            self.label[node] = label
+            return node
+        self.network.append(network)
+        self.prefix_len.append(prefix_len)
+        self.child[0].append(_NONE)
+        self.child[1].append(_NONE)
+        self.attr.append(attr_id)
+        self.label.append(label)
+        return len(self.network) - 1
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, node):
+        label = self.label[node]
+        return RouteEntry(IPv4Prefix(self.network[node], self.prefix_len[node]),
+                          self.attr_sets.sets[self.attr[node]],
+                          None if label == NO_LABEL else label)
+
+    def insert(self, prefix, attr_dict, label=None):
+        """
+        Add or replace the route for prefix
+        :param prefix: (network int, prefix_len) pair, e.g. IPv4Prefix
+        :param attr_dict: path attributes of the route
+        :param label: MPLS label or None
+        """
+        network, prefix_len = prefix
+        network &= MASKS[prefix_len]
+        attr_id = self.attr_sets.intern(attr_dict)
+        label = NO_LABEL if label is None else label
+        net, plen, child = self.network, self.prefix_len, self.child
+
+        node = 0
+        while True:
+            node_len = plen[node]
+            if node_len == prefix_len:
+                # exact match, replace the route
+                if self.attr[node] == _NONE:
+                    self.count += 1
+                else:
+                    self.attr_sets.release(self.attr[node])
+                self.attr[node] = attr_id
+                self.label[node] = label
+                return
+            bit = (network >> (31 - node_len)) & 1
+            next_node = child[bit][node]
+            if next_node == _NONE:
+                child[bit][node] = self._alloc(network, prefix_len, attr_id, label)
+                self.count += 1
+                return
+            next_len = plen[next_node]
+            common = min(prefix_len, next_len, 32 - (network ^ net[next_node]).bit_length())
+            if common == next_len:
+                node = next_node
+                continue
+            if common == prefix_len:
+                # new route sits between node and next_node
+                new = self._alloc(network, prefix_len, attr_id, label)
+                child[(net[next_node] >> (31 - prefix_len)) & 1][new] = next_node
+            else:
+                # diverge below node, add a glue node without a route
+                new = self._alloc(network & MASKS[common], common, _NONE, NO_LABEL)
+                leaf = self._alloc(network, prefix_len, attr_id, label)
+                child[(network >> (31 - common)) & 1][new] = leaf
+                child[(net[next_node] >> (31 - common)) & 1][new] = next_node
+            child[bit][node] = new
+            self.count += 1
+            return
+
+    def _find(self, network, prefix_len):
+        """
+        :return: (node, parent, bit of node under parent), node is _NONE if absent
+        """
+        net, plen, child = self.network, self.prefix_len, self.child
+        node, parent, bit = 0, _NONE, 0
+        while True:
+            node_len = plen[node]
+            if node_len > prefix_len or (network ^ net[node]) & MASKS[node_len]:
+                return _NONE, parent, bit
+            if node_len == prefix_len:
+                return node, parent, bit
+            parent, bit = node, (network >> (31 - node_len)) & 1
+            node = child[bit][node]
+            if node == _NONE:
+                return _NONE, parent, bit
+
+    def get(self, prefix):
+        network, prefix_len = prefix
+        node = self._find(network & MASKS[prefix_len], prefix_len)[0]
+        if node == _NONE or self.attr[node] == _NONE:
+            return None
+        return self._entry(node)
+
+    def __contains__(self, prefix):
+        return self.get(prefix) is not None
+
+    def withdraw(self, prefix):
+        """
+        Remove the route for prefix
+        :return: the removed RouteEntry or None
+        """
+        network, prefix_len = prefix
+        node, parent, bit = self._find(network & MASKS[prefix_len], prefix_len)
+        if node == _NONE or self.attr[node] == _NONE:
+            return None
+        entry = self._entry(node)
+        self.attr_sets.release(self.attr[node])
+        self.attr[node] = _NONE
+        self.label[node] = NO_LABEL
+        self.count -= 1
+        if node:
+            self._compact(node, parent, bit)
+        return entry
+
+    def _compact(self, node, parent, bit):
+        # splice out a node without a route and with less than two children,
+        # then its parent if that was a glue node left with one child
+        child = self.child
+        left, right = child[0][node], child[1][node]
+        if left != _NONE and right != _NONE:
+            return
+        child[bit][parent] = left if left != _NONE else right
+        self.free.append(node)
+        if parent and self.attr[parent] == _NONE:
+            left, right = child[0][parent], child[1][parent]
+            if left == _NONE or right == _NONE:
+                _, grand, parent_bit = self._find(self.network[parent], self.prefix_len[parent])
+                child[parent_bit][grand] = left if left != _NONE else right
+                self.free.append(parent)
+
+    def longest_match(self, address, prefix_len=32):
+        """
+        Longest prefix match
+        :param address: IPv4 address (or network) as int
+        :return: RouteEntry or None
+        """
+        net, plen, child, attr = self.network, self.prefix_len, self.child, self.attr
+        node, best = 0, _NONE
+        while node != _NONE:
+            node_len = plen[node]
+            if node_len > prefix_len or (address ^ net[node]) & MASKS[node_len]:
+                break
+            if attr[node] != _NONE:
+                best = node
+            if node_len == 32:
+                break
+            node = child[(address >> (31 - node_len)) & 1][node]
+        return None if best == _NONE else self._entry(best)
+
+    def subtree(self, prefix):
+        """
+        Enumerate every route equal to or more specific than prefix
+        """
+        network, prefix_len = prefix
+        network &= MASKS[prefix_len]
+        net, plen, child, attr = self.network, self.prefix_len, self.child, self.attr
+        node = 0
+        # find the top most node inside prefix
+        while node != _NONE:
+            node_len = plen[node]
+            if node_len >= prefix_len:
+                if (net[node] ^ network) & MASKS[prefix_len]:
+                    return
+                break
+            if (network ^ net[node]) & MASKS[node_len]:
+                return
+            node = child[(network >> (31 - node_len)) & 1][node]
+        stack = [node] if node != _NONE else []
+        while stack:
+            node = stack.pop()
+            if attr[node] != _NONE:
+                yield self._entry(node)
+            # push right first so routes come out in address order
+            for next_node in (child[1][node], child[0][node]):
+                if next_node != _NONE:
+                    stack.append(next_node)
+
+    def __iter__(self):
+        return self.subtree((0, 0))
+
+    def clear(self):
+        for attr_id in self.attr:
+            if attr_id != _NONE:
+                self.attr_sets.release(attr_id)
+        self.__init__(self.attr_sets)
+
+    def memory_usage(self):
+        """
+        Bytes held by the trie arrays (attribute sets not included)
+        """
+        return sum(a.buffer_info()[1] * a.itemsize for a in (
+            self.network, self.prefix_len, self.child[0], self.child[1], self.attr, self.label))
+
+
+def as_path_length(as_path):
+    """
+    AS_PATH length for best path selection, an AS_SET counts as one and
+    confederation segments are not counted
+    """
+    length = 0
+    for seg_type, segment in as_path or ():
+        if seg_type == bgp_cons.AS_SEQUENCE:
+            length += len(segment)
+        elif seg_type == bgp_cons.AS_SET:
+            length += 1
+    return length
+
+
+class LocRIB(object):
+    """
+    Loc-RIB fed from the Adj-RIB-In of every peer.
+
+    Best path selection follows RFC 4271 9.1.2.2: highest LOCAL_PREF,
+    shortest AS_PATH, lowest ORIGIN, lowest MED (compared across all
+    neighbor ASes) and lowest BGP identifier. A change in one peer's
+    Adj-RIB-In recomputes only that prefix; prefixes whose best path
+    changed are queued once on the dirty queue for outbound processing.
+    """
+
+    def __init__(self):
+        self.peers = {}
+        # prefix -> (peer_id, RouteEntry)
+        self.best = {}
+        # prefix -> None, insertion ordered and deduplicated
+        self.dirty = OrderedDict()
+        self.recomputed = 0
+
+    def add_peer(self, peer_id, adj_rib_in, router_id):
+        """
+        :param router_id: BGP identifier from the peer's OPEN, dotted string
+        """
+        self.peers[peer_id] = (adj_rib_in, _IPV4.unpack(inet_aton(router_id))[0])
+
+    def remove_peer(self, peer_id):
+        adj_rib_in, _ = self.peers.pop(peer_id, (None, None))
+        if adj_rib_in is not None:
+            for entry in adj_rib_in:
+                self.update(entry.prefix)
+
+    @staticmethod
+    def preference(entry, router_id):
+        """
+        Sort key of a candidate path, smaller is better
+        """
+        attr = entry.attributes
+        return (-attr.get(bgp_cons.BGPTYPE_LOCAL_PREF, 100),
+                as_path_length(attr.get(bgp_cons.BGPTYPE_AS_PATH)),
+                attr.get(bgp_cons.BGPTYPE_ORIGIN, 2),
+                attr.get(bgp_cons.BGPTYPE_MULTI_EXIT_DISC, 0),
+                router_id)
+
+    def update(self, prefix):
+        """
+        Re-run best path selection for one prefix after an Adj-RIB-In change
+        :return: True when the best path changed
+        """
+        prefix = IPv4Prefix(*prefix)
+        self.recomputed += 1
+        best = None
+        best_key = None
+        for peer_id, (adj_rib_in, router_id) in self.peers.items():
+            entry = adj_rib_in.get(prefix)
+            if entry is None:
+                continue
+            key = self.preference(entry, router_id)
+            if best is None or key < best_key:
+                best, best_key = (peer_id, entry), key
+        current = self.best.get(prefix)
+        if current == best:
+            return False
+        if best is None:
+            del self.best[prefix]
+        else:
+            self.best[prefix] = best
+        self.dirty[prefix] = None
+        return True
+
+    def pop_dirty(self):
+        """
+        Drain the dirty queue
+        :return: generator of (prefix, (peer_id, RouteEntry)), None for withdrawn prefixes
+        """
+        while self.dirty:
+            prefix, _ = self.dirty.popitem(last=False)
+            yield prefix, self.best.get(prefix)
+
+    def __len__(self):
+        return len(self.best)
@@ -0,0 +1,264 @@
+import logging
+import struct
+import time
+import traceback
+
+from common import constants as bgp_cons
+from message.open import Open
+from message.keepalive import KeepAlive
+from message.update import Update
+from message.notification import Notification
+from common import exception as excep
+from common.log import HexDump
+from core.framer import BGPFramer
+from core.rib import AdjRIB
+from core.updategroup import negotiated_capabilities
+
+LOG = logging.getLogger(__name__)
+
+
+class BGPSession(object):
+    """
+    Event loop independent half of a BGP peer session.
+
+    Subclasses bind it to a transport (Twisted in core.protocol, asyncio
+    in core.aio): they set self.transport (anything with write() and
+    close(), Twisted overrides close_connection()), self.factory
+    (speaker config, see core.factory.BGPFactory) and create self.fsm.
+    """
+
+    def __init__(self):
+        self.fsm = None
+        self.peer_id = None
+        self.peer_bgp_id = None
+        self.peer_capabilities = {}
+        # capabilities both sides advertised, see negotiated_capabilities()
+        self.capabilities = {}
+
+        self.disconnected = False
+        self.receive_buffer = b''
+        self.framer = BGPFramer()
+        self.fourbytesas = False
+        self.add_path_ipv4_receive = False
+        self.add_path_ipv4_send = False
+        # core.metrics.PeerMetrics once bound to the speaker's registry
+        self.metrics = None
+
+        self.msg_sent_stat = {
+            'Opens': 0,
+            'Notifications': 0,
+            'Updates': 0,
+            'Keepalives': 0,
+            'RouteRefresh': 0
+        }
+        self.msg_recv_stat = {
+            'Opens': 0,
+            'Notifications': 0,
+            'Updates': 0,
+            'Keepalives': 0,
+            'RouteRefresh': 0
+        }
+        # Adj-rib-in
+        self._adj_rib_in = AdjRIB()
+
+    def data_received(self, data):
+        """
+        Frame received bytes and handle every complete message
+        """
+        try:
+            self.framer.feed(data)
+            for msg_type, msg in self.framer.frames():
+                self.receive_message(msg_type, msg)
+        except excep.NotificationSent as e:
+            LOG.error(e)
+            LOG.debug(traceback.format_exc())
+            self.fsm.error(e)
+
+    @property
+    def adj_rib_out(self):
+        """
+        Routes advertised to the peer, shared by its update group
+        """
+        update_groups = getattr(self.factory, 'update_groups', None)
+        group = update_groups.peer_group.get(self.peer_id) if update_groups is not None else None
+        return group.adj_rib_out if group is not None else None
+
+    def bind_metrics(self):
+        """
+        Count this session in the speaker's core.metrics.Metrics, if it has one
+        """
+        metrics = getattr(self.factory, 'metrics', None)
+        if metrics is not None:
+            self.metrics = metrics.peer(self.peer_id)
+
+    def release_peer(self):
+        """
+        Session gone, drop the peer from the Loc-RIB and its update group
+        """
+        loc_rib = getattr(self.factory, 'loc_rib', None)
+        if loc_rib is not None:
+            loc_rib.remove_peer(self.peer_id)
+        update_groups = getattr(self.factory, 'update_groups', None)
+        if update_groups is not None:
+            update_groups.leave(self.peer_id)
+
+    def receive_message(self, msg_type, msg):
+        """
+        Dispatch one framed message to the FSM
+        :param msg_type: message type from the header
+        :param msg: message body (memoryview)
+        """
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug('[%s]received message type %s: %s', self.peer_id, msg_type, HexDump(msg))
+        if self.metrics is not None:
+            self.metrics.received(msg_type, bgp_cons.HDR_LEN + len(msg))
+        if msg_type == bgp_cons.MSG_OPEN:
+            self.msg_recv_stat['Opens'] += 1
+            open_msg = Open().parse(bytes(msg))
+            capabilities = open_msg['Capabilities']
+            self.peer_capabilities = capabilities
+            self.capabilities = negotiated_capabilities(self.factory.my_capability, capabilities)
+            self.fourbytesas = self.capabilities['four_bytes_as']
+            self.peer_bgp_id = open_msg['bgpID']
+            self.fsm.open_received(open_msg['holdTime'])
+        elif msg_type == bgp_cons.MSG_KEEPALIVE:
+            self.msg_recv_stat['Keepalives'] += 1
+            if len(msg):
+                raise excep.MessageHeaderError(sub_error=bgp_cons.ERR_MSG_HDR_BAD_MSG_LEN, data='')
+            self.fsm.keep_alive_received()
+        elif msg_type == bgp_cons.MSG_UPDATE:
+            self.msg_recv_stat['Updates'] += 1
+            self.fsm.update_received()
+            start = time.perf_counter()
+            result = Update.parse(time.time(), msg, self.fourbytesas, self.add_path_ipv4_receive)
+            if self.metrics is not None:
+                self.metrics.decode_seconds.observe(time.perf_counter() - start)
+            self.apply_update(result)
+        elif msg_type == bgp_cons.MSG_NOTIFICATION:
+            self.msg_recv_stat['Notifications'] += 1
+            LOG.info('[%s]Notification received, %r', self.peer_id, bytes(msg[:2]))
+            self.fsm.notification_received()
+        elif msg_type in (bgp_cons.MSG_ROUTEREFRESH, bgp_cons.MSG_CISCOROUTEREFRESH):
+            self.msg_recv_stat['RouteRefresh'] += 1
+        else:
+            raise excep.MessageHeaderError(sub_error=bgp_cons.ERR_MSG_HDR_BAD_MSG_TYPE,
+                                           data=struct.pack('!B', msg_type))
+
+    def send_open(self):
+        open_msg = Open(version=bgp_cons.VERSION, asn=self.factory.my_asn,
+                        hold_time=getattr(self.factory, 'hold_time', bgp_cons.HOLD_TIME),
+                        bgp_id=self.factory.bgp_id)
+        msg = open_msg.construct(self.factory.my_capability)
+        self.transport.write(msg)
+        self.msg_sent_stat['Opens'] += 1
+        if self.metrics is not None:
+            self.metrics.sent(bgp_cons.MSG_OPEN, len(msg))
+
+    def send_keepalive(self):
+        msg = KeepAlive().construct()
+        self.transport.write(msg)
+        self.msg_sent_stat['Keepalives'] += 1
+        if self.metrics is not None:
+            self.metrics.sent(bgp_cons.MSG_KEEPALIVE, len(msg))
+        self.fsm.message_sent()
+
+    def send_update(self, msg):
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug('[%s]sending UPDATE: %s', self.peer_id, HexDump(msg))
+        self.transport.write(msg)
+        self.msg_sent_stat['Updates'] += 1
+        if self.metrics is not None:
+            self.metrics.sent(bgp_cons.MSG_UPDATE, len(msg))
+        self.fsm.message_sent()
+
+    def send_notification(self, error, sub_error, data=b''):
+        if not isinstance(data, bytes):
+            data = str(data).encode()
+        msg = Notification().construct(error, sub_error, data)
+        self.transport.write(msg)
+        self.msg_sent_stat['Notifications'] += 1
+        if self.metrics is not None:
+            self.metrics.sent(bgp_cons.MSG_NOTIFICATION, len(msg))
+
+    def connection_established(self):
+        """
+        Session reached Established, advertise the configured routes
+        """
+        loc_rib = getattr(self.factory, 'loc_rib', None)
+        if loc_rib is not None:
+            loc_rib.add_peer(self.peer_id, self._adj_rib_in, self.peer_bgp_id)
+        msg_dict = getattr(self.factory, 'msg_dict', None)
+        if msg_dict:
+            update_groups = getattr(self.factory, 'update_groups', None)
+            if update_groups is not None:
+                group = update_groups.join(self.peer_id, self.send_update, self.capabilities)
+                group.send_table(self.peer_id, msg_dict)
+            else:
+                for msg in Update.construct_chunks(msg_dict, asn4=self.fourbytesas):
+                    self.send_update(msg)
+            self.count_advertised(msg_dict)
+
+    def apply_update(self, result):
+        """
+        Check a parsed UPDATE and apply it to the RIBs
+        :param result: Update.parse() result
+        """
+        if result['sub_error']:
+            raise excep.UpdateMessageError(sub_error=result['sub_error'], data=result['err_data'])
+        self.update_adj_rib_in(result)
+
+    def update_adj_rib_in(self, result):
+        """
+        Apply a parsed UPDATE to the Adj-RIB-In and re-run best path
+        selection for the prefixes it touched
+        :param result: Update.parse() result
+        """
+        attr = result['attr'] or {}
+        path_attr = dict((k, v) for k, v in attr.items()
+                         if k not in (bgp_cons.BGPTYPE_MP_REACH_NLRI, bgp_cons.BGPTYPE_MP_UNREACH_NLRI))
+        changed = []
+        withdrawn = len(result['withdraw'])
+        received = len(result['nlri'])
+        mp_unreach = attr.get(bgp_cons.BGPTYPE_MP_UNREACH_NLRI)
+        if mp_unreach and isinstance(mp_unreach['withdraw'], list):
+            for route in mp_unreach['withdraw']:
+                prefix = (route.prefix, route.prefix_len)
+                if self._adj_rib_in.withdraw(prefix) is not None:
+                    changed.append(prefix)
+            withdrawn += len(mp_unreach['withdraw'])
+        for prefix in result['withdraw']:
+            if isinstance(prefix, dict):
+                prefix = prefix['prefix']
+            if self._adj_rib_in.withdraw(prefix) is not None:
+                changed.append(prefix)
+        for prefix in result['nlri']:
+            if isinstance(prefix, dict):
+                prefix = prefix['prefix']
+            self._adj_rib_in.insert(prefix, path_attr)
+            changed.append(prefix)
+        mp_reach = attr.get(bgp_cons.BGPTYPE_MP_REACH_NLRI)
+        if mp_reach and isinstance(mp_reach['nlri'], list):
+            for route in mp_reach['nlri']:
+                prefix = (route.prefix, route.prefix_len)
+                self._adj_rib_in.insert(prefix, path_attr, route.labels[0])
+                changed.append(prefix)
+            received += len(mp_reach['nlri'])
+        if self.metrics is not None:
+            self.metrics.prefixes_withdrawn_received += withdrawn
+            self.metrics.prefixes_received += received
+        loc_rib = getattr(self.factory, 'loc_rib', None)
+        if loc_rib is not None and self.peer_id in loc_rib.peers:
+            for prefix in changed:
+                loc_rib.update(prefix)
+
+    def count_advertised(self, msg_dict):
+        """
+        Count the labelled routes advertised (or withdrawn) by msg_dict,
+        the Adj-RIB-Out itself is kept by the update group
+        """
+        if self.metrics is not None:
+            self.metrics.count_advertised(msg_dict)
+
+    def close_connection(self):
+        if not self.disconnected:
+            self.transport.close()
@@ -0,0 +1,129 @@
+"""
+Binary snapshot of the prefix-SID table.
+
+    header     !4sHHIII  magic "PSID", version, record size, record count,
+                         attribute JSON length, reserved
+    attributes           the config without its routes, JSON
+    index      257 x !I  first record of every first network octet
+    records    count x !IBI  network, prefix length, label index,
+                             sorted by (network, prefix length)
+
+A snapshot is loaded with mmap and read in place, nothing is parsed per
+route until it is used.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from core.config import RECORD
+from core.config import SID_PATH
+from core.config import PrefixSidTable
+from core.config import config_srgb
+from core.config import load_config
+from core.labels import LabelIndexAllocator
+
+MAGIC = b'PSID'
+VERSION = 1
+_HEADER = struct.Struct('!4sHHIII')
+_INDEX = struct.Struct('!257I')
+
+
+def is_snapshot(path):
+    with open(path, 'rb') as data_file:
+        return data_file.read(len(MAGIC)) == MAGIC
+
+
+def write_snapshot(path, msg_dict, prefix_sids):
+    """
+    :param msg_dict: config, its BGP_PREFIX_SID list is not written
+    :param prefix_sids: iterable of validated (prefix, index), later
+        duplicates win, or a core.config.PrefixSidTable
+    """
+    table = prefix_sids if isinstance(prefix_sids, PrefixSidTable) else PrefixSidTable.from_pairs(prefix_sids)
+
+    attr = dict((str(type_code), value) for type_code, value in (msg_dict.get('attr') or {}).items())
+    if SID_PATH[1] in attr:
+        attr[SID_PATH[1]] = dict((k, v) for k, v in attr[SID_PATH[1]].items()
+                                 if k not in ('BGP_PREFIX_SID', 'BGP_PREFIX_SID_FILE'))
+    attr_json = json.dumps(attr, sort_keys=True).encode()
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as data_file:
+        data_file.write(_HEADER.pack(MAGIC, VERSION, RECORD.size, table.count, len(attr_json), 0))
+        data_file.write(attr_json)
+        data_file.write(_INDEX.pack(*table.index))
+        data_file.write(memoryview(table.data)[table.records_offset:table.records_offset + table.count * RECORD.size])
+    # readers holding the old mmap keep their (unlinked) copy
+    os.replace(tmp_path, path)
+    return table.count
+
+
+def convert(json_path, path):
+    """
+    Build a snapshot from a JSON config (and its BGP_PREFIX_SID_FILE),
+    automatically assigned label indexes are written out
+    """
+    msg_dict = load_config(json_path)
+    mp_reach = msg_dict.get('attr', {}).get(SID_PATH[1]) or {}
+    routes = mp_reach.get('BGP_PREFIX_SID', ())
+    if not isinstance(routes, PrefixSidTable):
+        routes = (item for prefix_sid in routes for item in prefix_sid.items())
+    return write_snapshot(path, msg_dict, routes)
+
+
+class SidSnapshot(PrefixSidTable):
+    """
+    core.config.PrefixSidTable reading the records of a snapshot file in
+    place through a read only mmap. write_snapshot() replaces the file
+    with a new one, a mapped snapshot keeps reading the old file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as data_file:
+            self.mmap = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count, attr_len, _ = _HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError('%s is not a version %s prefix-SID snapshot' % (path, VERSION))
+        self.attr = json.loads(self.mmap[_HEADER.size:_HEADER.size + attr_len].decode())
+        index_offset = _HEADER.size + attr_len
+        records_offset = index_offset + _INDEX.size
+        if len(self.mmap) != records_offset + count * RECORD.size:
+            raise ValueError('%s is truncated' % path)
+        super(SidSnapshot, self).__init__(self.mmap, count, records_offset, _INDEX.unpack_from(self.mmap, index_offset))
+
+    def __reduce__(self):
+        # worker processes map the file themselves
+        return SidSnapshot, (self.path,)
+
+
+def load_snapshot(path):
+    """
+    :return: config dictionary whose BGP_PREFIX_SID is a SidSnapshot
+    """
+    snapshot = SidSnapshot(path)
+    attr = snapshot.attr
+    mp_reach = attr.setdefault(SID_PATH[1], {})
+    mp_reach['BGP_PREFIX_SID'] = snapshot
+    msg_dict = {'attr': attr}
+    srgb = config_srgb(msg_dict)
+    if srgb is not None:
+        # one vectorized pass over the mapped indexes
+        snapshot.allocator = LabelIndexAllocator(srgb)
+        snapshot.allocator.reserve_table(snapshot.array()['index'] if numpy is not None else
+                                         [index for _, _, index in snapshot.records()])
+    return msg_dict
+
+
+if __name__ == '__main__':
+    # python -m core.snapshot BGP_PREFIX_SID.json BGP_PREFIX_SID.snap
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m core.snapshot <config.json> <snapshot>')
+    print('%s routes written to %s' % (convert(sys.argv[1], sys.argv[2]), sys.argv[2]))
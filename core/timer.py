@@ -1,5 +1,5 @@
 
-from twisted.internet import reactor, error
+from twisted.internet import reactor, error, task
 
 class BGPTimer(object):
 
@@ -24,3 +24,12 @@ class BGPTimer(object):
             return self.delayed_call.active()
         except AttributeError:
             return False
+
+
+def start_timer_wheel(wheel):
+    """
+    Turn a core.timerwheel.TimerWheel from the reactor, one call per tick
+    """
+    loop = task.LoopingCall(wheel.tick)
+    loop.start(wheel.resolution, now=False)
+    return loop
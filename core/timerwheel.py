@@ -0,0 +1,133 @@
+import logging
+import time
+
+LOG = logging.getLogger(__name__)
+
+_SLOT_BITS = 8
+_SLOTS = 1 << _SLOT_BITS
+_SLOT_MASK = _SLOTS - 1
+_LEVELS = 4
+_MAX_DELTA = (1 << (_SLOT_BITS * _LEVELS)) - 1
+
+
+class WheelTimer(object):
+    """
+    One timer on a TimerWheel, same interface as core.timer.BGPTimer
+    """
+    __slots__ = ('wheel', 'callable', 'expires', 'slot')
+
+    def __init__(self, call_able, wheel):
+        self.wheel = wheel
+        self.callable = call_able
+        self.expires = None
+        self.slot = None
+
+    def cancel(self):
+        self.wheel.remove(self)
+
+    def reset(self, seconds_fromnow):
+        self.wheel.arm(self, seconds_fromnow)
+
+    def active(self):
+        return self.slot is not None
+
+
+class TimerWheel(object):
+    """
+    Hierarchical timing wheel (4 levels of 256 slots) for peer timers.
+
+    Arming, resetting and cancelling a timer are O(1) set operations,
+    timers are kept in the slot of the level matching how far away they
+    expire and cascade down a level as the wheel turns. Every timer due in
+    the same tick (e.g. the keepalives of thousands of peers) is fired in
+    one pass over its slot. tick() has to be called every `resolution`
+    seconds by the event loop in use (see drive_timer_wheel in bgp_main or
+    core.timer.start_timer_wheel for Twisted).
+    """
+
+    def __init__(self, resolution=0.5, clock=time.monotonic):
+        self.resolution = resolution
+        self.clock = clock
+        self.start = clock()
+        self.current = 0
+        self.wheels = [[set() for _ in range(_SLOTS)] for _ in range(_LEVELS)]
+        self.count = 0
+        self.fired = 0
+
+    def timer(self, call_able):
+        """
+        Create a timer, usable as FSM(timer_cls=wheel.timer)
+        """
+        return WheelTimer(call_able, self)
+
+    def _place(self, timer):
+        expires = timer.expires
+        if expires < self.current:
+            expires = timer.expires = self.current
+        delta = min(expires - self.current, _MAX_DELTA)
+        level = 0
+        while delta >= _SLOTS:
+            delta >>= _SLOT_BITS
+            level += 1
+        slot = self.wheels[level][(expires >> (_SLOT_BITS * level)) & _SLOT_MASK]
+        slot.add(timer)
+        timer.slot = slot
+
+    def arm(self, timer, seconds_fromnow):
+        if timer.slot is not None:
+            timer.slot.discard(timer)
+        else:
+            self.count += 1
+        now_tick = int((self.clock() - self.start) / self.resolution)
+        # at least one tick away, round up partial ticks; current is the
+        # next tick to process, counting from it would fire a tick late
+        timer.expires = now_tick + max(1, int(-(-seconds_fromnow // self.resolution)))
+        self._place(timer)
+
+    def remove(self, timer):
+        if timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self.count -= 1
+
+    def _cascade(self, level):
+        index = (self.current >> (_SLOT_BITS * level)) & _SLOT_MASK
+        slot = self.wheels[level][index]
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            self._place(timer)
+        return index
+
+    def tick(self, now=None):
+        """
+        Advance the wheel to now and fire everything that expired
+        :return: number of timers fired
+        """
+        if now is None:
+            now = self.clock()
+        target = int((now - self.start) / self.resolution)
+        fired = 0
+        while self.current <= target:
+            index = self.current & _SLOT_MASK
+            if index == 0:
+                level = 1
+                while level < _LEVELS and self._cascade(level) == 0:
+                    level += 1
+            due = self.wheels[0][index]
+            if due:
+                # the timers keep due as their slot until they fire, so a
+                # callback cancelling or re-arming one of them takes it out
+                self.wheels[0][index] = set()
+                while due:
+                    timer = due.pop()
+                    timer.slot = None
+                    self.count -= 1
+                    try:
+                        timer.callable()
+                    except Exception as e:
+                        LOG.error('timer callback failed: %s', e)
+                    fired += 1
+            self.current += 1
+        self.fired += fired
+        return fired
@@ -0,0 +1,220 @@
+import logging
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from common import constants as bgp_cons
+from core.config import config_srgb
+from core.rib import AdjRIB
+from message.attribute.nlri.prefix import IPv4Prefix
+from message.update import Update
+
+LOG = logging.getLogger(__name__)
+
+
+def _add_path_send(local, peer):
+    # "<afi/safi>_<receive|send|both>" as in Open.parse, path identifiers
+    # are sent when we send them and the peer receives them
+    if not local or not peer:
+        return False
+    local_afi_safi, local_mode = local.rsplit('_', 1)
+    peer_afi_safi, peer_mode = peer.rsplit('_', 1)
+    return local_afi_safi == peer_afi_safi and local_mode in ('send', 'both') and peer_mode in ('receive', 'both')
+
+
+def negotiated_capabilities(local, peer):
+    """
+    Capabilities in effect on a session, those both speakers advertised
+    :param local: capabilities sent in our OPEN (factory.my_capability)
+    :param peer: capabilities of the peer's OPEN as returned by Open.parse
+    :return: {'four_bytes_as': bool, 'add_path': bool (we send path
+        identifiers), 'afi_safi': [(afi, safi), ...]}
+    """
+    local_afi_safi = set(local.get('afi_safi') or ())
+    return {'four_bytes_as': bool(local.get('four_bytes_as') and peer.get('four_bytes_as')),
+            'add_path': _add_path_send(local.get('add_path'), peer.get('add_path')),
+            'afi_safi': [afi_safi for afi_safi in peer.get('afi_safi') or () if afi_safi in local_afi_safi]}
+
+
+class UpdateGroup(object):
+    """
+    Peers sharing negotiated capabilities and export policy.
+
+    UPDATE messages are encoded once per group and the same bytes objects
+    are written to every member. The encoded table is kept so that a peer
+    joining later is sent the cached messages instead of a fresh encode.
+    Members are sent the same routes, so they share one Adj-RIB-Out,
+    updated once per table or change. msg_dict is treated as immutable,
+    pass a new dict for a new table.
+    """
+
+    def __init__(self, key, encode_seconds=None):
+        self.key = key
+        self.asn4, self.add_path, self.afi_safi, self.policy = key
+        # peer_id -> callable writing one message to the peer
+        self.members = {}
+        self.msg_dict = None
+        self.messages = []
+        self.encode_count = 0
+        self.send_count = 0
+        # core.metrics.Histogram of encode times
+        self.encode_seconds = encode_seconds
+        self.adj_rib_out = AdjRIB()
+
+    def _construct(self, msg_dict):
+        start = time.perf_counter()
+        messages = list(Update.construct_chunks(msg_dict, asn4=self.asn4, addpath=self.add_path))
+        if self.encode_seconds is not None:
+            self.encode_seconds.observe(time.perf_counter() - start)
+        self.encode_count += len(messages)
+        return messages
+
+    def _set_table(self, msg_dict, messages):
+        self.messages = messages
+        self.msg_dict = msg_dict
+        self.adj_rib_out.clear()
+        self.update_adj_rib_out(msg_dict)
+
+    def encode(self, msg_dict):
+        if msg_dict is not self.msg_dict:
+            self._set_table(msg_dict, self._construct(msg_dict))
+        return self.messages
+
+    def seed(self, msg_dict, messages):
+        """
+        Use messages encoded elsewhere (e.g. core.offload.CodecPool) for msg_dict
+        """
+        self._set_table(msg_dict, messages)
+        self.encode_count += len(messages)
+
+    def update_adj_rib_out(self, msg_dict):
+        """
+        Record the labelled routes advertised (or withdrawn) by msg_dict,
+        label indexes are mapped to labels through the configured SRGB
+        """
+        attr = {}
+        mp_reach = None
+        mp_unreach = None
+        for type_code, value in (msg_dict.get('attr') or {}).items():
+            if int(type_code) == bgp_cons.BGPTYPE_MP_REACH_NLRI:
+                mp_reach = value
+            elif int(type_code) == bgp_cons.BGPTYPE_MP_UNREACH_NLRI:
+                mp_unreach = value
+            else:
+                attr[type_code] = value
+        if mp_unreach:
+            for prefix in mp_unreach['withdraw']:
+                self.adj_rib_out.withdraw(IPv4Prefix.from_string(prefix))
+        if not mp_reach:
+            return
+        srgb = config_srgb(msg_dict)
+        routes = mp_reach['BGP_PREFIX_SID']
+        if hasattr(routes, 'records') and numpy is not None:
+            # core.config.PrefixSidTable, labels of the whole table in one pass
+            records = routes.array()
+            labels = srgb.label_array(records['index']) if srgb is not None else records['index']
+            routes = zip(records['network'].tolist(), records['prefix_len'].tolist(), labels.tolist())
+        else:
+            if hasattr(routes, 'records'):
+                routes = routes.records()
+            else:
+                routes = (IPv4Prefix.from_string(prefix) + (index,)
+                          for prefix_sid in routes for prefix, index in prefix_sid.items())
+            if srgb is not None:
+                routes = ((network, prefix_len, srgb.label(index)) for network, prefix_len, index in routes)
+        insert = self.adj_rib_out.insert
+        for network, prefix_len, label in routes:
+            insert((network, prefix_len), attr, label)
+
+    def send_table(self, peer_id, msg_dict):
+        """
+        Send the (cached) encoded table to one member
+        """
+        send = self.members[peer_id]
+        for msg in self.encode(msg_dict):
+            send(msg)
+            self.send_count += 1
+
+    def advertise(self, msg_dict):
+        """
+        Encode msg_dict once and write it to every member, the cached
+        table sent to joining peers is left alone
+        """
+        if msg_dict is self.msg_dict:
+            messages = self.messages
+        else:
+            messages = self._construct(msg_dict)
+            self.update_adj_rib_out(msg_dict)
+        for send in self.members.values():
+            for msg in messages:
+                send(msg)
+                self.send_count += 1
+
+    def stats(self):
+        return {
+            'asn4': self.asn4,
+            'add_path': self.add_path,
+            'afi_safi': list(self.afi_safi),
+            'policy': self.policy,
+            'members': sorted(str(peer_id) for peer_id in self.members),
+            'adj_rib_out': len(self.adj_rib_out),
+            'encoded_messages': self.encode_count,
+            'sent_messages': self.send_count,
+        }
+
+
+class UpdateGroupManager(object):
+    """
+    Assigns peers to update groups by (asn4, add-path, AFI/SAFI, policy)
+    """
+
+    def __init__(self, metrics=None):
+        self.groups = {}
+        self.peer_group = {}
+        # core.metrics.Metrics timing every group's encodes
+        self.metrics = metrics
+
+    @staticmethod
+    def make_key(capabilities, policy='default'):
+        """
+        :param capabilities: negotiated capabilities, see negotiated_capabilities()
+        :param policy: export policy name
+        """
+        return (bool(capabilities.get('four_bytes_as')),
+                bool(capabilities.get('add_path')),
+                tuple(sorted(capabilities.get('afi_safi', []))),
+                policy)
+
+    def join(self, peer_id, send, capabilities, policy='default'):
+        """
+        :param send: callable writing one encoded message to the peer
+        :param capabilities: negotiated capabilities, see negotiated_capabilities()
+        :return: the UpdateGroup the peer now belongs to
+        """
+        self.leave(peer_id)
+        key = self.make_key(capabilities, policy)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = UpdateGroup(
+                key, self.metrics.encode_seconds if self.metrics is not None else None)
+        group.members[peer_id] = send
+        self.peer_group[peer_id] = group
+        LOG.info('[%s]joined update group %s', peer_id, key)
+        return group
+
+    def leave(self, peer_id):
+        group = self.peer_group.pop(peer_id, None)
+        if group is not None:
+            group.members.pop(peer_id, None)
+            if not group.members:
+                del self.groups[group.key]
+
+    def advertise(self, msg_dict):
+        for group in self.groups.values():
+            group.advertise(msg_dict)
+
+    def stats(self):
+        return [group.stats() for group in self.groups.values()]
@@ -0,0 +1,108 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+
+LOG = logging.getLogger(__name__)
+
+# a worker dying sooner than this after its start is restarted with backoff
+MIN_UPTIME = 5
+MAX_BACKOFF = 30
+
+
+def reuseport_socket(host, port, backlog=128):
+    """
+    Listening socket with SO_REUSEPORT, every worker binds its own one and
+    the kernel spreads incoming connections across them
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+class Supervisor(object):
+    """
+    Runs target(worker_id) in N forked worker processes and restarts the
+    ones that die.
+
+    Everything loaded before run() (e.g. the prefix-SID table and its
+    encoded UPDATEs) is shared read-only with the workers through fork's
+    copy-on-write pages. Each worker owns the sessions it accepts.
+    """
+
+    def __init__(self, target, workers=None):
+        self.target = target
+        self.workers = workers or os.cpu_count() or 1
+        self.context = multiprocessing.get_context('fork')
+        self.processes = {}
+        self.started = {}
+        self.restarts = {}
+        self.running = False
+
+    def _worker_main(self, worker_id):
+        # forked with the supervisor's handlers installed
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        self.target(worker_id)
+
+    def start_worker(self, worker_id):
+        process = self.context.Process(target=self._worker_main, args=(worker_id,), name='bgp-worker-%s' % worker_id)
+        process.daemon = True
+        process.start()
+        self.processes[worker_id] = process
+        self.started[worker_id] = time.monotonic()
+        LOG.info('worker %s started, pid %s', worker_id, process.pid)
+
+    def stop(self, *args):
+        self.running = False
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    def reload(self, *args):
+        # every worker reloads its own copy of the config
+        for process in self.processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGHUP)
+
+    def run(self):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        for worker_id in range(self.workers):
+            self.start_worker(worker_id)
+        # worker_id -> time.monotonic() deadline of a restart held back by the backoff
+        pending = {}
+        while self.running:
+            now = time.monotonic()
+            for worker_id, deadline in list(pending.items()):
+                if deadline <= now:
+                    del pending[worker_id]
+                    self.start_worker(worker_id)
+            sentinels = dict((p.sentinel, worker_id) for worker_id, p in self.processes.items()
+                             if worker_id not in pending)
+            timeout = min([1] + [deadline - now for deadline in pending.values()])
+            for sentinel in multiprocessing.connection.wait(list(sentinels), timeout=max(0, timeout)):
+                worker_id = sentinels[sentinel]
+                process = self.processes[worker_id]
+                process.join()
+                if not self.running:
+                    continue
+                LOG.warning('worker %s (pid %s) exited with %s', worker_id, process.pid, process.exitcode)
+                if time.monotonic() - self.started[worker_id] < MIN_UPTIME:
+                    self.restarts[worker_id] = self.restarts.get(worker_id, 0) + 1
+                    # restarted by the loop above, other workers and signals are served meanwhile
+                    pending[worker_id] = time.monotonic() + min(MAX_BACKOFF, 2 ** self.restarts[worker_id])
+                else:
+                    self.restarts[worker_id] = 0
+                    self.start_worker(worker_id)
+        for process in self.processes.values():
+            process.join()
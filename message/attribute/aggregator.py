@@ -6,13 +6,16 @@ import netaddr
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import constants as bgp_cons
 from common import exception as excep
 
 
+@register_attribute
 class Aggregator(Attribute):
     ID = AttributeID.AGGREGATOR
     FLAG = AttributeFlag.OPTIONAL + AttributeFlag.TRANSITIVE
+    ASN4_AWARE = True
 
     @classmethod
     def parse(cls, value, asn4=False):
@@ -46,3 +49,10 @@ class Aggregator(Attribute):
         except Exception:
             raise excep.UpdateMessageError(sub_error=bgp_cons.ERR_MSG_UPDATE_ATTR_LEN,data=value)
 
+
+@register_attribute(asn4=True)
+class AS4Aggregator(Aggregator):
+    """
+    AS4_AGGREGATOR (RFC 6793): AGGREGATOR with a 4 octet AS number
+    """
+    ID = AttributeID.AS4_AGGREGATOR
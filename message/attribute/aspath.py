@@ -4,9 +4,11 @@ import struct
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import exception as excep
 from common import constants as bgp_cons
 
+@register_attribute
 class ASPath(Attribute):
     """
         AS_PATH is a well-known mandatory attribute that is composed of a sequence of AS path segments. Each AS path segment is
@@ -31,6 +33,7 @@ class ASPath(Attribute):
     ID = AttributeID.AS_PATH
     FLAG = AttributeFlag.TRANSITIVE
     MULTIPLE = False
+    ASN4_AWARE = True
 
     @classmethod
     def parse(cls, value, asn4=False):
@@ -101,4 +104,14 @@ class ASPath(Attribute):
                 return struct.pack('!B', flags) + struct.pack('!B', cls.ID) + struct.pack('!B', len(as_path_raw)) + as_path_raw
         else:
             length =0
-            return struct.pack('!B', flags) + struct.pack('!B', cls.ID) + struct.pack('!B', length)
\ No newline at end of file
+            return struct.pack('!B', flags) + struct.pack('!B', cls.ID) + struct.pack('!B', length)
+
+
+@register_attribute(asn4=True)
+class AS4Path(ASPath):
+    """
+    AS4_PATH (RFC 6793): the AS path with 4 octet AS numbers, sent by a
+    2 octet AS speaker next to AS_PATH
+    """
+    ID = AttributeID.AS4_PATH
+    FLAG = AttributeFlag.OPTIONAL + AttributeFlag.TRANSITIVE
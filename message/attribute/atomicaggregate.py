@@ -3,10 +3,12 @@ import struct
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import constants as bgp_cons
 from common import exception as excep
 
 
+@register_attribute
 class AtomicAggregate(Attribute):
     """
     ATOMIC_AGGREGATE is a well-known discretionary attribute of length 0.
@@ -4,6 +4,11 @@ Check this Code more Closely ..It doesnt make sense so far in Attribute Class.
 """
 from struct import pack
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 
 class AttributeFlag(int):
 
@@ -101,6 +106,8 @@ class Attribute(object):
     """
     ID = 0x00
     FLAG = 0x00
+    # parse/construct take the session asn4 flag (AS_PATH, AGGREGATOR)
+    ASN4_AWARE = False
 
     def _attribute(self, value):
         flag = self.FLAG
@@ -119,7 +126,138 @@ class Attribute(object):
         return self.ID == other.ID
 
 
+class AttributeRegistry(object):
+    """
+    Table driven attribute codec dispatch, type code -> attribute class.
+
+    Parsers and constructors are bound once at registration time so that
+    both directions are a single dictionary lookup. Constructors are keyed
+    by both int and str type codes, message dictionaries loaded from JSON
+    use str keys.
+    """
+
+    def __init__(self):
+        self.classes = {}
+        self.parsers = {}
+        self.constructors = {}
+
+    def register(self, attr_cls, type_code=None, asn4=None):
+        """
+        Register an attribute class
+        :param attr_cls: class providing parse(value) and construct(value)
+        :param type_code: attribute type code, defaults to attr_cls.ID
+        :param asn4: force the asn4 flag (AS4_PATH, AS4_AGGREGATOR),
+            None passes the session value to ASN4_AWARE classes
+        """
+        if type_code is None:
+            type_code = attr_cls.ID
+        type_code = int(type_code)
+
+        if not attr_cls.ASN4_AWARE:
+            def parse(value, session_asn4=False):
+                return attr_cls.parse(value=value)
+
+            def construct(value, session_asn4=False):
+                return attr_cls.construct(value=value)
+        elif asn4 is None:
+            def parse(value, session_asn4=False):
+                return attr_cls.parse(value=value, asn4=session_asn4)
+
+            def construct(value, session_asn4=False):
+                return attr_cls.construct(value=value, asn4=session_asn4)
+        else:
+            def parse(value, session_asn4=False):
+                return attr_cls.parse(value=value, asn4=asn4)
+
+            def construct(value, session_asn4=False):
+                return attr_cls.construct(value=value, asn4=asn4)
+
+        self.classes[type_code] = attr_cls
+        self.parsers[type_code] = parse
+        self.constructors[type_code] = construct
+        self.constructors[str(type_code)] = construct
+        return attr_cls
+
+    def unregister(self, type_code):
+        type_code = int(type_code)
+        self.classes.pop(type_code, None)
+        self.parsers.pop(type_code, None)
+        self.constructors.pop(type_code, None)
+        self.constructors.pop(str(type_code), None)
+
+
+ATTRIBUTE_REGISTRY = AttributeRegistry()
+
+
+def register_attribute(attr_cls=None, type_code=None, asn4=None):
+    """
+    Register an attribute class with the global registry, usable as a
+    plain call or as a class decorator (with or without arguments)
+    """
+    def decorator(cls):
+        return ATTRIBUTE_REGISTRY.register(cls, type_code=type_code, asn4=asn4)
+    if attr_cls is None:
+        return decorator
+    return decorator(attr_cls)
+
+
+class LazyAttributes(Mapping):
+    """
+    Path attributes of a parsed UPDATE, type code -> decoded value.
+
+    Only the raw value (a memoryview into the bytes of the received
+    message, never into a reused receive buffer) is kept until an
+    attribute is looked up, it is then decoded through the registry once
+    and cached. Attributes never looked at, CLUSTER_LIST from route
+    reflectors for example, are never decoded.
+    """
+
+    def __init__(self, asn4=False, registry=None):
+        self.asn4 = asn4
+        self.registry = registry or ATTRIBUTE_REGISTRY
+        self.flags = {}
+        self._raw = {}
+        self._decoded = {}
+
+    def add(self, flags, type_code, value):
+        self.flags[type_code] = flags
+        self._raw[type_code] = value
+        self._decoded.pop(type_code, None)
+
+    def raw(self, type_code):
+        """
+        Undecoded attribute value as bytes
+        """
+        return bytes(self._raw[type_code])
+
+    def __getitem__(self, type_code):
+        try:
+            return self._decoded[type_code]
+        except KeyError:
+            pass
+        value = bytes(self._raw[type_code])
+        parser = self.registry.parsers.get(type_code)
+        if parser is not None:
+            decode_value = parser(value, self.asn4)
+        else:
+            decode_value = repr(value)
+        self._decoded[type_code] = decode_value
+        return decode_value
+
+    def __iter__(self):
+        return iter(self._raw)
 
+    def __len__(self):
+        return len(self._raw)
 
+    def __contains__(self, type_code):
+        return type_code in self._raw
 
+    def decode_all(self):
+        """
+        Decode every attribute now, UpdateMessageError is raised here
+        """
+        return dict((type_code, self[type_code]) for type_code in self._raw)
 
+    def __repr__(self):
+        return 'LazyAttributes(%r)' % sorted(self._raw)
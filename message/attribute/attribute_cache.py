@@ -0,0 +1,84 @@
+import sys
+from collections import OrderedDict
+
+
+class AttributeCache(object):
+    """
+    Interner for encoded path attribute sets.
+
+    Most routes share a handful of identical attribute sets, so the encoded
+    attribute block is cached keyed by the normalized attribute dictionary
+    and evicted in LRU order once maxsize entries are held.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def freeze(cls, value):
+        """
+        Turn a (possibly nested) attribute value into a hashable key
+        :param value: attribute value from the message dictionary
+        """
+        if isinstance(value, dict):
+            return tuple(sorted((str(k), cls.freeze(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(cls.freeze(v) for v in value)
+        return value
+
+    @classmethod
+    def make_key(cls, attr_dict, asn4=False):
+        """
+        Normalize an attribute dictionary, type codes may be int or str
+        :param attr_dict: {type_code: value}
+        :param asn4: 4 bytes asn or not, part of the encoding
+        """
+        return asn4, tuple(sorted((int(k), cls.freeze(v)) for k, v in attr_dict.items()))
+
+    def get(self, key):
+        try:
+            attr_hex = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return attr_hex
+
+    def put(self, key, attr_hex):
+        if key in self._cache:
+            self._bytes -= len(self._cache[key])
+        self._cache[key] = attr_hex
+        self._cache.move_to_end(key)
+        self._bytes += len(attr_hex)
+        while len(self._cache) > self.maxsize:
+            _, evicted = self._cache.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self._cache.clear()
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Hit rate and memory of the cache
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._cache),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'encoded_bytes': self._bytes,
+            'memory_bytes': sys.getsizeof(self._cache) + sum(
+                sys.getsizeof(k) + sys.getsizeof(v) for k, v in self._cache.items()),
+        }
@@ -1,36 +1,195 @@
-
 import struct
+from functools import lru_cache
 from common import constants as bgp_cons
 from common import exception as excep
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
+from message.attribute.nlri.labelledunicast import MAX_LABEL
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# TLV header: type, 2 octet length
+_TLV = struct.Struct('!BH')
+# Label-Index TLV value: reserved, flags, label index
+_LABEL_INDEX = struct.Struct('!BHI')
+
+
+class SRGB(object):
+    """
+    Segment Routing Global Block (RFC 8669 Originator SRGB): ordered label
+    ranges, label index i is the i-th label of their concatenation.
+    """
+
+    def __init__(self, ranges):
+        """
+        :param ranges: [(first label, number of labels), ...]
+        """
+        self.ranges = tuple((int(base), int(size)) for base, size in ranges)
+        if not self.ranges:
+            raise ValueError('empty SRGB')
+        for base, size in self.ranges:
+            if size <= 0 or base < 16 or base + size - 1 > MAX_LABEL:
+                raise ValueError('invalid SRGB range %s/%s' % (base, size))
+        # index at which every range starts
+        self.starts = []
+        start = 0
+        for base, size in self.ranges:
+            self.starts.append(start)
+            start += size
+        self.size = start
+
+    def __eq__(self, other):
+        return isinstance(other, SRGB) and self.ranges == other.ranges
+
+    def __hash__(self):
+        return hash(self.ranges)
+
+    def __repr__(self):
+        return 'SRGB(%r)' % (list(self.ranges),)
+
+    def validate(self, index):
+        if not 0 <= index < self.size:
+            raise ValueError('label index %s outside the SRGB (size %s)' % (index, self.size))
+        return index
+
+    def label(self, index):
+        """
+        :return: MPLS label of a label index
+        """
+        self.validate(index)
+        for (base, size), start in zip(self.ranges, self.starts):
+            if index < start + size:
+                return base + index - start
+
+    def index(self, label):
+        """
+        :return: label index of an MPLS label, None when outside the SRGB
+        """
+        for (base, size), start in zip(self.ranges, self.starts):
+            if base <= label < base + size:
+                return start + label - base
+        return None
 
+    def label_array(self, indexes):
+        """
+        Vectorized label(), indexes is a NumPy integer array
+        """
+        indexes = numpy.asarray(indexes, dtype=numpy.int64)
+        if len(indexes) and (indexes.min() < 0 or indexes.max() >= self.size):
+            raise ValueError('label index outside the SRGB (size %s)' % self.size)
+        labels = numpy.empty(len(indexes), dtype=numpy.uint32)
+        for (base, size), start in zip(self.ranges, self.starts):
+            in_range = (indexes >= start) & (indexes < start + size)
+            labels[in_range] = base + indexes[in_range] - start
+        return labels
+
+
+@register_attribute
 class BGPPrefixSid(Attribute):
+    """
+    BGP Prefix-SID attribute (RFC 8669), a list of TLVs:
+
+        Label-Index TLV (type 1, length 7):
+            reserved (1 octet), flags (2 octets), label index (4 octets)
+        Originator SRGB TLV (type 3, length 2 + 6 * n):
+            flags (2 octets), n x (first label (3 octets), size (3 octets))
+
+    The value is {"label_index": 10, "flags": 0, "srgb": [[16000, 8000]],
+    "srgb_flags": 0}, a plain int is a label index. TLVs of other types
+    are returned undecoded under "unknown".
+    """
 
     ID = AttributeID.BGP_PREFIX_SID
     FLAG = AttributeFlag.OPTIONAL + AttributeFlag.TRANSITIVE
 
     @classmethod
-    def parse(cls,value):
-        reserved,flags,label_index = struct.unpack("!HHI",value)
-        print ("BGP Prefix SID Values are",reserved,flags,label_index)
+    def parse(cls, value):
+        """
+        parse bgp prefix sid attribute
+        :param value: raw binary value
+        """
+        result = {}
+        view = memoryview(value)
+        offset = 0
+        try:
+            while offset < len(view):
+                tlv_type, length = _TLV.unpack_from(view, offset)
+                offset += _TLV.size
+                tlv = view[offset:offset + length]
+                if len(tlv) != length:
+                    raise ValueError('truncated TLV')
+                offset += length
+                if tlv_type == bgp_cons.BGP_PREFIX_SID_LABEL_INDEX:
+                    if length != _LABEL_INDEX.size:
+                        raise ValueError('bad Label-Index TLV length')
+                    _, result['flags'], result['label_index'] = _LABEL_INDEX.unpack(tlv)
+                elif tlv_type == bgp_cons.BGP_PREFIX_SID_ORIGINATOR_SRGB:
+                    if length < 2 or (length - 2) % 6:
+                        raise ValueError('bad Originator SRGB TLV length')
+                    result['srgb_flags'] = struct.unpack('!H', tlv[:2])[0]
+                    result['srgb'] = [
+                        [int.from_bytes(tlv[pos:pos + 3], 'big'), int.from_bytes(tlv[pos + 3:pos + 6], 'big')]
+                        for pos in range(2, length, 6)]
+                else:
+                    result.setdefault('unknown', {})[tlv_type] = bytes(tlv)
+        except (ValueError, struct.error):
+            raise excep.UpdateMessageError(sub_error=bgp_cons.ERR_MSG_UPDATE_OPTIONAL_ATTR, data=repr(bytes(value)))
+        return result
 
     @classmethod
-    def construct(cls,value):
-        bgp_prefix_pack = b''
-        length =8
-        resv =0
-        flags =0
-        bgp_prefix_index = value
-        bgp_prefix_sid = struct.pack('!HHI',resv,flags,bgp_prefix_index)
-        bgp_prefix_pack = struct.pack('!B',cls.FLAG) + struct.pack('!B',cls.ID) + struct.pack('!B',length)+ bgp_prefix_sid
-        print ("Sending BGP Prefix PACK ",bgp_prefix_pack)
-        return bgp_prefix_pack
-
-
-
+    def srgb(cls, value):
+        """
+        SRGB configured in an attribute value such as
+        {"label_index": 10, "srgb": [[16000, 8000]]}, None when absent
+        """
+        if isinstance(value, dict) and value.get('srgb'):
+            return SRGB(value['srgb'])
+        return None
 
+    @classmethod
+    def construct_label_index(cls, label_index, flags=0):
+        return _TLV.pack(bgp_cons.BGP_PREFIX_SID_LABEL_INDEX, _LABEL_INDEX.size) + \
+            _LABEL_INDEX.pack(0, flags, label_index)
 
+    @classmethod
+    def construct_originator_srgb(cls, srgb, flags=0):
+        """
+        Originator SRGB TLV: type, length, flags and 3 octet (first label, size) ranges
+        """
+        ranges = b''.join(struct.pack('!I', base)[1:] + struct.pack('!I', size)[1:] for base, size in srgb.ranges)
+        return _TLV.pack(bgp_cons.BGP_PREFIX_SID_ORIGINATOR_SRGB, 2 + len(ranges)) + struct.pack('!H', flags) + ranges
 
+    @classmethod
+    def construct(cls, value):
+        """
+        encode bgp prefix sid attribute
+        :param value: label index or {"label_index", "flags", "srgb", "srgb_flags"}
+        """
+        try:
+            if isinstance(value, dict):
+                srgb = cls.srgb(value)
+                key = (value.get('label_index'), value.get('flags', 0),
+                       srgb.ranges if srgb is not None else None, value.get('srgb_flags', 0))
+            else:
+                key = (value, 0, None, 0)
+            return cls._construct(*key)
+        except (struct.error, TypeError, ValueError):
+            raise excep.ConstructAttributeFailed(reason='failed to construct BGP Prefix-SID attribute', data=value)
 
+    @classmethod
+    @lru_cache(maxsize=4096)
+    def _construct(cls, label_index, flags, srgb_ranges, srgb_flags):
+        # routes mostly share few (index, flags, SRGB) combinations
+        value = b''
+        if label_index is not None:
+            value += cls.construct_label_index(label_index, flags)
+        if srgb_ranges is not None:
+            value += cls.construct_originator_srgb(SRGB(srgb_ranges), srgb_flags)
+        if len(value) > 255:
+            return struct.pack('!BBH', cls.FLAG | AttributeFlag.EXTENDED_LENGTH, cls.ID, len(value)) + value
+        return struct.pack('!BBB', cls.FLAG, cls.ID, len(value)) + value
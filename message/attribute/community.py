@@ -4,10 +4,12 @@ import struct
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import exception as excep
 from common import constants as bgp_cons
 
 
+@register_attribute
 class Community(Attribute):
 
     ID = AttributeID.COMMUNITY
@@ -8,12 +8,14 @@ import netaddr
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import exception as excep
 from common import constants as bgp_cons
 
 LOG = logging.getLogger()
 
 
+@register_attribute
 class ExtCommunity(Attribute):
 
     """
@@ -31,6 +33,9 @@ class ExtCommunity(Attribute):
         Parse Extended Community attributes.
     """
 
+    ID = AttributeID.EXTENDED_COMMUNITY
+    FLAG = AttributeFlag.OPTIONAL + AttributeFlag.TRANSITIVE
+
 
     @classmethod
     def parse(cls, value):
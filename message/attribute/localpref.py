@@ -5,9 +5,11 @@ import struct
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import constants as bgp_cons
 from common import exception as excep
 
+@register_attribute
 class LocalPreference(Attribute):
     """LOCAL_PREF is a well-known attribute that is a four-octet
     unsigned integer. A BGP speaker uses it to inform its other
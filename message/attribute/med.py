@@ -4,9 +4,11 @@ import struct
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import constants as bgp_cons
 from common import exception as excep
 
+@register_attribute
 class MED(Attribute):
     """
     This is an optional non-transitive attribute that is a
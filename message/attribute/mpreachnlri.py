@@ -7,6 +7,7 @@ import netaddr
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from message.attribute.nlri.labelledunicast import IPv4LabelledUnicast
 from common import afn
 from common import safn
@@ -14,27 +15,66 @@ from common import exception as excep
 from common import constants as bgp_cons
 
 
+@register_attribute
 class MpReachNLRI(Attribute):
     FLAG = AttributeFlag.OPTIONAL + AttributeFlag.EXTENDED_LENGTH
     afi, safi = 1,4
     ID = AttributeID.MP_REACH_NLRI
     spa=0
+    # flag, type, 2 octet length, afi, safi, next hop length, IPv4 next hop, reserved
+    HEADER_LEN = 13
 
     @classmethod
-    def parse(cls,value):
-        pass
+    def parse(cls, value, as_array=False):
+        """Parse a MP_REACH_NLRI attribute
+        :param value: raw attribute value
+        :param as_array: decode labelled unicast NLRI into a NumPy
+            structured array instead of LabelledPrefix records
+        :return: python dictionary
+        {'afi_safi': (1,4),
+         'next_hop': '172.16.2.1',
+         'nlri': [LabelledPrefix(...), ...]}
+        """
+        try:
+            afi, safi, next_hop_length = struct.unpack('!HBB', value[:4])
+            next_hop = value[4:4 + next_hop_length]
+            if len(next_hop) != next_hop_length:
+                raise ValueError('truncated next hop')
+            # reserved (SNPA count) octet follows the next hop
+            nlri = value[5 + next_hop_length:]
+        except Exception:
+            raise excep.UpdateMessageError(sub_error=bgp_cons.ERR_MSG_UPDATE_OPTIONAL_ATTR, data=repr(value))
+
+        if next_hop_length == 4:
+            next_hop = str(netaddr.IPAddress(struct.unpack('!I', next_hop)[0]))
+        elif next_hop_length in (16, 32):
+            next_hop = str(netaddr.IPAddress(int(binascii.b2a_hex(next_hop[:16]), 16), 6))
+        else:
+            next_hop = repr(next_hop)
+
+        if (afi, safi) == (afn.AFNUM_INET, safn.SAFNUM_MPLS_LABEL):
+            if as_array:
+                nlri = IPv4LabelledUnicast.parse_array(nlri)
+            else:
+                nlri = IPv4LabelledUnicast.parse(nlri)
+        else:
+            nlri = repr(nlri)
+        return {'afi_safi': (afi, safi), 'next_hop': next_hop, 'nlri': nlri}
 
     @classmethod
-    def construct(cls, value):
+    def construct(cls, value, nlri=None):
         """Construct a attribute
         :param value: python dictionary
         {'afi_safi': (1,128),
          'nexthop': {},
          'nlri': []
+        :param nlri: pre-encoded NLRI bytes, used by the update packer to
+            emit one chunk of ``value["BGP_PREFIX_SID"]`` at a time
         """
 
         next_hop_length = 4
-        nlri = IPv4LabelledUnicast.construct(value["BGP_PREFIX_SID"])
+        if nlri is None:
+            nlri = IPv4LabelledUnicast.construct(value["BGP_PREFIX_SID"])
         length = 9 +len(nlri)
         return (struct.pack ('!B',cls.FLAG) + struct.pack('!B',cls.ID) + struct.pack('!H',length) + struct.pack('!H',cls.afi) +struct.pack('!B',cls.safi) + struct.pack('!B',next_hop_length) + netaddr.IPAddress(value["next_hop"]).packed + struct.pack('!B',cls.spa) + nlri)
 
@@ -0,0 +1,55 @@
+import struct
+
+from message.attribute.attribute_base import Attribute
+from message.attribute.attribute_base import AttributeFlag
+from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
+from message.attribute.nlri.labelledunicast import IPv4LabelledUnicast
+from common import afn
+from common import safn
+from common import exception as excep
+from common import constants as bgp_cons
+
+
+@register_attribute
+class MpUnReachNLRI(Attribute):
+    """
+    MP_UNREACH_NLRI (RFC 4760), withdrawn IPv4 labelled unicast routes
+    carry the withdraw label 0x800000 instead of a label stack (RFC 3107).
+    """
+    FLAG = AttributeFlag.OPTIONAL + AttributeFlag.EXTENDED_LENGTH
+    afi, safi = 1,4
+    ID = AttributeID.MP_UNREACH_NLRI
+    # flag, type, 2 octet length, afi, safi
+    HEADER_LEN = 7
+
+    @classmethod
+    def parse(cls, value):
+        """Parse a MP_UNREACH_NLRI attribute
+        :param value: raw attribute value
+        :return: python dictionary
+        {'afi_safi': (1,4),
+         'withdraw': [LabelledPrefix(...), ...]}
+        """
+        try:
+            afi, safi = struct.unpack('!HB', value[:3])
+        except Exception:
+            raise excep.UpdateMessageError(sub_error=bgp_cons.ERR_MSG_UPDATE_OPTIONAL_ATTR, data=repr(value))
+        withdraw = value[3:]
+        if (afi, safi) == (afn.AFNUM_INET, safn.SAFNUM_MPLS_LABEL):
+            withdraw = IPv4LabelledUnicast.parse(withdraw)
+        else:
+            withdraw = repr(withdraw)
+        return {'afi_safi': (afi, safi), 'withdraw': withdraw}
+
+    @classmethod
+    def construct(cls, value, nlri=None):
+        """Construct a attribute
+        :param value: python dictionary
+        {'withdraw': ['10.10.10.0/24', ...]}
+        :param nlri: pre-encoded withdrawn routes, used by the update packer
+        """
+        if nlri is None:
+            nlri = b''.join(IPv4LabelledUnicast.generate_withdraw_subobj(prefix) for prefix in value['withdraw'])
+        length = 3 + len(nlri)
+        return struct.pack('!BBHHB', cls.FLAG, cls.ID, length, cls.afi, cls.safi) + nlri
@@ -6,9 +6,11 @@ import netaddr
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import constants as bgp_cons
 from common import exception as excep
 
+@register_attribute
 class NextHop(Attribute):
 
     ID = AttributeID.NEXT_HOP
@@ -1,13 +1,43 @@
 import struct
 import logging
 import binascii
-import netaddr
+from array import array
+from socket import inet_aton
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from common import constants as bgp_cons
+from common import exception as excep
+from message.attribute.nlri.prefix import IPv4Prefix
+from message.attribute.nlri.prefix import MASKS
 
 
 LOG = logging.getLogger(__name__)
 
+# label value used in place of a label stack when withdrawing (RFC 3107)
+WITHDRAW_LABEL = 0x800000
+BOS = 1
+MAX_LABEL = (1 << 20) - 1
+
+_IPV4 = struct.Struct('!I')
+# 1 octet length + 3 octet label, followed by the (untruncated) prefix
+_LEN_LABEL_PREFIX = struct.Struct('!II')
+
+
+class LabelledPrefix(namedtuple('LabelledPrefix', ['prefix', 'prefix_len', 'labels'])):
+    """
+    One decoded labelled unicast route, prefix is the network as an int
+    and labels the 20 bit label values from top to bottom of stack.
+    """
+    __slots__ = ()
+
+    def ipv4_prefix(self):
+        return IPv4Prefix(self.prefix, self.prefix_len)
+
 class IPv4LabelledUnicast(object):
 
     """
@@ -30,51 +60,213 @@ class IPv4LabelledUnicast(object):
     """
 
     @classmethod
-    def parse(cls,value):
-        pass
+    def parse(cls, value):
+        """
+        Decode labelled unicast NLRI (RFC 3107/8277) into LabelledPrefix
+        records, labels are read up to the bottom of stack bit.
+        :param value: raw NLRI bytes
+        """
+        routes = []
+        view = memoryview(value)
+        for offset, label_count in cls.scan(value):
+            bit_len = view[offset] - 24 * label_count
+            labels = tuple(
+                ((view[pos] << 16) | (view[pos + 1] << 8) | view[pos + 2]) >> 4
+                for pos in range(offset + 1, offset + 1 + 3 * label_count, 3))
+            start = offset + 1 + 3 * label_count
+            octet_len = (bit_len + 7) >> 3
+            network = int.from_bytes(view[start:start + octet_len], 'big') << (32 - 8 * octet_len)
+            routes.append(LabelledPrefix(network & MASKS[bit_len], bit_len, labels))
+        return routes
+
+    @classmethod
+    def scan(cls, value):
+        """
+        Validate the NLRI framing and yield (offset, label_count) for
+        every route.
+        :param value: raw NLRI bytes
+        """
+        view = memoryview(value)
+        end = len(view)
+        offset = 0
+        while offset < end:
+            bit_len = view[offset]
+            pos = offset + 1
+            label_count = 0
+            while True:
+                if bit_len < 24 or pos + 3 > end:
+                    raise excep.UpdateMessageError(
+                        sub_error=bgp_cons.ERR_MSG_UPDATE_OPTIONAL_ATTR,
+                        data=repr(bytes(value)))
+                label = (view[pos] << 16) | (view[pos + 1] << 8) | view[pos + 2]
+                pos += 3
+                bit_len -= 24
+                label_count += 1
+                if label & 1 or label == WITHDRAW_LABEL:
+                    break
+            octet_len = (bit_len + 7) >> 3
+            if bit_len > 32 or pos + octet_len > end:
+                raise excep.UpdateMessageError(
+                    sub_error=bgp_cons.ERR_MSG_UPDATE_OPTIONAL_ATTR,
+                    data=repr(bytes(value)))
+            yield offset, label_count
+            offset = pos + octet_len
+
+    @classmethod
+    def scan_array(cls, value):
+        """
+        Vectorized scan() for NLRI whose routes carry a single label, which
+        is what labelled unicast speakers send.
+
+        Every octet is assumed to start a route and the offset of the next
+        route is computed for all of them at once. The real route offsets
+        are the chain reached from offset 0, found by pointer doubling in
+        log(routes) steps.
+        :return: (offsets, label counts) NumPy arrays, None when a route
+            has a label stack or the framing is invalid, scan() then
+            handles (or rejects) the NLRI
+        """
+        buf = numpy.frombuffer(value, dtype=numpy.uint8)
+        end = len(buf)
+        if not end:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+        positions = numpy.arange(end, dtype=numpy.int64)
+        bit_len = buf.astype(numpy.int64) - 24
+        following = positions + 4 + ((bit_len + 7) >> 3)
+        # offset end is the sentinel the chain stops at
+        jump = numpy.append(numpy.clip(following, positions + 1, end), end)
+        levels = [jump]
+        while (1 << len(levels)) < end // 4 + 2:
+            levels.append(levels[-1][levels[-1]])
+        # routes 0, 2^k, 2*2^k, ... of the chain, halving k interleaves the ones between
+        offsets = numpy.zeros(1, dtype=numpy.int64)
+        for level in reversed(levels):
+            offsets = numpy.stack((offsets, level[offsets]), axis=1).ravel()
+        offsets = offsets[offsets < end]
+
+        if offsets[-1] + 4 > end or following[offsets[-1]] != end:
+            return None
+        if (bit_len[offsets] < 0).any() or (bit_len[offsets] > 32).any():
+            return None
+        padded = numpy.append(buf, numpy.zeros(3, dtype=numpy.uint8)).astype(numpy.uint32)
+        labels = (padded[offsets + 1] << 16) | (padded[offsets + 2] << 8) | padded[offsets + 3]
+        if not ((labels & 1).astype(bool) | (labels == WITHDRAW_LABEL)).all():
+            return None
+        return offsets, numpy.ones(len(offsets), dtype=numpy.int64)
+
+    @classmethod
+    def parse_array(cls, value):
+        """
+        Decode labelled unicast NLRI into a NumPy structured array with
+        fields network, prefix_len, label_count and labels, so that large
+        batches do not build one Python object per route. Both the
+        framing walk (scan_array) and the field extraction are vectorized,
+        NLRI with label stacks fall back to the per route scan().
+        :param value: raw NLRI bytes
+        """
+        if numpy is None:
+            raise ImportError('numpy is required for parse_array')
+        scanned = cls.scan_array(value)
+        if scanned is not None:
+            offsets, counts = scanned
+        else:
+            offsets = array('I')
+            counts = array('B')
+            for offset, label_count in cls.scan(value):
+                offsets.append(offset)
+                counts.append(label_count)
+            offsets = numpy.frombuffer(offsets, dtype=numpy.uint32).astype(numpy.int64)
+            counts = numpy.frombuffer(counts, dtype=numpy.uint8).astype(numpy.int64)
+        max_labels = int(counts.max()) if len(counts) else 1
+
+        # pad so gathering past the last route never indexes out of range
+        buf = numpy.frombuffer(bytes(value) + b'\x00' * (3 * max_labels + 4), dtype=numpy.uint8).astype(numpy.uint32)
+        routes = numpy.zeros(len(offsets), dtype=[
+            ('network', numpy.uint32),
+            ('prefix_len', numpy.uint8),
+            ('label_count', numpy.uint8),
+            ('labels', numpy.uint32, (max_labels,))])
+
+        for i in range(max_labels):
+            pos = offsets + 1 + 3 * i
+            labels = ((buf[pos] << 16) | (buf[pos + 1] << 8) | buf[pos + 2]) >> 4
+            routes['labels'][:, i] = numpy.where(i < counts, labels, 0)
+
+        prefix_len = buf[offsets].astype(numpy.int64) - 24 * counts
+        start = offsets + 1 + 3 * counts
+        octet_len = (prefix_len + 7) >> 3
+        network = numpy.zeros(len(offsets), dtype=numpy.uint32)
+        for i in range(4):
+            network |= numpy.where(i < octet_len, buf[start + i], 0).astype(numpy.uint32) << (24 - 8 * i)
+        masks = numpy.array(MASKS, dtype=numpy.uint32)
+        routes['network'] = network & masks[prefix_len]
+        routes['prefix_len'] = prefix_len
+        routes['label_count'] = counts
+        return routes
 
     @classmethod
     def construct(cls,bgp_prefix_sid_list):
-        nlri = b''
-        for prefix_label in bgp_prefix_sid_list:
-            for prefix,label_value in prefix_label.items():
-                nlri += cls.generate_nlri_subobj(prefix,label_value)
-        return nlri
+        return bytes(cls.encode(
+            (prefix, label_value)
+            for prefix_label in bgp_prefix_sid_list
+            for prefix, label_value in prefix_label.items()))
 
+    @staticmethod
+    def encode(prefix_labels):
+        """
+        Encode many (prefix, label) pairs into one preallocated bytearray.
+
+        All prefix strings are first converted to packed ints in one
+        batch, every route is then written with a single pack_into of
+        length+label and the full network, the next route overwrites the
+        octets beyond the prefix length.
+        :param prefix_labels: iterable of ("a.b.c.d/len", label) pairs
+        :raises ConstructAttributeFailed: a label does not fit in 20 bits
+        """
+        routes = []
+        total = 0
+        for prefix, label in prefix_labels:
+            address, prefix_len = prefix.split('/')
+            prefix_len = int(prefix_len)
+            network = _IPV4.unpack(inet_aton(address))[0] & MASKS[prefix_len]
+            if not 0 <= label <= MAX_LABEL:
+                raise excep.ConstructAttributeFailed(
+                    reason='label %s is not a 20 bit MPLS label' % label, data=prefix)
+            routes.append(((24 + prefix_len) << 24 | label << 4 | BOS, network, prefix_len))
+            total += 4 + ((prefix_len + 7) >> 3)
 
+        # 4 spare octets for the untruncated network of the last route
+        nlri = bytearray(total + 4)
+        offset = 0
+        for len_label, network, prefix_len in routes:
+            _LEN_LABEL_PREFIX.pack_into(nlri, offset, len_label, network)
+            offset += 4 + ((prefix_len + 7) >> 3)
+        del nlri[total:]
+        return nlri
 
     @staticmethod
     def generate_nlri_subobj(prefix,label_value):
-        packed_sub_obj = b''
-        BOS=1
-        label = label_value
-        prefix_sid,prefix_mask = prefix.split("/")
-        if int(prefix_mask) % 8 == 0:
-            prefix_len = int (int(prefix_mask) / 8)
-        else:
-            prefix_len = int (int(prefix_mask) / 8) + 1
-        length = ((prefix_len + 3) * 8) << 24
-        label_stack_msg = (label << 4 | BOS)
-        len_label_obj = length | label_stack_msg
-        packed_len_label_obj = struct.pack("!I",len_label_obj)
-        if prefix_len == 4:
-            packed_ip_obj = netaddr.IPAddress(prefix_sid).packed
-        elif prefix_len == 3:
-            ip_obj = netaddr.IPAddress(prefix_sid)
-            ip_obj1 = ip_obj >> 16
-            packed_sub_ip_obj1 = struct.pack('!H',ip_obj1)
-            prefix_sid1 = ip_obj & 0x0000FF00
-            prefix_sid2 = prefix_sid1 >> 8
-            packed_sub_ip_obj2 = struct.pack('!B',prefix_sid2)
-            packed_ip_obj = packed_sub_ip_obj1+packed_sub_ip_obj2
-        elif prefix_len == 2:
-            ip_obj = netaddr.IPAddress(prefix_sid)
-            prefix_sid1 = ip_obj >> 16
-            packed_ip_obj = struct.pack('!H',prefix_sid1)
-        elif prefix_len == 1:
-            ip_obj = netaddr.IPAddress(prefix_sid)
-            prefix_sid1 = ip_obj >> 24
-            packed_ip_obj = struct.pack('!B',ip_obj)
-        packed_sub_obj = packed_len_label_obj + packed_ip_obj
-
-        return packed_sub_obj
+        """
+        Encode one labelled route: length, label with bottom of stack set
+        and the prefix truncated to its significant octets.
+        """
+        address, prefix_len = prefix.split("/")
+        prefix_len = int(prefix_len)
+        network = _IPV4.unpack(inet_aton(address))[0] & MASKS[prefix_len]
+        if not 0 <= label_value <= MAX_LABEL:
+            raise excep.ConstructAttributeFailed(
+                reason='label %s is not a 20 bit MPLS label' % label_value, data=prefix)
+        len_label = (24 + prefix_len) << 24 | label_value << 4 | BOS
+        return _LEN_LABEL_PREFIX.pack(len_label, network)[:4 + ((prefix_len + 7) >> 3)]
+
+    @staticmethod
+    def generate_withdraw_subobj(prefix):
+        """
+        Encode one withdrawn labelled route, the label field carries the
+        withdraw label instead of a label stack.
+        """
+        address, prefix_len = prefix.split("/")
+        prefix_len = int(prefix_len)
+        network = _IPV4.unpack(inet_aton(address))[0] & MASKS[prefix_len]
+        len_label = (24 + prefix_len) << 24 | WITHDRAW_LABEL
+        return _LEN_LABEL_PREFIX.pack(len_label, network)[:4 + ((prefix_len + 7) >> 3)]
@@ -0,0 +1,38 @@
+import socket
+import struct
+from operator import itemgetter
+
+_IPV4 = struct.Struct('!I')
+
+# network mask for every prefix length, MASKS[24] == 0xFFFFFF00
+MASKS = tuple((0xFFFFFFFF << (32 - i)) & 0xFFFFFFFF for i in range(33))
+
+
+class IPv4Prefix(tuple):
+    """
+    IPv4 prefix kept as a packed (network, prefix_len) pair, network is
+    an int. The dotted "a.b.c.d/len" string is only built when asked for.
+    """
+    __slots__ = ()
+
+    network = property(itemgetter(0))
+    prefix_len = property(itemgetter(1))
+
+    def __new__(cls, network, prefix_len):
+        return tuple.__new__(cls, (network, prefix_len))
+
+    @classmethod
+    def from_string(cls, prefix):
+        """
+        :param prefix: "a.b.c.d/len" string, host bits are cleared
+        """
+        address, prefix_len = prefix.split('/')
+        prefix_len = int(prefix_len)
+        network = _IPV4.unpack(socket.inet_aton(address))[0]
+        return tuple.__new__(cls, (network & MASKS[prefix_len], prefix_len))
+
+    def __str__(self):
+        return '%s/%s' % (socket.inet_ntoa(_IPV4.pack(self[0])), self[1])
+
+    def __repr__(self):
+        return 'IPv4Prefix(%r)' % str(self)
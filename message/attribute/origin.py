@@ -4,10 +4,12 @@ import struct
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import constants as bgp_cons
 from common import exception as excep
 
 
+@register_attribute
 class Origin(Attribute):
     """
         ORIGIN is a well-known mandatory attribute that defines the
@@ -30,7 +32,7 @@ class Origin(Attribute):
     @classmethod
     def parse(cls, value):
         origin = struct.unpack('!B', value)[0]
-        if orgin not in [cls.IGP, cls.EGP, cls.INCOMPLETE]:
+        if origin not in [cls.IGP, cls.EGP, cls.INCOMPLETE]:
             raise excep.UpdateMessageError( sub_error=bgp_cons.ERR_MSG_UPDATE_INVALID_ORIGIN,data=value)
         return origin
 
@@ -7,10 +7,12 @@ import netaddr
 from message.attribute.attribute_base import Attribute
 from message.attribute.attribute_base import AttributeFlag
 from message.attribute.attribute_base import AttributeID
+from message.attribute.attribute_base import register_attribute
 from common import exception as excep
 from common import constants as bgp_cons
 
 
+@register_attribute
 class OriginatorID(Attribute):
 
     ID = AttributeID.ORIGINATOR_ID
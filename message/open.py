@@ -1,9 +1,12 @@
+import logging
 import struct
 import netaddr
 
 from common import exception as excp
 from common import constants as bgp_cons
 
+LOG = logging.getLogger(__name__)
+
 class Open(object):
     def __init__(self, version=None, asn=None, hold_time=None,bgp_id=None, opt_para_len=None, opt_paras=None):
 
@@ -132,7 +135,7 @@ class Open(object):
                 # Go to next Optional Parameter
                 self.opt_paras = self.opt_paras[opt_para_length + 2:]
 
-            return {'Version': self.version,'ASN': self.asn,'holdTime': self.hold_time,'bgpID': self.bgp_id,'Capabilities': self.capa_dict}
+        return {'Version': self.version,'ASN': self.asn,'holdTime': self.hold_time,'bgpID': self.bgp_id,'Capabilities': self.capa_dict}
 
     @staticmethod
     def construct_header(msg):
@@ -170,7 +173,8 @@ class Open(object):
         elif my_capability.get('enhanced_route_refresh'):
             capas += Capability(capa_code=70, capa_length=0).construct()
 
-        print ("Printing Variables",self.version, self.asn, self.hold_time,netaddr.IPAddress(self.bgp_id), len(capas))
+        LOG.debug('OPEN version %s, asn %s, hold time %s, bgp id %s, %s capability bytes',
+                  self.version, self.asn, self.hold_time, self.bgp_id, len(capas))
         open_header = struct.pack('!BHHIB', self.version, self.asn, self.hold_time,netaddr.IPAddress(self.bgp_id), len(capas))
         message = open_header + capas
         return self.construct_header(message)
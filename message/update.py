@@ -6,7 +6,10 @@ import netaddr
 
 from common import exception as excep
 from common import constants as bgp_cons
+from common.log import RateLimitedLogger
 from message.attribute.attribute_base import AttributeFlag as AttributeFlag
+from message.attribute.attribute_base import ATTRIBUTE_REGISTRY
+from message.attribute.attribute_base import LazyAttributes
 from message.attribute.origin import Origin
 from message.attribute.aspath import ASPath
 from message.attribute.nexthop import NextHop
@@ -19,16 +22,68 @@ from message.attribute.originatorid import OriginatorID
 from message.attribute.clusterlist import ClusterList
 from message.attribute.extcommunity import ExtCommunity
 from message.attribute.mpreachnlri import MpReachNLRI
+from message.attribute.mpunreachnlri import MpUnReachNLRI
 from message.attribute.bgpprefixsid import BGPPrefixSid
+from message.attribute.nlri.labelledunicast import IPv4LabelledUnicast
+from message.attribute.nlri.prefix import IPv4Prefix
+from message.attribute.nlri.prefix import MASKS
+from message.attribute.attribute_cache import AttributeCache
 
 LOG = logging.getLogger()
+# malformed UPDATEs are logged per message, keep a bad peer from flooding the log
+LOG_LIMITED = RateLimitedLogger(LOG)
+
+# attributes carrying NLRI differ for every chunk and are never interned
+_UNCACHED_ATTRIBUTES = (bgp_cons.BGPTYPE_MP_REACH_NLRI, bgp_cons.BGPTYPE_MP_UNREACH_NLRI)
+
+_PATH_ID = struct.Struct('!I')
+_LENGTH = struct.Struct('!H')
+
+
+# AFI, SAFI (and next hop length in MP_REACH_NLRI)
+_AFI_SAFI = struct.Struct('!HB')
+_SAFI_LABELLED_UNICAST = 4
+
+
+def _route_keys(keys, nlri, afi, safi, addpath):
+    # collect the (afi, safi, prefix_len, prefix octets) of nlri into keys,
+    # False once there is more than one route
+    offset = 0
+    while offset < len(nlri):
+        if addpath:
+            offset += 4
+        bits = nlri[offset]
+        octets = (bits + 7) >> 3
+        prefix = bytes(nlri[offset + 1:offset + 1 + octets])
+        if len(prefix) != octets:
+            raise IndexError('truncated NLRI')
+        offset += 1 + octets
+        if safi == _SAFI_LABELLED_UNICAST:
+            # one 3 octet label in front of the prefix
+            bits -= 24
+            prefix = prefix[3:]
+        keys.append((afi, safi, bits, prefix))
+        if len(keys) > 1:
+            return False
+    return True
+
+
+def _with_label_index(prefix_sid, label_index):
+    # the configured BGP_PREFIX_SID value with the label index of one group of routes
+    if isinstance(prefix_sid, dict):
+        return dict(prefix_sid, label_index=label_index)
+    return label_index
+_ATTR_HEADER = struct.Struct('!BB')
+_ATTR_EXT_LEN = struct.Struct('!H')
 
 class Update(object):
+    attr_cache = AttributeCache()
+
     def __init__(self):
         _test = 0
 
     @classmethod
-    def parse(cls, t, msg_hex, asn4=False, add_path_remote=False, add_path_local=False):
+    def parse(cls, t, msg_hex, asn4=False, add_path_remote=False, add_path_local=False, lazy_attr=False):
 
         """
         Parse BGP Update message
@@ -37,8 +92,14 @@ class Update(object):
         :param asn4: support 4 bytes AS or not
         :param add_path_remote: if the remote peer can send add path NLRI
         :param add_path_local: if the local can send add path NLRI
+        :param lazy_attr: return attributes as LazyAttributes decoded on
+            access instead of decoding (and validating) all of them here
         :return: message after parsing.
         """
+        if not isinstance(msg_hex, bytes):
+            # a view into the framer's receive buffer is overwritten by the
+            # next read, the result (hex, lazy attribute values) must not share it
+            msg_hex = bytes(msg_hex)
         results = {
             "withdraw": [],
             "attr": None,
@@ -50,11 +111,12 @@ class Update(object):
         }
 
         # get every part of the update message
-        withdraw_len = struct.unpack('!H', msg_hex[:2])[0]
-        withdraw_prefix_data = msg_hex[2:withdraw_len + 2]
-        attr_len = struct.unpack('!H', msg_hex[withdraw_len + 2:withdraw_len + 4])[0]
-        attribute_data = msg_hex[withdraw_len + 4:withdraw_len + 4 + attr_len]
-        nlri_data = msg_hex[withdraw_len + 4 + attr_len:]
+        msg_view = memoryview(msg_hex)
+        withdraw_len = _LENGTH.unpack_from(msg_view, 0)[0]
+        withdraw_prefix_data = msg_view[2:withdraw_len + 2]
+        attr_len = _LENGTH.unpack_from(msg_view, withdraw_len + 2)[0]
+        attribute_data = msg_view[withdraw_len + 4:withdraw_len + 4 + attr_len]
+        nlri_data = msg_view[withdraw_len + 4 + attr_len:]
 
         try:
             # parse withdraw prefixes
@@ -63,22 +125,24 @@ class Update(object):
             # parse nlri
             results['nlri'] = cls.parse_prefix_list(nlri_data, add_path_remote)
         except Exception as e:
-            LOG.error(e)
-            error_str = traceback.format_exc()
-            LOG.debug(error_str)
+            LOG_LIMITED.error(e)
+            if LOG.isEnabledFor(logging.DEBUG):
+                LOG.debug(traceback.format_exc())
             results['sub_error'] = bgp_cons.ERR_MSG_UPDATE_INVALID_NETWORK_FIELD
             results['err_data'] = ''
         try:
             # parse attributes
             results['attr'] = cls.parse_attributes(attribute_data, asn4)
+            if not lazy_attr:
+                results['attr'] = results['attr'].decode_all()
         except excep.UpdateMessageError as e:
-            LOG.error(e)
+            LOG_LIMITED.error(e)
             results['sub_error'] = e.sub_error
             results['err_data'] = e.data
         except Exception as e:
-            LOG.error(e)
-            error_str = traceback.format_exc()
-            LOG.debug(error_str)
+            LOG_LIMITED.error(e)
+            if LOG.isEnabledFor(logging.DEBUG):
+                LOG.debug(traceback.format_exc())
             results['sub_error'] = e
             results['err_data'] = e
 
@@ -108,216 +172,335 @@ class Update(object):
             msg_body = struct.pack('!H', len(withdraw_hex)) + withdraw_hex + struct.pack('!H', 0)
             return cls.construct_header(msg_body)
 
+    @classmethod
+    def construct_chunks(cls, msg_dict, asn4=False, addpath=False):
+        """
+        Pack a route set of any size into a stream of UPDATE messages.
+
+        The path attributes are encoded once and shared by every chunk,
+        the MP_REACH_NLRI labelled unicast NLRI (and any plain IPv4 NLRI or
+        withdrawn routes) are split so that each message is filled as close
+        to BGP_MAX_PACKET_SIZE as possible. With a BGP_PREFIX_SID attribute
+        the labelled routes are grouped by label index, its Label-Index TLV
+        applies to every NLRI of the UPDATE (RFC 8669), each group is sent
+        with its own index. MP_UNREACH_NLRI withdrawals
+        ({"withdraw": [prefix, ...]}) are sent first, without the other
+        attributes.
+
+        :param msg_dict: message dictionary, same layout as construct()
+        :param asn4: support 4 bytes AS or not
+        :param addpath: support add path or not
+        :return: generator of raw UPDATE messages
+        """
+        attr_dict = dict(msg_dict.get('attr') or {})
+        mp_reach = None
+        mp_unreach = None
+        prefix_sid_type = None
+        for type_code in list(attr_dict):
+            if int(type_code) == bgp_cons.BGPTYPE_MP_REACH_NLRI:
+                mp_reach = attr_dict.pop(type_code)
+            elif int(type_code) == bgp_cons.BGPTYPE_MP_UNREACH_NLRI:
+                mp_unreach = attr_dict.pop(type_code)
+            elif int(type_code) == bgp_cons.BGP_PREFIX_SID:
+                prefix_sid_type = type_code
+        # 2 octet withdrawn routes length + 2 octet total path attribute length
+        room = bgp_cons.BGP_MAX_PACKET_SIZE - bgp_cons.BGP_HEADER_SIZE - 4
+
+        if mp_unreach is not None:
+            # withdrawals need no other path attribute
+            withdraw_iter = (IPv4LabelledUnicast.generate_withdraw_subobj(prefix) for prefix in mp_unreach['withdraw'])
+            for withdraw_hex in cls.pack_nlri(withdraw_iter, room - MpUnReachNLRI.HEADER_LEN):
+                attr_hex = MpUnReachNLRI.construct(mp_unreach, withdraw_hex)
+                msg_body = struct.pack('!H', 0) + struct.pack('!H', len(attr_hex)) + attr_hex
+                yield cls.construct_header(msg_body)
+            if mp_reach is None and not msg_dict.get('nlri') and not msg_dict.get('withdraw'):
+                return
+
+        shared_attr_hex = cls.construct_attributes(attr_dict, asn4)
+
+        if mp_reach is not None and prefix_sid_type is not None:
+            for msg in cls._construct_prefix_sid_groups(attr_dict, prefix_sid_type, mp_reach, room, asn4):
+                yield msg
+        elif mp_reach is not None:
+            # no SRGB without a BGP_PREFIX_SID attribute, the label indexes are the labels
+            routes = mp_reach['BGP_PREFIX_SID']
+            mp_room = room - len(shared_attr_hex) - MpReachNLRI.HEADER_LEN
+            if hasattr(routes, 'pack_nlri'):
+                # loaded table (core.config.PrefixSidTable), packed in one pass
+                nlri_chunks = routes.pack_nlri(mp_room)
+            else:
+                nlri_iter = (
+                    IPv4LabelledUnicast.generate_nlri_subobj(prefix, label)
+                    for prefix_label in routes for prefix, label in prefix_label.items())
+                nlri_chunks = cls.pack_nlri(nlri_iter, mp_room)
+            for nlri_hex in nlri_chunks:
+                attr_hex = shared_attr_hex + MpReachNLRI.construct(mp_reach, nlri_hex)
+                msg_body = struct.pack('!H', 0) + struct.pack('!H', len(attr_hex)) + attr_hex
+                yield cls.construct_header(msg_body)
+
+        if msg_dict.get('nlri'):
+            nlri_iter = (cls.construct_prefix_v4([prefix], addpath) for prefix in msg_dict['nlri'])
+            for nlri_hex in cls.pack_nlri(nlri_iter, room - len(shared_attr_hex)):
+                msg_body = struct.pack('!H', 0) + struct.pack('!H', len(shared_attr_hex)) + shared_attr_hex + nlri_hex
+                yield cls.construct_header(msg_body)
+
+        if msg_dict.get('withdraw'):
+            withdraw_iter = (cls.construct_prefix_v4([prefix], addpath) for prefix in msg_dict['withdraw'])
+            for withdraw_hex in cls.pack_nlri(withdraw_iter, room):
+                msg_body = struct.pack('!H', len(withdraw_hex)) + withdraw_hex + struct.pack('!H', 0)
+                yield cls.construct_header(msg_body)
+
+    @classmethod
+    def _construct_prefix_sid_groups(cls, attr_dict, prefix_sid_type, mp_reach, room, asn4):
+        """
+        MP_REACH_NLRI UPDATEs of labelled routes grouped by label index,
+        each carrying the BGP_PREFIX_SID attribute with that index
+        """
+        prefix_sid = attr_dict[prefix_sid_type]
+        # label indexes map to labels through the SRGB, when one is configured
+        srgb = BGPPrefixSid.srgb(prefix_sid)
+        group_attr = dict(attr_dict)
+        del group_attr[prefix_sid_type]
+        group_attr_hex = cls.construct_attributes(group_attr, asn4)
+        # the attribute has the same length whatever the index
+        prefix_sid_len = len(BGPPrefixSid.construct(_with_label_index(prefix_sid, 0)))
+        mp_room = room - len(group_attr_hex) - prefix_sid_len - MpReachNLRI.HEADER_LEN
+        routes = mp_reach['BGP_PREFIX_SID']
+        if hasattr(routes, 'pack_nlri_by_index'):
+            groups = routes.pack_nlri_by_index(mp_room, srgb)
+        else:
+            groups = cls.pack_nlri_by_index(
+                (item for prefix_label in routes for item in prefix_label.items()), mp_room, srgb)
+        for index, nlri_hex in groups:
+            attr_hex = (group_attr_hex + BGPPrefixSid.construct(_with_label_index(prefix_sid, index)) +
+                        MpReachNLRI.construct(mp_reach, nlri_hex))
+            msg_body = struct.pack('!H', 0) + struct.pack('!H', len(attr_hex)) + attr_hex
+            yield cls.construct_header(msg_body)
+
+    @classmethod
+    def pack_nlri_by_index(cls, prefix_indexes, room, srgb=None):
+        """
+        Group labelled routes by label index and pack every group like pack_nlri()
+
+        :param prefix_indexes: iterable of (prefix, label index)
+        :param room: octets available for NLRI in one UPDATE message
+        :param srgb: maps label indexes to labels, labels are the indexes without one
+        :return: generator of (label index, NLRI blob), by increasing label index
+        """
+        groups = {}
+        for prefix, index in prefix_indexes:
+            groups.setdefault(index, []).append(IPv4LabelledUnicast.generate_nlri_subobj(
+                prefix, srgb.label(index) if srgb is not None else index))
+        for index, nlri in sorted(groups.items()):
+            for nlri_hex in cls.pack_nlri(nlri, room):
+                yield index, nlri_hex
+
+    @staticmethod
+    def pack_nlri(nlri_iter, room):
+        """
+        Group encoded NLRI entries into blobs of at most room octets
+
+        :param nlri_iter: iterable of encoded NLRI entries
+        :param room: octets available for NLRI in one UPDATE message
+        :return: generator of NLRI blobs
+        """
+        chunk = []
+        chunk_len = 0
+        for nlri_hex in nlri_iter:
+            if chunk_len + len(nlri_hex) > room:
+                if not chunk:
+                    raise excep.ConstructAttributeFailed(
+                        reason='path attributes leave no room for NLRI',
+                        data=repr(nlri_hex))
+                yield b''.join(chunk)
+                chunk = []
+                chunk_len = 0
+            chunk.append(nlri_hex)
+            chunk_len += len(nlri_hex)
+        if chunk:
+            yield b''.join(chunk)
+
+    @staticmethod
+    def route_key(msg, addpath=False):
+        """
+        Key of the one route an UPDATE announces or withdraws, an output
+        queue (core.outqueue) replaces an unsent UPDATE with the same key
+
+        :param msg: whole UPDATE message, header included
+        :param addpath: NLRI carry path identifiers
+        :return: (afi, safi, prefix_len, prefix octets), None for any
+            other number of routes or a message that does not parse
+        """
+        keys = []
+        try:
+            view = memoryview(msg)[bgp_cons.HDR_LEN:]
+            withdrawn_len = _LENGTH.unpack_from(view, 0)[0]
+            offset = 2 + withdrawn_len
+            if not _route_keys(keys, view[2:offset], 1, 1, addpath):
+                return None
+            attr_len = _LENGTH.unpack_from(view, offset)[0]
+            offset += 2
+            attr_end = offset + attr_len
+            while offset < attr_end:
+                flags, type_code = view[offset], view[offset + 1]
+                if flags & AttributeFlag.EXTENDED_LENGTH:
+                    length = _LENGTH.unpack_from(view, offset + 2)[0]
+                    offset += 4
+                else:
+                    length = view[offset + 2]
+                    offset += 3
+                value = view[offset:offset + length]
+                offset += length
+                if type_code == bgp_cons.BGPTYPE_MP_REACH_NLRI:
+                    afi, safi = _AFI_SAFI.unpack_from(value, 0)
+                    # next hop length, next hop, reserved octet
+                    nlri = value[_AFI_SAFI.size + 1 + value[_AFI_SAFI.size] + 1:]
+                elif type_code == bgp_cons.BGPTYPE_MP_UNREACH_NLRI:
+                    afi, safi = _AFI_SAFI.unpack_from(value, 0)
+                    nlri = value[_AFI_SAFI.size:]
+                else:
+                    continue
+                if not _route_keys(keys, nlri, afi, safi, addpath):
+                    return None
+            if not _route_keys(keys, view[attr_end:], 1, 1, addpath):
+                return None
+        except (struct.error, IndexError):
+            return None
+        return keys[0] if len(keys) == 1 else None
+
     @staticmethod
     def parse_prefix_list(data, addpath=False):
         """
         Parses an RFC4271 encoded blob of BGP prefixes into a list
 
+        Single pass over a memoryview of data, prefixes are returned as
+        IPv4Prefix (network, prefix_len) pairs whose dotted string form
+        is only built when str() is called.
+
         :param data: hex data
         :param addpath: support addpath or not
         :return: prefix_list
         """
         prefixes = []
-        postfix = data
-        while len(postfix) > 0:
-            # for python2 and python3
+        view = memoryview(data)
+        end = len(view)
+        offset = 0
+        while offset < end:
             if addpath:
-                path_id = struct.unpack('!I', postfix[0:4])[0]
-                postfix = postfix[4:]
-            if isinstance(postfix[0], int):
-                prefix_len = postfix[0]
-            else:
-                prefix_len = ord(postfix[0])
+                # path identifier and prefix length
+                if offset + 5 > end:
+                    raise excep.UpdateMessageError(
+                        sub_error=bgp_cons.ERR_MSG_UPDATE_INVALID_NETWORK_FIELD,
+                        data=repr(data)
+                    )
+                path_id = _PATH_ID.unpack_from(view, offset)[0]
+                offset += 4
+            prefix_len = view[offset]
             if prefix_len > 32:
-                LOG.warning('Prefix Length larger than 32')
+                LOG_LIMITED.warning('Prefix Length larger than 32')
                 raise excep.UpdateMessageError(
                     sub_error=bgp_cons.ERR_MSG_UPDATE_INVALID_NETWORK_FIELD,
                     data=repr(data)
                 )
-            octet_len, remainder = int(prefix_len / 8), prefix_len % 8
-            if remainder > 0:
-                # prefix length doesn't fall on octet boundary
-                octet_len += 1
-            tmp = postfix[1:octet_len + 1]
-            # for python2 and python3
-            if isinstance(postfix[0], int):
-                prefix_data = [i for i in tmp]
-            else:
-                prefix_data = [ord(i) for i in tmp]
-            # Zero the remaining bits in the last octet if it didn't fall
-            # on an octet boundary
-            if remainder > 0:
-                prefix_data[-1] &= 255 << (8 - remainder)
-            prefix_data = prefix_data + list(str(0)) * 4
-            prefix = "%s.%s.%s.%s" % (tuple(prefix_data[0:4])) + '/' + str(prefix_len)
+            # prefix length may not fall on octet boundary
+            octet_len = (prefix_len + 7) >> 3
+            offset += 1
+            if offset + octet_len > end:
+                raise excep.UpdateMessageError(
+                    sub_error=bgp_cons.ERR_MSG_UPDATE_INVALID_NETWORK_FIELD,
+                    data=repr(data)
+                )
+            network = int.from_bytes(view[offset:offset + octet_len], 'big') << (32 - 8 * octet_len)
+            # Zero the remaining bits in the last octet
+            prefix = IPv4Prefix(network & MASKS[prefix_len], prefix_len)
             if not addpath:
                 prefixes.append(prefix)
             else:
                 prefixes.append({'prefix': prefix, 'path_id': path_id})
             # Next prefix
-            postfix = postfix[octet_len + 1:]
+            offset += octet_len
 
         return prefixes
 
     @staticmethod
     def parse_attributes(data, asn4=False):
         """
-        Parses an RFC4271 encoded blob of BGP attributes into a list
+        Parses an RFC4271 encoded blob of BGP attributes into a mapping
+
+        Walks the blob with an offset, the returned LazyAttributes only
+        keeps a memoryview of every attribute value and decodes it on
+        first access.
 
-        :param data:
+        :param data: attribute block, must not be a view into a buffer
+            that is reused while the result is alive
         :param asn4: support 4 bytes asn or not
-        :return:
+        :return: LazyAttributes
         """
-        attributes = {}
-        postfix = data
-        while len(postfix) > 0:
+        attributes = LazyAttributes(asn4=asn4)
+        view = memoryview(data)
+        end = len(view)
+        offset = 0
+        while offset < end:
 
             try:
-                flags, type_code = struct.unpack('!BB', postfix[:2])
+                flags, type_code = _ATTR_HEADER.unpack_from(view, offset)
 
                 if flags & AttributeFlag.EXTENDED_LENGTH:
-                    attr_len = struct.unpack('!H', postfix[2:4])[0]
-                    attr_value = postfix[4:4 + attr_len]
-                    postfix = postfix[4 + attr_len:]    # Next attribute
+                    attr_len = _ATTR_EXT_LEN.unpack_from(view, offset + 2)[0]
+                    offset += 4
                 else:    # standard 1-octet length
-                    if isinstance(postfix[2], int):
-                        attr_len = postfix[2]
-                    else:
-                        attr_len = ord(postfix[2])
-                    attr_value = postfix[3:3 + attr_len]
-                    postfix = postfix[3 + attr_len:]    # Next attribute
+                    attr_len = view[offset + 2]
+                    offset += 3
+                if offset + attr_len > end:
+                    raise ValueError('attribute %s overruns attribute list' % type_code)
             except Exception as e:
-                LOG.error(e)
-                error_str = traceback.format_exc()
-                LOG.debug(error_str)
+                LOG_LIMITED.error(e)
+                if LOG.isEnabledFor(logging.DEBUG):
+                    LOG.debug(traceback.format_exc())
                 raise excep.UpdateMessageError(
                     sub_error=bgp_cons.ERR_MSG_UPDATE_MALFORMED_ATTR_LIST,
                     data='')
 
-            if type_code == bgp_cons.BGPTYPE_ORIGIN:
-
-                decode_value = Origin.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_AS_PATH:
-
-                decode_value = ASPath.parse(value=attr_value, asn4=asn4)
+            attributes.add(flags, type_code, view[offset:offset + attr_len])
+            offset += attr_len    # Next attribute
 
-            elif type_code == bgp_cons.BGPTYPE_NEXT_HOP:
-
-                decode_value = NextHop.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_MULTI_EXIT_DISC:
-
-                decode_value = MED.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_LOCAL_PREF:
-
-                decode_value = LocalPreference.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_ATOMIC_AGGREGATE:
-
-                decode_value = AtomicAggregate.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_AGGREGATOR:
-
-                decode_value = Aggregator.parse(value=attr_value, asn4=asn4)
-
-            elif type_code == bgp_cons.BGPTYPE_COMMUNITIES:
-
-                decode_value = Community.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_ORIGINATOR_ID:
-
-                decode_value = OriginatorID.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_CLUSTER_LIST:
-
-                decode_value = ClusterList.parse(value=attr_value)
-
-            elif type_code == bgp_cons.BGPTYPE_NEW_AS_PATH:
-
-                decode_value = ASPath.parse(value=attr_value, asn4=True)
-
-            elif type_code == bgp_cons.BGPTYPE_NEW_AGGREGATOR:
-
-                decode_value = Aggregator.parse(value=attr_value, asn4=True)
-
-            elif type_code == bgp_cons.BGPTYPE_MP_REACH_NLRI:
-                decode_value = MpReachNLRI.parse(value=attr_value)
+        return attributes
 
-            elif type_code == bgp_cons.BGPTYPE_MP_UNREACH_NLRI:
-                decode_value = MpUnReachNLRI.parse(value=attr_value)
+    @classmethod
+    def construct_attributes(cls, attr_dict, asn4=False):
 
-            elif type_code == bgp_cons.BGPTYPE_EXTENDED_COMMUNITY:
-                decode_value = ExtCommunity.parse(value=attr_value)
-            else:
-                decode_value = repr(attr_value)
-            attributes[type_code] = decode_value
+        """
+        Encode path attributes, identical attribute sets are served from
+        the attribute cache.
+        """
+        if any(int(type_code) in _UNCACHED_ATTRIBUTES for type_code in attr_dict):
+            return cls.encode_attributes(attr_dict, asn4)
+        key = AttributeCache.make_key(attr_dict, asn4)
+        attr_raw_hex = cls.attr_cache.get(key)
+        if attr_raw_hex is None:
+            attr_raw_hex = cls.encode_attributes(attr_dict, asn4)
+            cls.attr_cache.put(key, attr_raw_hex)
+        return attr_raw_hex
 
-        return attributes
+    @classmethod
+    def cache_stats(cls):
+        """
+        Hit rate and memory of the attribute cache
+        """
+        return cls.attr_cache.stats()
 
     @staticmethod
-    def construct_attributes(attr_dict, asn4=False):
+    def encode_attributes(attr_dict, asn4=False):
 
         """
 
         """
         attr_raw_hex = b''
+        constructors = ATTRIBUTE_REGISTRY.constructors
         for type_code, value in attr_dict.items():
-
-            if int(type_code) == bgp_cons.BGPTYPE_ORIGIN:
-                origin_hex = Origin.construct(value=value)
-                attr_raw_hex += origin_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_AS_PATH:
-                aspath_hex = ASPath.construct(value=value, asn4=asn4)
-                attr_raw_hex += aspath_hex
-
-            elif int(type_code) == bgp_cons.BGP_PREFIX_SID:
-                prefix_sid_hex = BGPPrefixSid.construct(value=value)
-                attr_raw_hex += prefix_sid_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_NEXT_HOP:
-                nexthop_hex = NextHop.construct(value=value)
-                attr_raw_hex += nexthop_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_MULTI_EXIT_DISC:
-                med_hex = MED.construct(value=value)
-                attr_raw_hex += med_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_LOCAL_PREF:
-                localpre_hex = LocalPreference.construct(value=value)
-                attr_raw_hex += localpre_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_ATOMIC_AGGREGATE:
-                atomicaggregate_hex = AtomicAggregate.construct(value=value)
-                attr_raw_hex += atomicaggregate_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_AGGREGATOR:
-                aggregator_hex = Aggregator.construct(value=value, asn4=asn4)
-                attr_raw_hex += aggregator_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_COMMUNITIES:
-                community_hex = Community.construct(value=value)
-                attr_raw_hex += community_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_ORIGINATOR_ID:
-                originatorid_hex = OriginatorID.construct(value=value)
-                attr_raw_hex += originatorid_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_CLUSTER_LIST:
-                clusterlist_hex = ClusterList.construct(value=value)
-                attr_raw_hex += clusterlist_hex
-
-            elif int(type_code) == bgp_cons.BGPTYPE_MP_REACH_NLRI:
-                mpreach_hex = MpReachNLRI().construct(value=value)
-                attr_raw_hex += mpreach_hex
-            elif int(type_code) == bgp_cons.BGPTYPE_MP_UNREACH_NLRI:
-                mpunreach_hex = MpUnReachNLRI.construct(value=value)
-                attr_raw_hex += mpunreach_hex
-            elif int(type_code) == bgp_cons.BGPTYPE_EXTENDED_COMMUNITY:
-                community_ext_hex = ExtCommunity.construct(value=value)
-                attr_raw_hex += community_ext_hex
+            constructor = constructors.get(type_code)
+            if constructor is not None:
+                attr_raw_hex += constructor(value, asn4)
 
         return attr_raw_hex
 
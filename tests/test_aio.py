@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import struct
+import tempfile
+import unittest
+
+from common import constants as bgp_cons
+from core.aio import AsyncioSpeaker
+from core.aio import AsyncioTimer
+from core.config import ConfigReloader
+from core.metrics import Metrics
+from message.keepalive import KeepAlive
+from message.open import Open
+
+MY_CAPABILITY = {'route_refresh': False, 'four_bytes_as': False, 'cisco_route_refresh': False,
+                 'afi_safi': [(1, 4)], 'graceful_restart': False}
+MP_REACH = str(bgp_cons.BGPTYPE_MP_REACH_NLRI)
+
+
+def config(routes):
+    return {'attr': {'1': 0, MP_REACH: {'next_hop': '10.0.0.1', 'BGP_PREFIX_SID': [{p: i} for p, i in routes]}}}
+
+
+async def read_message(reader):
+    header = await asyncio.wait_for(reader.readexactly(bgp_cons.HDR_LEN), 5)
+    length, msg_type = struct.unpack('!HB', header[16:])
+    return msg_type, await reader.readexactly(length - bgp_cons.HDR_LEN)
+
+
+async def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition not met')
+
+
+class TestAsyncioTimer(unittest.TestCase):
+
+    def test_fire_reset_and_cancel(self):
+        fired = []
+
+        async def main():
+            timer = AsyncioTimer(lambda: fired.append(asyncio.get_running_loop().time()))
+            self.assertFalse(timer.active())
+            timer.reset(10)
+            # a reset replaces the pending call
+            start = asyncio.get_running_loop().time()
+            timer.reset(0.01)
+            self.assertTrue(timer.active())
+            await asyncio.sleep(0.05)
+            self.assertFalse(timer.active())
+            self.assertEqual(1, len(fired))
+            self.assertLess(fired[0] - start, 1)
+            timer.reset(0.01)
+            timer.cancel()
+            timer.cancel()
+            await asyncio.sleep(0.05)
+            self.assertFalse(timer.active())
+
+        asyncio.run(main())
+        self.assertEqual(1, len(fired))
+
+
+class TestAsyncioSpeaker(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'config.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, msg_dict, mtime):
+        with open(self.path, 'w') as data_file:
+            json.dump(msg_dict, data_file)
+        os.utime(self.path, (mtime, mtime))
+
+    async def connect(self, speaker):
+        """
+        Connect to the speaker and bring the session to Established
+        :return: (reader, writer, session)
+        """
+        server = await speaker.serve('127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        msg_type, _ = await read_message(reader)
+        self.assertEqual(bgp_cons.MSG_OPEN, msg_type)
+        open_msg = Open(version=bgp_cons.VERSION, asn=65002, hold_time=90, bgp_id='10.255.0.2')
+        msg = open_msg.construct(MY_CAPABILITY) + KeepAlive().construct()
+        # split inside a header, the framer must join the pieces
+        writer.write(msg[:10])
+        await writer.drain()
+        await asyncio.sleep(0.01)
+        writer.write(msg[10:])
+        self.assertEqual(bgp_cons.MSG_KEEPALIVE, (await read_message(reader))[0])
+        session = speaker.peers['127.0.0.1']
+        await wait_for(lambda: session.fsm.state == bgp_cons.ST_ESTABLISHED)
+        return reader, writer, session
+
+    def test_open_keepalive_exchange_and_close(self):
+        metrics = Metrics()
+
+        async def main():
+            speaker = AsyncioSpeaker(65001, '10.255.0.1', MY_CAPABILITY, hold_time=3, metrics=metrics)
+            reader, writer, session = await self.connect(speaker)
+            self.assertEqual(3, session.fsm.hold_time)
+            self.assertTrue(session.fsm.hold_timer.active())
+            # keepalive every hold time / 3 seconds
+            self.assertEqual(bgp_cons.MSG_KEEPALIVE, (await read_message(reader))[0])
+            writer.close()
+            await wait_for(lambda: session.disconnected)
+            self.assertEqual(bgp_cons.ST_IDLE, session.fsm.state)
+            for timer in (session.fsm.hold_timer, session.fsm.keep_alive_timer, session.fsm.connect_retry_timer):
+                self.assertFalse(timer.active())
+            self.assertNotIn('127.0.0.1', speaker.peers)
+            speaker.server.close()
+            await speaker.server.wait_closed()
+
+        asyncio.run(main())
+        peer = metrics.peer('127.0.0.1')
+        self.assertEqual((1, 1), (peer.established, peer.flaps))
+        self.assertEqual(1, peer.messages_sent[bgp_cons.MSG_OPEN])
+        self.assertGreaterEqual(peer.messages_sent[bgp_cons.MSG_KEEPALIVE], 2)
+
+    def test_config_reload_on_change_and_sighup(self):
+        self.write(config([('10.0.0.0/24', 1)]), mtime=1000)
+        reloader = ConfigReloader(self.path)
+        metrics = Metrics()
+
+        async def main():
+            speaker = AsyncioSpeaker(65001, '10.255.0.1', MY_CAPABILITY, config=reloader, config_interval=0.01,
+                                     metrics=metrics)
+            reader, writer, session = await self.connect(speaker)
+            # the configured table follows Established
+            self.assertEqual(bgp_cons.MSG_UPDATE, (await read_message(reader))[0])
+            self.write(config([('10.0.0.0/24', 1), ('10.0.1.0/24', 2)]), mtime=2000)
+            self.assertEqual(bgp_cons.MSG_UPDATE, (await read_message(reader))[0])
+            self.assertEqual(1, reloader.reloads)
+            os.kill(os.getpid(), signal.SIGHUP)
+            await wait_for(lambda: reloader.reloads == 2)
+            writer.close()
+            await wait_for(lambda: session.disconnected)
+            speaker.server.close()
+            await speaker.server.wait_closed()
+
+        asyncio.run(main())
+        self.assertEqual(2, metrics.peer('127.0.0.1').prefixes_advertised)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from common import constants as bgp_cons
+from message.attribute.attribute_cache import AttributeCache
+from message.update import Update
+
+
+def attributes(as_path=(65001,), local_pref=100):
+    return {bgp_cons.BGPTYPE_ORIGIN: 0, bgp_cons.BGPTYPE_AS_PATH: [[bgp_cons.AS_SEQUENCE, list(as_path)]],
+            bgp_cons.BGPTYPE_LOCAL_PREF: local_pref}
+
+
+class TestAttributeCache(unittest.TestCase):
+
+    def test_hits_misses_and_eviction_order(self):
+        cache = AttributeCache(maxsize=2)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', b'\x01')
+        cache.put('b', b'\x02\x02')
+        self.assertEqual(b'\x01', cache.get('a'))
+        # b is now the least recently used
+        cache.put('c', b'\x03')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(b'\x01', cache.get('a'))
+        self.assertEqual(b'\x03', cache.get('c'))
+        stats = cache.stats()
+        self.assertEqual((3, 2, 1, 2), (stats['hits'], stats['misses'], stats['evictions'], stats['entries']))
+        self.assertEqual(0.6, stats['hit_rate'])
+        self.assertEqual(2, stats['encoded_bytes'])
+
+    def test_put_replaces(self):
+        cache = AttributeCache(maxsize=2)
+        cache.put('a', b'\x01')
+        cache.put('b', b'\x02')
+        cache.put('a', b'\x01\x01')
+        # replacing refreshes a, b goes first
+        cache.put('c', b'\x03')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(b'\x01\x01', cache.get('a'))
+        self.assertEqual(3, cache.stats()['encoded_bytes'])
+        cache.clear()
+        self.assertEqual((0, 0, 0, 0), (len(cache._cache), cache.hits, cache.misses, cache.stats()['encoded_bytes']))
+
+    def test_freeze(self):
+        value = {'b': [1, {'c': [2, 3]}], 'a': (4,)}
+        frozen = AttributeCache.freeze(value)
+        hash(frozen)
+        self.assertEqual((('a', (4,)), ('b', (1, (('c', (2, 3)),)))), frozen)
+        # key order and int/str keys do not matter
+        self.assertEqual(frozen, AttributeCache.freeze({'a': [4], 'b': (1, {'c': (2, 3)})}))
+        self.assertNotEqual(frozen, AttributeCache.freeze({'a': [4], 'b': [1, {'c': [3, 2]}]}))
+
+    def test_make_key(self):
+        key = AttributeCache.make_key({'5': 100, 1: 0})
+        self.assertEqual(key, AttributeCache.make_key({1: 0, 5: 100}))
+        self.assertEqual((False, ((1, 0), (5, 100))), key)
+        self.assertNotEqual(key, AttributeCache.make_key({1: 0, 5: 100}, asn4=True))
+
+
+class TestConstructAttributes(unittest.TestCase):
+
+    def setUp(self):
+        self.attr_cache = Update.attr_cache
+        Update.attr_cache = AttributeCache()
+
+    def tearDown(self):
+        Update.attr_cache = self.attr_cache
+
+    def test_identical_sets_hit(self):
+        raw = Update.construct_attributes(attributes())
+        self.assertEqual(raw, Update.construct_attributes(attributes()))
+        self.assertEqual((1, 1), (Update.attr_cache.hits, Update.attr_cache.misses))
+        self.assertNotEqual(raw, Update.construct_attributes(attributes(), asn4=True))
+
+    def test_mutated_config_is_not_stale(self):
+        attr_dict = attributes()
+        raw = Update.construct_attributes(attr_dict)
+        attr_dict[bgp_cons.BGPTYPE_AS_PATH][0][1].append(65002)
+        attr_dict[bgp_cons.BGPTYPE_LOCAL_PREF] = 200
+        mutated = Update.construct_attributes(attr_dict)
+        self.assertNotEqual(raw, mutated)
+        self.assertEqual(Update.encode_attributes(attr_dict), mutated)
+        # the cached entry of the original set is intact
+        self.assertEqual(raw, Update.construct_attributes(attributes()))
+
+    def test_mp_reach_is_not_cached(self):
+        attr_dict = attributes()
+        attr_dict[bgp_cons.BGPTYPE_MP_UNREACH_NLRI] = {'afi_safi': (1, 4), 'withdraw': ['10.0.0.0/24']}
+        Update.construct_attributes(attr_dict)
+        self.assertEqual((0, 0, 0), (Update.attr_cache.hits, Update.attr_cache.misses,
+                                     Update.attr_cache.stats()['entries']))
+
+
+if __name__ == '__main__':
+    unittest.main()
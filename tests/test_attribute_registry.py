@@ -0,0 +1,31 @@
+import unittest
+
+from message.attribute.attribute_base import ATTRIBUTE_REGISTRY
+from message.attribute.attribute_base import AttributeID
+from message.update import Update  # noqa, registers every attribute
+
+
+class TestAttributeRegistry(unittest.TestCase):
+
+    def roundtrip(self, type_code, value, session_asn4=False):
+        raw = ATTRIBUTE_REGISTRY.constructors[type_code](value, session_asn4)
+        self.assertEqual(type_code, raw[1])
+        return ATTRIBUTE_REGISTRY.parsers[type_code](raw[3:], session_asn4)
+
+    def test_as_path_follows_session(self):
+        self.assertEqual([(2, [1, 2])], self.roundtrip(AttributeID.AS_PATH, [(2, [1, 2])]))
+        self.assertEqual([(2, [70000])], self.roundtrip(AttributeID.AS_PATH, [(2, [70000])], True))
+
+    def test_as4_path(self):
+        self.assertEqual([(2, [70000, 1])], self.roundtrip(AttributeID.AS4_PATH, [(2, [70000, 1])]))
+
+    def test_as4_aggregator(self):
+        self.assertEqual((70000, '10.0.0.1'), self.roundtrip(AttributeID.AS4_AGGREGATOR, (70000, '10.0.0.1')))
+
+    def test_str_type_codes(self):
+        self.assertIs(ATTRIBUTE_REGISTRY.constructors[AttributeID.AS4_PATH],
+                      ATTRIBUTE_REGISTRY.constructors[str(AttributeID.AS4_PATH)])
+
+
+if __name__ == '__main__':
+    unittest.main()
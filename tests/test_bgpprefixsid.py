@@ -0,0 +1,53 @@
+import unittest
+
+from common import exception as excep
+from message.attribute.bgpprefixsid import SRGB
+from message.attribute.bgpprefixsid import BGPPrefixSid
+
+LABEL_INDEX_TLV = b'\x01\x00\x07\x00\x00\x00\x00\x00\x00\x0a'
+SRGB_TLV = b'\x03\x00\x08\x00\x00\x00\x3e\x80\x00\x1f\x40'
+
+
+class TestBGPPrefixSid(unittest.TestCase):
+
+    def test_label_index(self):
+        # optional transitive, type 40, length 10
+        self.assertEqual(b'\xc0\x28\x0a' + LABEL_INDEX_TLV, BGPPrefixSid.construct(10))
+        self.assertEqual({'flags': 0, 'label_index': 10}, BGPPrefixSid.parse(LABEL_INDEX_TLV))
+
+    def test_originator_srgb(self):
+        value = {'label_index': 10, 'srgb': [[16000, 8000]]}
+        raw = BGPPrefixSid.construct(value)
+        self.assertEqual(b'\xc0\x28\x15' + LABEL_INDEX_TLV + SRGB_TLV, raw)
+        self.assertEqual(dict(value, flags=0, srgb_flags=0), BGPPrefixSid.parse(raw[3:]))
+        self.assertEqual(SRGB([(16000, 8000)]), BGPPrefixSid.srgb(value))
+        self.assertIsNone(BGPPrefixSid.srgb(10))
+
+    def test_srgb_ranges(self):
+        value = {'srgb': [[16000, 100], [20000, 50]], 'srgb_flags': 0}
+        self.assertEqual(value, BGPPrefixSid.parse(BGPPrefixSid.construct(value)[3:]))
+
+    def test_extended_length(self):
+        value = {'srgb': [[16000 + 100 * i, 100] for i in range(50)]}
+        raw = BGPPrefixSid.construct(value)
+        self.assertEqual(b'\xd0\x28', raw[:2])
+        self.assertEqual(len(raw) - 4, int.from_bytes(raw[2:4], 'big'))
+        self.assertEqual(value['srgb'], BGPPrefixSid.parse(raw[4:])['srgb'])
+
+    def test_unknown_tlv(self):
+        self.assertEqual({'unknown': {5: b'ab'}, 'flags': 0, 'label_index': 10},
+                         BGPPrefixSid.parse(b'\x05\x00\x02ab' + LABEL_INDEX_TLV))
+
+    def test_malformed(self):
+        for value in (LABEL_INDEX_TLV[:-1], b'\x01\x00\x06' + b'\x00' * 6, b'\x03\x00\x07' + b'\x00' * 7, b'\x01'):
+            with self.assertRaises(excep.UpdateMessageError):
+                BGPPrefixSid.parse(value)
+
+    def test_construct_invalid(self):
+        for value in (1 << 32, 'x', {'label_index': 1, 'srgb': [[15, 10]]}):
+            with self.assertRaises(excep.ConstructAttributeFailed):
+                BGPPrefixSid.construct(value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from common import constants as bgp_cons
+from core.config import ConfigReloader
+from core.config import PrefixSidTable
+from core.config import assigned_indexes
+from core.config import diff_config
+from core.config import load_config
+from core.config import prefix_sids
+
+MP_REACH = str(bgp_cons.BGPTYPE_MP_REACH_NLRI)
+
+
+def config(routes, next_hop='10.0.0.1', **attr):
+    msg_attr = {'1': 0, MP_REACH: {'next_hop': next_hop, 'BGP_PREFIX_SID': [{p: i} for p, i in routes]}}
+    msg_attr.update(attr)
+    return {'attr': msg_attr}
+
+
+class ConfigTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'config.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, msg_dict, path=None, mtime=None):
+        path = path or self.path
+        with open(path, 'w') as data_file:
+            json.dump(msg_dict, data_file)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+
+class TestLoadConfig(ConfigTestCase):
+
+    def test_table(self):
+        self.write(config([('10.0.1.0/24', 2), ('10.0.0.0/24', 1), ('10.0.0.0/16', 3)]))
+        msg_dict = load_config(self.path)
+        table = msg_dict['attr'][MP_REACH]['BGP_PREFIX_SID']
+        self.assertIsInstance(table, PrefixSidTable)
+        self.assertEqual(3, len(table))
+        self.assertEqual([('10.0.0.0/16', 3), ('10.0.0.0/24', 1), ('10.0.1.0/24', 2)], list(table.pairs()))
+        self.assertEqual([{'10.0.0.0/16': 3}], list(table)[:1])
+        self.assertEqual(1, table.lookup(0x0a000000, 24))
+        self.assertIsNone(table.lookup(0x0a000000, 23))
+
+    def test_duplicate_prefix_last_wins(self):
+        self.write(config([('10.0.0.0/24', 1), ('10.0.0.0/24', 5)]))
+        self.assertEqual({'10.0.0.0/24': 5}, prefix_sids(load_config(self.path)))
+
+    def test_overridden_index_is_free(self):
+        self.write(config([('10.0.0.0/24', 1), ('10.0.0.0/24', 2), ('10.0.1.0/24', 1)],
+                          **{str(bgp_cons.BGP_PREFIX_SID): {'srgb': [[16000, 100]]}}))
+        msg_dict = load_config(self.path)
+        self.assertEqual({'10.0.0.0/24': 2, '10.0.1.0/24': 1}, prefix_sids(msg_dict))
+        self.assertEqual(2, msg_dict['attr'][MP_REACH]['BGP_PREFIX_SID'].allocator.used)
+
+    def test_table_is_a_copy(self):
+        self.write(config([('10.0.0.0/24', 1)]))
+        msg_dict = load_config(self.path)
+        self.write(config([('10.9.0.0/24', 9)]))
+        self.assertEqual({'10.0.0.0/24': 1}, prefix_sids(msg_dict))
+
+    def test_sid_file(self):
+        msg_dict = config([])
+        msg_dict['attr'][MP_REACH]['BGP_PREFIX_SID_FILE'] = 'routes.csv'
+        self.write(msg_dict)
+        with open(os.path.join(self.dir, 'routes.csv'), 'w') as data_file:
+            data_file.write('# prefix,index\n10.0.0.0/24,1\n\n10.0.1.0/24 2\n')
+        msg_dict = load_config(self.path)
+        self.assertNotIn('BGP_PREFIX_SID_FILE', msg_dict['attr'][MP_REACH])
+        self.assertEqual({'10.0.0.0/24': 1, '10.0.1.0/24': 2}, prefix_sids(msg_dict))
+
+    def test_invalid_routes(self):
+        for routes in ([('10.0.0.1/24', 1)], [('10.0.0.0/33', 1)], [('10.0.0.0/24', 1 << 20)],
+                       [('10.0.0.0/24', None)]):
+            self.write(config(routes))
+            with self.assertRaises(ValueError):
+                load_config(self.path)
+
+
+class TestDiffConfig(ConfigTestCase):
+
+    def load(self, msg_dict):
+        self.write(msg_dict)
+        return load_config(self.path)
+
+    def test_unchanged(self):
+        old = self.load(config([('10.0.0.0/24', 1)]))
+        new = self.load(config([('10.0.0.0/24', 1)]))
+        self.assertEqual([], diff_config(old, new))
+
+    def test_changed_index_and_withdraw(self):
+        old = self.load(config([('10.0.0.0/24', 1), ('10.0.1.0/24', 2), ('10.0.2.0/24', 3)]))
+        new = self.load(config([('10.0.0.0/24', 1), ('10.0.1.0/24', 7), ('10.0.3.0/24', 4)]))
+        withdraw, announce = diff_config(old, new)
+        self.assertEqual({'withdraw': ['10.0.2.0/24']}, withdraw['attr'][bgp_cons.BGPTYPE_MP_UNREACH_NLRI])
+        mp_reach = announce['attr'][bgp_cons.BGPTYPE_MP_REACH_NLRI]
+        self.assertEqual([{'10.0.1.0/24': 7}, {'10.0.3.0/24': 4}], mp_reach['BGP_PREFIX_SID'])
+        self.assertEqual('10.0.0.1', mp_reach['next_hop'])
+        self.assertEqual(0, announce['attr'][1])
+
+    def test_attribute_change_announces_everything(self):
+        old = self.load(config([('10.0.0.0/24', 1), ('10.0.1.0/24', 2)]))
+        new = self.load(config([('10.0.0.0/24', 1), ('10.0.1.0/24', 2)], next_hop='10.0.0.2'))
+        [announce] = diff_config(old, new)
+        self.assertEqual(2, len(announce['attr'][bgp_cons.BGPTYPE_MP_REACH_NLRI]['BGP_PREFIX_SID']))
+
+
+class TestConfigReloader(ConfigTestCase):
+
+    def test_check_sends_the_difference(self):
+        self.write(config([('10.0.0.0/24', 1)]), mtime=1000)
+        changes = []
+        reloader = ConfigReloader(self.path, on_change=lambda msg_dict, updates: changes.append(updates))
+        self.assertIsNone(reloader.check())
+        self.write(config([('10.0.0.0/24', 2)]), mtime=2000)
+        updates = reloader.check()
+        self.assertEqual(1, len(updates))
+        self.assertEqual([{'10.0.0.0/24': 2}],
+                         updates[0]['attr'][bgp_cons.BGPTYPE_MP_REACH_NLRI]['BGP_PREFIX_SID'])
+        self.assertEqual([updates], changes)
+        self.assertEqual({'10.0.0.0/24': 2}, prefix_sids(reloader.msg_dict))
+
+    def test_reload_keeps_assigned_indexes(self):
+        srgb = {str(bgp_cons.BGP_PREFIX_SID): {'srgb': [[16000, 100]]}}
+        self.write(config([('10.0.0.0/24', None), ('10.0.1.0/24', None), ('10.0.2.0/24', 0)], **srgb), mtime=1000)
+        reloader = ConfigReloader(self.path)
+        self.assertEqual({'10.0.0.0/24': 1, '10.0.1.0/24': 2, '10.0.2.0/24': 0}, prefix_sids(reloader.msg_dict))
+        # a fresh allocator would hand 10.0.1.0/24 index 0 or 1
+        self.write(config([('10.0.1.0/24', None), ('9.0.0.0/24', None), ('10.0.3.0/24', None)], **srgb), mtime=2000)
+        updates = reloader.check()
+        self.assertEqual({'10.0.1.0/24': 2, '9.0.0.0/24': 0, '10.0.3.0/24': 1}, prefix_sids(reloader.msg_dict))
+        withdraw, announce = updates
+        self.assertEqual(['10.0.0.0/24', '10.0.2.0/24'],
+                         withdraw['attr'][bgp_cons.BGPTYPE_MP_UNREACH_NLRI]['withdraw'])
+        self.assertEqual([{'9.0.0.0/24': 0}, {'10.0.3.0/24': 1}],
+                         announce['attr'][bgp_cons.BGPTYPE_MP_REACH_NLRI]['BGP_PREFIX_SID'])
+
+    def test_configured_index_wins_over_assigned(self):
+        srgb = {str(bgp_cons.BGP_PREFIX_SID): {'srgb': [[16000, 100]]}}
+        self.write(config([('10.0.0.0/24', None)], **srgb))
+        msg_dict = load_config(self.path)
+        self.assertEqual({'10.0.0.0/24': 0}, assigned_indexes(msg_dict))
+        self.write(config([('10.0.0.0/24', None), ('10.0.1.0/24', 0)], **srgb))
+        self.assertEqual({'10.0.0.0/24': 1, '10.0.1.0/24': 0},
+                         prefix_sids(load_config(self.path, assigned_indexes(msg_dict))))
+
+    def test_invalid_config_keeps_the_old_one(self):
+        self.write(config([('10.0.0.0/24', 1)]), mtime=1000)
+        reloader = ConfigReloader(self.path)
+        msg_dict = reloader.msg_dict
+        self.write(config([('10.0.0.1/24', 1)]), mtime=2000)
+        self.assertIsNone(reloader.check())
+        self.assertIs(msg_dict, reloader.msg_dict)
+        self.assertEqual({'10.0.0.0/24': 1}, prefix_sids(reloader.msg_dict))
+
+    def test_check_sees_the_sid_file(self):
+        msg_dict = config([])
+        msg_dict['attr'][MP_REACH]['BGP_PREFIX_SID_FILE'] = 'routes.csv'
+        self.write(msg_dict, mtime=1000)
+        sid_file = os.path.join(self.dir, 'routes.csv')
+        with open(sid_file, 'w') as data_file:
+            data_file.write('10.0.0.0/24,1\n')
+        os.utime(sid_file, (1000, 1000))
+        reloader = ConfigReloader(self.path)
+        self.assertEqual((self.path, sid_file), reloader.files())
+        self.assertIsNone(reloader.check())
+        # same mtime, only the size tells the edit apart
+        with open(sid_file, 'w') as data_file:
+            data_file.write('10.0.0.0/24,1\n10.0.1.0/24,2\n')
+        os.utime(sid_file, (1000, 1000))
+        updates = reloader.check()
+        self.assertEqual([{'10.0.1.0/24': 2}],
+                         updates[0]['attr'][bgp_cons.BGPTYPE_MP_REACH_NLRI]['BGP_PREFIX_SID'])
+        self.assertEqual({'10.0.0.0/24': 1, '10.0.1.0/24': 2}, prefix_sids(reloader.msg_dict))
+        self.assertIsNone(reloader.check())
+        self.assertEqual(1, reloader.reloads)
+
+
+if __name__ == '__main__':
+    unittest.main()
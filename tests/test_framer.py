@@ -0,0 +1,94 @@
+import struct
+import unittest
+
+from common import constants as bgp_cons
+from common import exception as excep
+from core.framer import BGPFramer
+from message.keepalive import KeepAlive
+
+KEEPALIVE = KeepAlive().construct()
+
+
+def message(msg_type, body):
+    return b'\xff' * 16 + struct.pack('!HB', bgp_cons.HDR_LEN + len(body), msg_type) + body
+
+
+class FakeSocket(object):
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv_into(self, view):
+        if not self.chunks:
+            return 0
+        chunk = self.chunks.pop(0)
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class TestBGPFramer(unittest.TestCase):
+
+    def test_single_message(self):
+        framer = BGPFramer()
+        framer.feed(KEEPALIVE)
+        self.assertEqual([(bgp_cons.MSG_KEEPALIVE, b'')], [(t, bytes(m)) for t, m in framer.frames()])
+
+    def test_message_split_across_feeds(self):
+        framer = BGPFramer()
+        data = message(bgp_cons.MSG_UPDATE, b'\x00' * 100)
+        framer.feed(data[:10])
+        self.assertEqual([], list(framer.frames()))
+        framer.feed(data[10:])
+        frames = [(t, bytes(m)) for t, m in framer.frames()]
+        self.assertEqual([(bgp_cons.MSG_UPDATE, b'\x00' * 100)], frames)
+
+    def test_feed_larger_than_buffer(self):
+        framer = BGPFramer()
+        data = KEEPALIVE * (70000 // len(KEEPALIVE) + 1)
+        framer.feed(data)
+        self.assertEqual(len(data) // len(KEEPALIVE), len(list(framer.frames())))
+
+    def test_partial_then_full_buffer_chunk(self):
+        framer = BGPFramer()
+        data = message(bgp_cons.MSG_UPDATE, b'\x01' * 4000) * 20
+        framer.feed(data[:10])
+        list(framer.frames())
+        framer.feed(data[10:10 + 65536])
+        framer.feed(data[10 + 65536:])
+        frames = list(framer.frames())
+        self.assertEqual(20, len(frames))
+        self.assertTrue(all(bytes(body) == b'\x01' * 4000 for _, body in frames))
+
+    def test_asyncio_sized_chunks(self):
+        framer = BGPFramer()
+        data = message(bgp_cons.MSG_UPDATE, b'\x02' * 4077) * 200
+        count = 0
+        for start in range(0, len(data), 256 * 1024):
+            framer.feed(data[start:start + 256 * 1024])
+            count += len(list(framer.frames()))
+        self.assertEqual(200, count)
+
+    def test_bad_marker(self):
+        framer = BGPFramer()
+        framer.feed(b'\x00' * 16 + struct.pack('!HB', 19, 4))
+        with self.assertRaises(excep.MessageHeaderError) as context:
+            list(framer.frames())
+        self.assertEqual(bgp_cons.ERR_MSG_HDR_CONN_NOT_SYNC, context.exception.sub_error)
+
+    def test_bad_length(self):
+        framer = BGPFramer()
+        framer.feed(b'\xff' * 16 + struct.pack('!HB', 5000, 2))
+        with self.assertRaises(excep.MessageHeaderError) as context:
+            list(framer.frames())
+        self.assertEqual(bgp_cons.ERR_MSG_HDR_BAD_MSG_LEN, context.exception.sub_error)
+
+    def test_read_frames(self):
+        data = KEEPALIVE * 3 + message(bgp_cons.MSG_UPDATE, b'\x03' * 10)
+        sock = FakeSocket([data[:7], data[7:40], data[40:]])
+        frames = [(t, bytes(m)) for t, m in BGPFramer().read_frames(sock)]
+        self.assertEqual([bgp_cons.MSG_KEEPALIVE] * 3 + [bgp_cons.MSG_UPDATE], [t for t, _ in frames])
+        self.assertEqual(b'\x03' * 10, frames[-1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+
+from common import constants as bgp_cons
+from core.fsm import FSM
+from core.metrics import Metrics
+
+
+class FakeTimer(object):
+
+    def __init__(self, call_able):
+        self.callable = call_able
+        self.seconds = None
+
+    def cancel(self):
+        self.seconds = None
+
+    def reset(self, seconds_fromnow):
+        self.seconds = seconds_fromnow
+
+    def active(self):
+        return self.seconds is not None
+
+    def fire(self):
+        self.seconds = None
+        self.callable()
+
+
+class FakeProtocol(object):
+
+    def __init__(self, metrics=None):
+        self.peer_id = '10.0.0.2'
+        self.metrics = metrics
+        self.sent = []
+        self.closed = 0
+        self.established = 0
+
+    def send_open(self):
+        self.sent.append('open')
+
+    def send_keepalive(self):
+        self.sent.append('keepalive')
+
+    def send_notification(self, error, sub_error, data=b''):
+        self.sent.append(('notification', error, sub_error))
+
+    def connection_established(self):
+        self.established += 1
+
+    def close_connection(self):
+        self.closed += 1
+
+
+class TestFSM(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics().peer('10.0.0.2')
+        self.protocol = FakeProtocol(self.metrics)
+        self.fsm = FSM(protocol=self.protocol, hold_time=90, timer_cls=FakeTimer)
+
+    def establish(self, hold_time=30):
+        self.fsm.connection_made()
+        self.assertEqual(bgp_cons.ST_OPENSENT, self.fsm.state)
+        self.assertEqual(bgp_cons.LARGER_HOLD_TIME, self.fsm.hold_timer.seconds)
+        self.fsm.open_received(hold_time)
+        self.assertEqual(bgp_cons.ST_OPENCONFIRM, self.fsm.state)
+        self.fsm.keep_alive_received()
+
+    def test_open_to_established(self):
+        self.establish()
+        self.assertEqual(bgp_cons.ST_ESTABLISHED, self.fsm.state)
+        self.assertEqual(['open', 'keepalive'], self.protocol.sent)
+        self.assertEqual(1, self.protocol.established)
+        # the smaller hold time wins, keepalives every third of it
+        self.assertEqual(30, self.fsm.hold_timer.seconds)
+        self.assertEqual(10, self.fsm.keep_alive_timer.seconds)
+        self.fsm.keep_alive_timer.fire()
+        self.assertEqual('keepalive', self.protocol.sent[-1])
+        self.assertEqual(10, self.fsm.keep_alive_timer.seconds)
+
+    def test_unacceptable_hold_time(self):
+        self.fsm.connection_made()
+        with self.assertRaises(Exception) as cm:
+            self.fsm.open_received(2)
+        self.assertEqual(bgp_cons.ERR_MSG_OPEN_UNACCPT_HOLD_TIME, cm.exception.sub_error)
+
+    def test_hold_timer_expiry(self):
+        self.establish()
+        self.fsm.hold_timer.fire()
+        self.assertEqual(('notification', bgp_cons.ERR_HOLD_TIMER_EXPIRED, 0), self.protocol.sent[-1])
+        self.assertEqual(bgp_cons.ST_IDLE, self.fsm.state)
+        self.assertEqual(1, self.protocol.closed)
+        self.assertFalse(any(timer.active() for timer in (
+            self.fsm.hold_timer, self.fsm.keep_alive_timer, self.fsm.connect_retry_timer)))
+        # the close we asked for is not counted again
+        self.fsm.connection_lost()
+        self.assertEqual(1, self.fsm.connect_retry_counter)
+
+    def test_connection_lost(self):
+        self.fsm.connection_made()
+        self.fsm.connection_lost()
+        self.assertEqual(bgp_cons.ST_ACTIVE, self.fsm.state)
+        self.assertEqual(0, self.fsm.connect_retry_counter)
+        self.assertTrue(self.fsm.connect_retry_timer.active())
+        self.fsm.connect_retry_timer.fire()
+        self.assertEqual(bgp_cons.ST_CONNECT, self.fsm.state)
+        self.assertEqual(1, self.fsm.connect_retry_counter)
+
+    def test_established_connection_lost(self):
+        self.establish()
+        self.fsm.connection_lost()
+        self.assertEqual(bgp_cons.ST_IDLE, self.fsm.state)
+        self.assertEqual(1, self.fsm.connect_retry_counter)
+        self.assertFalse(self.fsm.hold_timer.active())
+
+    def test_counters_outlive_the_session(self):
+        self.establish()
+        self.fsm.connection_lost()
+        fsm = FSM(protocol=FakeProtocol(self.metrics), timer_cls=FakeTimer)
+        self.fsm = fsm
+        self.establish()
+        self.assertEqual(2, self.metrics.established)
+        self.assertEqual(1, self.metrics.flaps)
+        self.assertEqual(bgp_cons.ST_ESTABLISHED, self.metrics.state)
+        self.assertEqual(2, self.metrics.transitions[(bgp_cons.ST_OPENSENT, bgp_cons.ST_OPENCONFIRM)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import socket
+import struct
+import unittest
+
+from common import exception as excep
+from message.attribute.nlri.prefix import MASKS
+from message.attribute.nlri.labelledunicast import IPv4LabelledUnicast
+from message.attribute.nlri.labelledunicast import MAX_LABEL
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def prefix(i):
+    prefix_len = 8 + i % 25
+    network = (i * 2654435761) & MASKS[prefix_len]
+    return '%s/%s' % (socket.inet_ntoa(struct.pack('!I', network)), prefix_len)
+
+
+ROUTES = [(prefix(i), i % 1000) for i in range(2000)]
+# 10.1.2.0/24 with the label stack 100, 200
+LABEL_STACK = bytes([24 + 48]) + (100 << 4).to_bytes(3, 'big') + ((200 << 4) | 1).to_bytes(3, 'big') + bytes([10, 1, 2])
+
+
+class TestIPv4LabelledUnicast(unittest.TestCase):
+
+    def test_encode_parse_roundtrip(self):
+        nlri = bytes(IPv4LabelledUnicast.encode(ROUTES))
+        routes = IPv4LabelledUnicast.parse(nlri)
+        self.assertEqual([prefix for prefix, _ in ROUTES], [str(route.ipv4_prefix()) for route in routes])
+        self.assertEqual([label for _, label in ROUTES], [route.labels[0] for route in routes])
+
+    def test_encode_matches_generate_nlri_subobj(self):
+        self.assertEqual(b''.join(IPv4LabelledUnicast.generate_nlri_subobj(prefix, label) for prefix, label in ROUTES),
+                         bytes(IPv4LabelledUnicast.encode(ROUTES)))
+
+    def test_label_stack(self):
+        [route] = IPv4LabelledUnicast.parse(LABEL_STACK)
+        self.assertEqual((100, 200), route.labels)
+        self.assertEqual(24, route.prefix_len)
+
+    def test_truncated(self):
+        nlri = bytes(IPv4LabelledUnicast.encode(ROUTES[:10]))
+        with self.assertRaises(excep.UpdateMessageError):
+            IPv4LabelledUnicast.parse(nlri[:-1])
+
+    def test_label_out_of_range(self):
+        for label in (MAX_LABEL + 1, -1):
+            with self.assertRaises(excep.ConstructAttributeFailed):
+                IPv4LabelledUnicast.encode([('10.0.0.0/8', label)])
+            with self.assertRaises(excep.ConstructAttributeFailed):
+                IPv4LabelledUnicast.generate_nlri_subobj('10.0.0.0/8', label)
+        [route] = IPv4LabelledUnicast.parse(bytes(IPv4LabelledUnicast.encode([('10.0.0.0/8', MAX_LABEL)])))
+        self.assertEqual((MAX_LABEL,), route.labels)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestParseArray(unittest.TestCase):
+
+    def test_scan_array_matches_scan(self):
+        nlri = bytes(IPv4LabelledUnicast.encode(ROUTES))
+        offsets, counts = IPv4LabelledUnicast.scan_array(nlri)
+        self.assertEqual(list(IPv4LabelledUnicast.scan(nlri)), list(zip(offsets.tolist(), counts.tolist())))
+
+    def test_parse_array_matches_parse(self):
+        nlri = bytes(IPv4LabelledUnicast.encode(ROUTES))
+        routes = IPv4LabelledUnicast.parse_array(nlri)
+        expected = IPv4LabelledUnicast.parse(nlri)
+        self.assertEqual([route.prefix for route in expected], routes['network'].tolist())
+        self.assertEqual([route.prefix_len for route in expected], routes['prefix_len'].tolist())
+        self.assertEqual([route.labels[0] for route in expected], routes['labels'][:, 0].tolist())
+
+    def test_label_stack_falls_back(self):
+        nlri = bytes(IPv4LabelledUnicast.encode(ROUTES[:3])) + LABEL_STACK
+        self.assertIsNone(IPv4LabelledUnicast.scan_array(nlri))
+        routes = IPv4LabelledUnicast.parse_array(nlri)
+        self.assertEqual([1, 1, 1, 2], routes['label_count'].tolist())
+        self.assertEqual([100, 200], routes['labels'][3].tolist())
+
+    def test_truncated(self):
+        nlri = bytes(IPv4LabelledUnicast.encode(ROUTES[:10]))
+        with self.assertRaises(excep.UpdateMessageError):
+            IPv4LabelledUnicast.parse_array(nlri[:-1])
+
+    def test_empty(self):
+        self.assertEqual(0, len(IPv4LabelledUnicast.parse_array(b'')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+from core import labels
+from core.labels import LabelIndexAllocator
+from message.attribute.bgpprefixsid import SRGB
+
+
+class TestSRGB(unittest.TestCase):
+
+    def test_label_and_index(self):
+        srgb = SRGB([(16000, 100), (20000, 50)])
+        self.assertEqual(150, srgb.size)
+        self.assertEqual(16000, srgb.label(0))
+        self.assertEqual(16099, srgb.label(99))
+        self.assertEqual(20000, srgb.label(100))
+        self.assertEqual(100, srgb.index(20000))
+        self.assertIsNone(srgb.index(16100))
+        with self.assertRaises(ValueError):
+            srgb.label(150)
+
+    def test_label_array(self):
+        srgb = SRGB([(16000, 100), (20000, 50)])
+        self.assertEqual([srgb.label(i) for i in (0, 99, 100, 149)], srgb.label_array([0, 99, 100, 149]).tolist())
+        with self.assertRaises(ValueError):
+            srgb.label_array([150])
+
+    def test_invalid(self):
+        for ranges in ([], [(15, 10)], [(16000, 0)], [((1 << 20) - 5, 10)]):
+            with self.assertRaises(ValueError):
+                SRGB(ranges)
+
+
+class TestLabelIndexAllocator(unittest.TestCase):
+
+    def test_allocate_lowest_free(self):
+        allocator = LabelIndexAllocator(SRGB([(16000, 200)]))
+        allocator.reserve(0)
+        allocator.reserve(2)
+        self.assertEqual([1, 3, 4], [allocator.allocate() for _ in range(3)])
+        allocator.release(1)
+        self.assertEqual(1, allocator.allocate())
+        self.assertEqual({'size': 200, 'used': 5, 'free': 195}, allocator.stats())
+
+    def test_release_below_hint(self):
+        allocator = LabelIndexAllocator(SRGB([(16000, 200)]))
+        for _ in range(130):
+            allocator.allocate()
+        allocator.release(5)
+        self.assertEqual(5, allocator.allocate())
+        self.assertEqual(130, allocator.allocate())
+
+    def test_exhausted(self):
+        allocator = LabelIndexAllocator(SRGB([(16000, 70)]))
+        self.assertEqual(list(range(70)), [allocator.allocate() for _ in range(70)])
+        with self.assertRaises(ValueError):
+            allocator.allocate()
+
+    def test_reserve(self):
+        allocator = LabelIndexAllocator(SRGB([(16000, 10)]))
+        allocator.reserve(3)
+        self.assertIn(3, allocator)
+        with self.assertRaises(ValueError):
+            allocator.reserve(3)
+        with self.assertRaises(ValueError):
+            allocator.reserve(10)
+
+    def test_allocate_block(self):
+        allocator = LabelIndexAllocator(SRGB([(16000, 100)]))
+        allocator.reserve(3)
+        allocator.reserve(8)
+        self.assertEqual(9, allocator.allocate_block(5))
+        self.assertEqual(4, allocator.allocate_block(4))
+        with self.assertRaises(ValueError):
+            allocator.allocate_block(100)
+
+    def test_reserve_table(self):
+        allocator = LabelIndexAllocator(SRGB([(16000, 100)]))
+        allocator.reserve_table([5, 70, 99])
+        self.assertEqual(3, allocator.used)
+        self.assertTrue(all(index in allocator for index in (5, 70, 99)))
+        self.assertNotIn(6, allocator)
+        with self.assertRaises(ValueError):
+            allocator.reserve_table([1, 5])
+
+    def test_find_conflicts(self):
+        allocator = LabelIndexAllocator(SRGB([(16000, 100)]))
+        allocator.reserve(7)
+        self.assertEqual({'out_of_range': [1, 4], 'duplicates': [3], 'in_use': [7]},
+                         allocator.find_conflicts([3, 100, 7, 3, -1, 8]))
+
+
+class TestWithoutNumpy(TestLabelIndexAllocator):
+
+    def setUp(self):
+        self.numpy = labels.numpy
+        labels.numpy = None
+
+    def tearDown(self):
+        labels.numpy = self.numpy
+
+
+if __name__ == '__main__':
+    unittest.main()
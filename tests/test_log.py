@@ -0,0 +1,145 @@
+import logging
+import unittest
+
+from common.log import HexDump
+from common.log import MessageSummary
+from common.log import RateLimitedLogger
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        super(RecordingHandler, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def messages(self):
+        return [record.getMessage() for record in self.records]
+
+
+class CountedBytes(bytes):
+    """
+    bytes counting how often HexDump reads them
+    """
+    reads = 0
+
+    def __getitem__(self, item):
+        CountedBytes.reads += 1
+        return bytes.__getitem__(self, item)
+
+
+class LogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('test_log.%s' % self.id())
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.handler = RecordingHandler()
+        self.logger.addHandler(self.handler)
+        self.clock = Clock()
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+
+class TestRateLimitedLogger(LogTestCase):
+
+    def test_burst_suppression_and_flush(self):
+        limited = RateLimitedLogger(self.logger, interval=10, burst=2, clock=self.clock)
+
+        def warn(number):
+            # one call site
+            limited.warning('message %s', number)
+
+        for number in range(5):
+            warn(number)
+        self.assertEqual(['message 0', 'message 1'], self.handler.messages())
+        self.clock.now += 9.9
+        warn(5)
+        self.assertEqual(2, len(self.handler.records))
+        # next window, the suppressed count is logged first
+        self.clock.now += 0.1
+        warn(6)
+        self.assertEqual(['message 0', 'message 1', '4 similar messages suppressed', 'message 6'],
+                         self.handler.messages())
+        self.clock.now += 10
+        warn(7)
+        self.assertEqual('message 7', self.handler.messages()[-1])
+        self.assertEqual(5, len(self.handler.records))
+
+    def test_call_sites_and_keys(self):
+        limited = RateLimitedLogger(self.logger, interval=10, burst=1, clock=self.clock)
+        for _ in range(3):
+            limited.error('first')
+            limited.error('second')
+            limited.error('keyed %s', 1, key='peer')
+            limited.error('keyed %s', 2, key='peer')
+        self.assertEqual(['first', 'second', 'keyed 1'], self.handler.messages())
+        # records point at the caller
+        self.assertEqual(__file__, self.handler.records[0].pathname)
+
+    def test_disabled_level_is_not_counted(self):
+        limited = RateLimitedLogger(self.logger, interval=10, burst=1, clock=self.clock)
+        limited.debug('not enabled')
+        self.assertEqual({}, limited.sites)
+
+
+class TestMessageSummary(LogTestCase):
+
+    def test_counts_and_interval(self):
+        summary = MessageSummary(self.logger, interval=60, clock=self.clock)
+        summary.count('UPDATE', 100)
+        summary.count('UPDATE', 50)
+        summary.count('KEEPALIVE', 19)
+        self.assertEqual([], self.handler.records)
+        self.clock.now += 60
+        summary.count('UPDATE', 10)
+        self.assertEqual(['1 KEEPALIVE messages (19 bytes) sent in the last 60 seconds',
+                          '3 UPDATE messages (160 bytes) sent in the last 60 seconds'], self.handler.messages())
+        self.assertEqual({}, summary.counts)
+        self.clock.now += 30
+        summary.flush()
+        self.assertEqual(2, len(self.handler.records))
+
+    def test_disabled_level(self):
+        summary = MessageSummary(self.logger, interval=60, level=logging.DEBUG, clock=self.clock)
+        summary.count('UPDATE', 100)
+        self.clock.now += 60
+        summary.count('UPDATE', 100)
+        self.assertEqual(([], {}), (self.handler.records, summary.counts))
+
+
+class TestHexDump(LogTestCase):
+
+    def setUp(self):
+        super(TestHexDump, self).setUp()
+        CountedBytes.reads = 0
+
+    def test_lazy(self):
+        data = CountedBytes(b'\x00\x01\xff')
+        self.logger.debug('%s', HexDump(data))
+        self.assertEqual(0, CountedBytes.reads)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.debug('%s', HexDump(data))
+        # formatting is left to the handler
+        self.assertEqual(0, CountedBytes.reads)
+        self.assertEqual(['0001ff'], self.handler.messages())
+        self.assertEqual(1, CountedBytes.reads)
+
+    def test_limit(self):
+        self.assertEqual('0001...(3 bytes)', str(HexDump(memoryview(b'\x00\x01\x02'), limit=2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
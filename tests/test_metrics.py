@@ -0,0 +1,136 @@
+import unittest
+
+from common import constants as bgp_cons
+from core.metrics import Histogram
+from core.metrics import Metrics
+from core.metrics import PeerMetrics
+
+MP_REACH = bgp_cons.BGPTYPE_MP_REACH_NLRI
+MP_UNREACH = bgp_cons.BGPTYPE_MP_UNREACH_NLRI
+
+
+def samples(text, name):
+    """
+    :return: {labels: value} of the samples of name
+    """
+    result = {}
+    for line in text.splitlines():
+        if line.startswith(name + '{') or line.startswith(name + ' '):
+            series, value = line.rsplit(' ', 1)
+            result[series[len(name):]] = value
+    return result
+
+
+class TestPeerMetrics(unittest.TestCase):
+
+    def test_counters(self):
+        peer = PeerMetrics('10.0.0.2')
+        peer.sent(bgp_cons.MSG_UPDATE, 40)
+        peer.sent(bgp_cons.MSG_UPDATE, 60)
+        peer.received(bgp_cons.MSG_KEEPALIVE, 19)
+        self.assertEqual({bgp_cons.MSG_UPDATE: 2}, peer.messages_sent)
+        self.assertEqual({bgp_cons.MSG_UPDATE: 100}, peer.bytes_sent)
+        self.assertEqual(({bgp_cons.MSG_KEEPALIVE: 1}, {bgp_cons.MSG_KEEPALIVE: 19}),
+                         (peer.messages_received, peer.bytes_received))
+
+    def test_count_advertised(self):
+        peer = PeerMetrics('10.0.0.2')
+        peer.count_advertised({'attr': {str(MP_REACH): {'BGP_PREFIX_SID': [{'10.0.0.0/24': 1}, {'10.0.1.0/24': 2}]}}})
+        peer.count_advertised({'attr': {MP_UNREACH: {'withdraw': ['10.0.0.0/24']}}})
+        peer.count_advertised({})
+        self.assertEqual((2, 1), (peer.prefixes_advertised, peer.prefixes_withdrawn))
+
+    def test_state_changed(self):
+        peer = PeerMetrics('10.0.0.2')
+        for old_state, new_state in ((bgp_cons.ST_IDLE, bgp_cons.ST_OPENSENT),
+                                     (bgp_cons.ST_OPENSENT, bgp_cons.ST_OPENCONFIRM),
+                                     (bgp_cons.ST_OPENCONFIRM, bgp_cons.ST_ESTABLISHED),
+                                     (bgp_cons.ST_ESTABLISHED, bgp_cons.ST_IDLE),
+                                     (bgp_cons.ST_IDLE, bgp_cons.ST_OPENSENT)):
+            peer.state_changed(old_state, new_state)
+        self.assertEqual((1, 1, bgp_cons.ST_OPENSENT), (peer.established, peer.flaps, peer.state))
+        self.assertEqual(2, peer.transitions[(bgp_cons.ST_IDLE, bgp_cons.ST_OPENSENT)])
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+        # a value equal to a bound falls in that bucket (le)
+        for value in (0.05, 0.1, 0.5, 1.0, 7.0):
+            histogram.observe(value)
+        self.assertEqual([2, 2, 1], histogram.counts)
+        self.assertEqual(5, histogram.count)
+        self.assertAlmostEqual(8.65, histogram.sum)
+
+    def test_time(self):
+        histogram = Histogram()
+        with histogram.time():
+            pass
+        self.assertEqual(1, histogram.count)
+        self.assertGreaterEqual(histogram.sum, 0)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        peer = self.metrics.peer('10.0.0.2')
+        peer.sent(bgp_cons.MSG_UPDATE, 40)
+        peer.state_changed(bgp_cons.ST_OPENCONFIRM, bgp_cons.ST_ESTABLISHED)
+        peer.queue_depth = lambda: 123
+        self.metrics.encode_seconds = Histogram((0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            self.metrics.encode_seconds.observe(value)
+
+    def test_peer_is_kept(self):
+        self.assertIs(self.metrics.peer('10.0.0.2'), self.metrics.peer('10.0.0.2'))
+
+    def test_help_and_type_lines(self):
+        text = self.metrics.render()
+        self.assertTrue(text.endswith('\n'))
+        lines = text.splitlines()
+        for name, kind in (('bgp_messages_sent_total', 'counter'), ('bgp_fsm_transitions_total', 'counter'),
+                           ('bgp_session_up', 'gauge'), ('bgp_output_queue_bytes', 'gauge'),
+                           ('bgp_update_encode_seconds', 'histogram')):
+            position = lines.index('# TYPE %s %s' % (name, kind))
+            self.assertTrue(lines[position - 1].startswith('# HELP %s ' % name))
+            self.assertTrue(lines[position + 1].startswith(name))
+
+    def test_samples(self):
+        text = self.metrics.render()
+        self.assertEqual({'{peer="10.0.0.2",type="update"}': '1'}, samples(text, 'bgp_messages_sent_total'))
+        self.assertEqual({'{from="OPENCONFIRM",peer="10.0.0.2",to="ESTABLISHED"}': '1'},
+                         samples(text, 'bgp_fsm_transitions_total'))
+        self.assertEqual({'{peer="10.0.0.2"}': '1'}, samples(text, 'bgp_session_up'))
+        self.assertEqual({'{peer="10.0.0.2"}': '123'}, samples(text, 'bgp_output_queue_bytes'))
+
+    def test_histogram_is_cumulative(self):
+        text = self.metrics.render()
+        self.assertEqual({'{le="0.1"}': '1', '{le="1.0"}': '2', '{le="+Inf"}': '3'},
+                         samples(text, 'bgp_update_encode_seconds_bucket'))
+        self.assertEqual({'': '5.55'}, samples(text, 'bgp_update_encode_seconds_sum'))
+        self.assertEqual({'': '3'}, samples(text, 'bgp_update_encode_seconds_count'))
+
+    def test_label_escaping(self):
+        self.metrics.peer('a"b\\c\nd')
+        self.assertIn('bgp_session_up{peer="a\\"b\\\\c\\nd"} 0', self.metrics.render())
+
+    def test_http_response(self):
+        response = self.metrics.http_response(b'GET /metrics?x=1 HTTP/1.1\r\nHost: x\r\n\r\n')
+        header, body = response.split(b'\r\n\r\n', 1)
+        self.assertTrue(header.startswith(b'HTTP/1.0 200 OK\r\n'))
+        self.assertIn(('Content-Length: %s' % len(body)).encode(), header)
+        self.assertIn(b'bgp_session_up', body)
+        self.assertTrue(self.metrics.http_response(b'HEAD /metrics HTTP/1.1\r\n\r\n').endswith(b'\r\n\r\n'))
+
+    def test_http_errors(self):
+        for request, status in ((b'GET /other HTTP/1.1\r\n\r\n', b'404 Not Found'),
+                                (b'GET /metricsx HTTP/1.1\r\n\r\n', b'404 Not Found'),
+                                (b'POST /metrics HTTP/1.1\r\n\r\n', b'405 Method Not Allowed'),
+                                (b'\r\n\r\n', b'400 Bad Request')):
+            self.assertTrue(self.metrics.http_response(request).startswith(b'HTTP/1.0 ' + status), request)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from common import constants as bgp_cons
+from core import offload
+from core.config import PrefixSidTable
+from core.offload import CodecPool
+from message.update import Update
+
+MP_REACH = str(bgp_cons.BGPTYPE_MP_REACH_NLRI)
+
+
+def table_config(count):
+    routes = [('10.%s.%s.0/24' % (i >> 8, i & 0xff), i) for i in range(count)]
+    return {'attr': {'1': 0, '2': [], MP_REACH: {'next_hop': '10.0.0.1',
+                                                 'BGP_PREFIX_SID': PrefixSidTable.from_pairs(routes)}}}
+
+
+class TestCodecPool(unittest.TestCase):
+
+    def setUp(self):
+        # threshold 0 offloads every job
+        self.pool = CodecPool(max_workers=1, threshold=0)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_encode_shares_the_table(self):
+        msg_dict = table_config(2000)
+        submitted = []
+        submit = self.pool.executor.submit
+        self.pool.executor.submit = lambda *args: submitted.append(args) or submit(*args)
+        messages = self.pool.submit_encode(msg_dict).result(timeout=30)
+        self.assertEqual(list(Update.construct_chunks(msg_dict)), messages)
+        # the table went through shared memory, msg_dict itself is untouched
+        job_dict = submitted[0][1]
+        self.assertIsNone(job_dict['attr'][MP_REACH]['BGP_PREFIX_SID'])
+        self.assertIsInstance(msg_dict['attr'][MP_REACH]['BGP_PREFIX_SID'], PrefixSidTable)
+        self.assertEqual(1, self.pool.offloaded)
+
+    def test_decode(self):
+        messages = [msg[bgp_cons.HDR_LEN:] for msg in Update.construct_chunks(table_config(300))]
+        results = self.pool.submit_decode(messages).result(timeout=30)
+        self.assertEqual(len(messages), len(results))
+        self.assertEqual(messages, [result['hex'] for result in results])
+
+    def test_small_jobs_inline(self):
+        self.pool.threshold = offload.OFFLOAD_THRESHOLD
+        self.pool.submit_encode(table_config(10)).result()
+        self.assertEqual({'offloaded': 0, 'inline': 1, 'threshold': offload.OFFLOAD_THRESHOLD},
+                         self.pool.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
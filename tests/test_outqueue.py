@@ -0,0 +1,130 @@
+import errno
+import socket
+import unittest
+
+from core.outqueue import KeyedQueue
+from core.outqueue import OutQueue
+
+
+class FakeSocket(object):
+    """
+    Takes at most `room` bytes per sendmsg(), EAGAIN when room is 0
+    """
+
+    def __init__(self, room=None):
+        self.room = room
+        self.data = b''
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        data = b''.join(bytes(buf) for buf in buffers)
+        if self.room is not None:
+            if self.room == 0:
+                raise socket.error(errno.EAGAIN, 'would block')
+            data = data[:self.room]
+        self.data += data
+        return len(data)
+
+
+class TestOutQueue(unittest.TestCase):
+
+    def test_coalesced_write(self):
+        sock = FakeSocket()
+        queue = OutQueue(sock)
+        for msg in (b'aaa', b'bb', b'c'):
+            queue.enqueue(msg)
+        self.assertEqual(6, queue.flush())
+        self.assertEqual(b'aaabbc', sock.data)
+        self.assertEqual(1, sock.calls)
+        self.assertEqual(0, len(queue))
+        self.assertEqual(3, queue.sent_messages)
+
+    def test_partial_write_resumes(self):
+        sock = FakeSocket(room=4)
+        queue = OutQueue(sock)
+        queue.enqueue(b'aaa')
+        queue.enqueue(b'bbb')
+        queue.enqueue(b'ccc')
+        queue.drain()
+        self.assertEqual(b'aaabbbccc', sock.data)
+        self.assertEqual(0, queue.pending_bytes)
+
+    def test_keepalive_ahead_of_updates(self):
+        sock = FakeSocket(room=2)
+        queue = OutQueue(sock)
+        queue.enqueue(b'uuu')
+        queue.enqueue(b'vvv')
+        queue.flush()
+        queue.enqueue_keepalive(b'KK')
+        queue.drain()
+        # the partially written UPDATE is finished first
+        self.assertEqual(b'uuuKKvvv', sock.data)
+
+    def test_every_update_is_sent(self):
+        sock = FakeSocket()
+        queue = OutQueue(sock)
+        queue.enqueue(b'same')
+        queue.enqueue(b'same')
+        queue.drain()
+        self.assertEqual(b'samesame', sock.data)
+
+    def test_latest_state_wins(self):
+        sock = FakeSocket()
+        queue = OutQueue(sock)
+        queue.enqueue(b'p-old', key='p')
+        queue.enqueue(b'multi')
+        queue.enqueue(b'q', key='q')
+        queue.enqueue(b'p-new', key='p')
+        self.assertEqual(3, len(queue))
+        self.assertEqual(11, queue.pending_bytes)
+        queue.drain()
+        # the newer UPDATE goes behind the messages queued before it
+        self.assertEqual(b'multiqp-new', sock.data)
+        self.assertEqual(1, queue.stats()['replaced'])
+
+    def test_partially_written_message_is_not_replaced(self):
+        sock = FakeSocket(room=2)
+        queue = OutQueue(sock)
+        queue.enqueue(b'p-old', key='p')
+        queue.flush()
+        queue.enqueue(b'p-new', key='p')
+        queue.drain()
+        self.assertEqual(b'p-oldp-new', sock.data)
+
+    def test_watermarks(self):
+        resumed = []
+        sock = FakeSocket(room=0)
+        queue = OutQueue(sock, high_watermark=10, low_watermark=4, on_resume=lambda: resumed.append(True))
+        for _ in range(3):
+            queue.enqueue(b'xxxx')
+        self.assertTrue(queue.paused)
+        self.assertEqual(0, queue.flush())
+        self.assertTrue(queue.paused)
+        sock.room = 6
+        queue.flush()
+        self.assertTrue(queue.paused)
+        self.assertEqual([], resumed)
+        queue.flush()
+        self.assertFalse(queue.paused)
+        self.assertEqual([True], resumed)
+        self.assertEqual(b'x' * 12, sock.data)
+
+
+class TestKeyedQueue(unittest.TestCase):
+
+    def test_replace(self):
+        queue = KeyedQueue()
+        self.assertEqual(3, queue.append(b'aaa', key=1))
+        self.assertEqual(2, queue.append(b'bb'))
+        self.assertEqual(-2, queue.append(b'a', key=1))
+        self.assertEqual(3, queue.nbytes)
+        self.assertEqual([b'bb', b'a'], list(queue))
+        self.assertEqual((None, b'bb'), queue.popleft())
+        self.assertEqual((1, b'a'), queue.popleft())
+        self.assertEqual(0, queue.nbytes)
+        self.assertEqual(1, queue.replaced)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from core.profiling import Profiler
+
+
+class TestProfilerCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = Profiler(hooks=())
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_start_stop(self):
+        self.assertEqual('started', self.profiler.command('start\n'))
+        self.assertEqual('already running', self.profiler.command('start'))
+        self.assertEqual('stopped', self.profiler.command('toggle'))
+        self.assertEqual('not running', self.profiler.command('stop'))
+
+    def test_sample_path_is_not_accepted(self):
+        for line in ('start /etc/cron.d/x', 'toggle /tmp/samples'):
+            self.assertEqual('%s takes no argument' % line.split()[0], self.profiler.command(line))
+        self.assertFalse(self.profiler.enabled)
+        self.assertIsNone(self.profiler.sample_path)
+
+    def test_unknown(self):
+        self.assertEqual('empty command', self.profiler.command(''))
+        self.assertEqual("unknown command 'x'", self.profiler.command('x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
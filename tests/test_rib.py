@@ -0,0 +1,188 @@
+import unittest
+
+from common import constants as bgp_cons
+from core.rib import AdjRIB
+from core.rib import LocRIB
+from core.rib import as_path_length
+from message.attribute.nlri.prefix import IPv4Prefix
+
+PREFIX = IPv4Prefix.from_string('10.0.0.0/24')
+
+
+def attributes(local_pref=100, as_path=((bgp_cons.AS_SEQUENCE, [65001]),), origin=0, med=0):
+    return {bgp_cons.BGPTYPE_LOCAL_PREF: local_pref, bgp_cons.BGPTYPE_AS_PATH: list(as_path),
+            bgp_cons.BGPTYPE_ORIGIN: origin, bgp_cons.BGPTYPE_MULTI_EXIT_DISC: med}
+
+
+def prefix(value):
+    return IPv4Prefix.from_string(value)
+
+
+class TestAdjRIB(unittest.TestCase):
+
+    def setUp(self):
+        self.rib = AdjRIB()
+
+    def nodes(self):
+        # nodes still linked in the trie, the root included
+        return len(self.rib.network) - len(self.rib.free)
+
+    def test_insert_and_replace(self):
+        self.rib.insert(PREFIX, attributes(), 16001)
+        self.rib.insert((PREFIX[0] | 0xff, 24), attributes(local_pref=200))
+        self.assertEqual(1, len(self.rib))
+        entry = self.rib.get(PREFIX)
+        self.assertEqual(PREFIX, entry.prefix)
+        self.assertEqual(200, entry.attributes[bgp_cons.BGPTYPE_LOCAL_PREF])
+        self.assertIsNone(entry.label)
+        # the replaced attribute set is released
+        self.assertEqual(1, len(self.rib.attr_sets))
+        self.assertNotIn(prefix('10.0.0.0/25'), self.rib)
+
+    def test_shared_attribute_sets(self):
+        attr = attributes()
+        for value in ('10.0.0.0/24', '10.0.1.0/24', '10.0.2.0/24'):
+            self.rib.insert(prefix(value), attr)
+        self.assertEqual(1, len(self.rib.attr_sets))
+        self.assertIs(self.rib.get(prefix('10.0.0.0/24')).attributes,
+                      self.rib.get(prefix('10.0.2.0/24')).attributes)
+
+    def test_withdraw_collapses_nodes(self):
+        # 10.0.0.0/24 and 10.0.1.0/24 diverge below a glue 10.0.0.0/23
+        self.rib.insert(prefix('10.0.0.0/24'), attributes(), 1)
+        self.rib.insert(prefix('10.0.1.0/24'), attributes())
+        self.assertEqual(4, self.nodes())
+        self.assertIsNone(self.rib.withdraw(prefix('10.0.0.0/23')))
+        entry = self.rib.withdraw(prefix('10.0.0.0/24'))
+        self.assertEqual((prefix('10.0.0.0/24'), 1), (entry.prefix, entry.label))
+        self.assertIsNone(self.rib.withdraw(prefix('10.0.0.0/24')))
+        # the leaf and the glue node above it are gone
+        self.assertEqual(2, self.nodes())
+        self.assertEqual([prefix('10.0.1.0/24')], [e.prefix for e in self.rib])
+        self.rib.withdraw(prefix('10.0.1.0/24'))
+        self.assertEqual((0, 1, 0), (len(self.rib), self.nodes(), len(self.rib.attr_sets)))
+        # freed nodes are reused, the arrays do not grow
+        self.rib.insert(prefix('10.0.0.0/24'), attributes())
+        self.assertEqual((2, 4), (self.nodes(), len(self.rib.network)))
+
+    def test_withdraw_keeps_nodes_with_two_children(self):
+        for value in ('10.0.0.0/16', '10.0.0.0/24', '10.0.128.0/24'):
+            self.rib.insert(prefix(value), attributes())
+        self.rib.withdraw(prefix('10.0.0.0/16'))
+        self.assertEqual([prefix('10.0.0.0/24'), prefix('10.0.128.0/24')], [e.prefix for e in self.rib])
+        self.assertEqual(4, self.nodes())
+
+    def test_longest_match(self):
+        for value, label in (('10.0.0.0/8', 8), ('10.1.0.0/16', 16), ('10.1.1.0/24', 24)):
+            self.rib.insert(prefix(value), attributes(), label)
+        for address, label in (('10.1.1.1', 24), ('10.1.2.1', 16), ('10.2.0.1', 8)):
+            self.assertEqual(label, self.rib.longest_match(prefix(address + '/32')[0]).label)
+        self.assertIsNone(self.rib.longest_match(prefix('11.0.0.1/32')[0]))
+        self.assertEqual(16, self.rib.longest_match(prefix('10.1.1.0/24')[0], 23).label)
+
+    def test_default_route_and_host_routes(self):
+        self.rib.insert(prefix('0.0.0.0/0'), attributes(), 0)
+        for value in ('10.0.0.1/32', '10.0.0.0/32', '255.255.255.255/32'):
+            self.rib.insert(prefix(value), attributes(), 32)
+        self.assertEqual(4, len(self.rib))
+        self.assertEqual(0, self.rib.get(prefix('0.0.0.0/0')).label)
+        self.assertEqual(32, self.rib.longest_match(prefix('255.255.255.255/32')[0]).label)
+        self.assertEqual(32, self.rib.longest_match(prefix('10.0.0.1/32')[0]).label)
+        self.assertEqual(0, self.rib.longest_match(prefix('10.0.0.2/32')[0]).label)
+        # the root node stays when the default route is withdrawn
+        self.assertEqual(prefix('0.0.0.0/0'), self.rib.withdraw(prefix('0.0.0.0/0')).prefix)
+        self.assertIsNone(self.rib.longest_match(prefix('10.0.0.2/32')[0]))
+        self.assertEqual(3, len(self.rib))
+        self.assertEqual(prefix('255.255.255.255/32'), self.rib.withdraw(prefix('255.255.255.255/32')).prefix)
+
+    def test_subtree(self):
+        routes = [prefix(value) for value in (
+            '0.0.0.0/0', '10.0.0.0/8', '10.0.0.0/24', '10.0.0.1/32', '10.0.1.0/24', '10.128.0.0/9', '11.0.0.0/8')]
+        for route in reversed(routes):
+            self.rib.insert(route, attributes())
+        self.assertEqual(routes, [entry.prefix for entry in self.rib])
+        self.assertEqual(routes[1:6], [entry.prefix for entry in self.rib.subtree(prefix('10.0.0.0/8'))])
+        self.assertEqual(routes[2:5], [entry.prefix for entry in self.rib.subtree(prefix('10.0.0.0/23'))])
+        self.assertEqual([routes[3]], [entry.prefix for entry in self.rib.subtree(prefix('10.0.0.1/32'))])
+        self.assertEqual([], list(self.rib.subtree(prefix('10.0.0.2/32'))))
+        self.assertEqual([], list(self.rib.subtree(prefix('12.0.0.0/8'))))
+
+    def test_clear(self):
+        self.rib.insert(PREFIX, attributes())
+        self.rib.clear()
+        self.assertEqual((0, 0, 1), (len(self.rib), len(self.rib.attr_sets), self.nodes()))
+        self.assertIsNone(self.rib.get(PREFIX))
+
+
+class TestLocRIB(unittest.TestCase):
+
+    def setUp(self):
+        self.loc_rib = LocRIB()
+        self.adj_ribs = {}
+        for peer_id, router_id in (('a', '10.255.0.2'), ('b', '10.255.0.1')):
+            self.adj_ribs[peer_id] = AdjRIB()
+            self.loc_rib.add_peer(peer_id, self.adj_ribs[peer_id], router_id)
+
+    def announce(self, peer_id, attr, prefix=PREFIX):
+        self.adj_ribs[peer_id].insert(prefix, attr)
+        return self.loc_rib.update(prefix)
+
+    def best_peer(self, prefix=PREFIX):
+        return self.loc_rib.best[prefix][0]
+
+    def test_decision_steps(self):
+        # each pair: the attributes of a, then of b which must win over them
+        steps = (
+            (attributes(local_pref=100, as_path=()),
+             attributes(local_pref=200, as_path=[(bgp_cons.AS_SEQUENCE, [1, 2, 3])])),
+            (attributes(as_path=[(bgp_cons.AS_SEQUENCE, [1, 2])], origin=0), attributes(origin=2)),
+            (attributes(origin=1, med=0), attributes(origin=0, med=50)),
+            (attributes(med=10), attributes(med=5)),
+        )
+        for worse, better in steps:
+            self.announce('a', worse)
+            self.announce('b', better)
+            self.assertEqual('b', self.best_peer())
+            self.announce('a', better)
+            self.announce('b', worse)
+            self.assertEqual('a', self.best_peer())
+
+    def test_lowest_router_id_breaks_ties(self):
+        self.announce('a', attributes())
+        self.announce('b', attributes())
+        self.assertEqual('b', self.best_peer())
+
+    def test_dirty_queue(self):
+        attr = attributes()
+        self.assertTrue(self.announce('a', attr))
+        # the same route again and a worse path do not change the best path
+        self.assertFalse(self.announce('a', attr))
+        self.assertFalse(self.announce('b', attributes(local_pref=50)))
+        self.assertEqual([(PREFIX, ('a', self.adj_ribs['a'].get(PREFIX)))], list(self.loc_rib.pop_dirty()))
+        self.assertEqual([], list(self.loc_rib.pop_dirty()))
+
+    def test_withdraw_falls_back(self):
+        self.announce('a', attributes(local_pref=200))
+        self.announce('b', attributes())
+        self.adj_ribs['a'].withdraw(PREFIX)
+        self.assertTrue(self.loc_rib.update(PREFIX))
+        self.assertEqual('b', self.best_peer())
+        self.adj_ribs['b'].withdraw(PREFIX)
+        self.loc_rib.update(PREFIX)
+        self.assertEqual(0, len(self.loc_rib))
+        self.assertEqual([PREFIX], [prefix for prefix, best in self.loc_rib.pop_dirty() if best is None])
+
+    def test_remove_peer(self):
+        self.announce('a', attributes(local_pref=200))
+        self.announce('b', attributes())
+        self.loc_rib.remove_peer('a')
+        self.assertEqual('b', self.best_peer())
+
+    def test_as_path_length(self):
+        as_path = [(bgp_cons.AS_SEQUENCE, [1, 2]), (bgp_cons.AS_SET, [3, 4, 5])]
+        self.assertEqual(3, as_path_length(as_path))
+        self.assertEqual(0, as_path_length(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
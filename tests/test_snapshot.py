@@ -0,0 +1,92 @@
+import json
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import unittest
+
+from common import constants as bgp_cons
+from core import snapshot
+from core.config import load_config
+from core.config import prefix_sids
+from core.snapshot import SidSnapshot
+from core.snapshot import convert
+from core.snapshot import write_snapshot
+from message.update import Update
+
+MP_REACH = str(bgp_cons.BGPTYPE_MP_REACH_NLRI)
+ROUTES = [('10.0.1.0/24', 2), ('10.0.0.0/24', 1), ('192.168.0.0/16', 3)]
+
+
+def config(routes):
+    return {'attr': {'1': 0, '2': [], str(bgp_cons.BGP_PREFIX_SID): {'srgb': [[16000, 100]]},
+                     MP_REACH: {'next_hop': '10.0.0.1', 'BGP_PREFIX_SID': [{p: i} for p, i in routes]}}}
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.dir, 'config.json')
+        self.path = os.path.join(self.dir, 'config.snap')
+        with open(self.json_path, 'w') as data_file:
+            json.dump(config(ROUTES), data_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_layout(self):
+        self.assertEqual(3, convert(self.json_path, self.path))
+        with open(self.path, 'rb') as data_file:
+            data = data_file.read()
+        magic, version, record_size, count, attr_len, _ = struct.unpack_from('!4sHHIII', data)
+        self.assertEqual((b'PSID', 1, 9, 3), (magic, version, record_size, count))
+        attr = json.loads(data[20:20 + attr_len].decode())
+        self.assertNotIn('BGP_PREFIX_SID', attr[MP_REACH])
+        index = struct.unpack_from('!257I', data, 20 + attr_len)
+        # 10.x routes start at record 0, 192.x at record 2
+        self.assertEqual((0, 0, 2, 2, 3), (index[0], index[10], index[11], index[192], index[193]))
+        records = data[20 + attr_len + 257 * 4:]
+        self.assertEqual([(0x0a000000, 24, 1), (0x0a000100, 24, 2), (0xc0a80000, 16, 3)],
+                         list(struct.iter_unpack('!IBI', records)))
+
+    def test_load(self):
+        convert(self.json_path, self.path)
+        self.assertTrue(snapshot.is_snapshot(self.path))
+        self.assertFalse(snapshot.is_snapshot(self.json_path))
+        msg_dict = load_config(self.path)
+        table = msg_dict['attr'][MP_REACH]['BGP_PREFIX_SID']
+        self.assertIsInstance(table, SidSnapshot)
+        self.assertEqual(dict(ROUTES), prefix_sids(msg_dict))
+        self.assertEqual(3, table.allocator.used)
+        self.assertEqual(2, table.lookup(0x0a000100, 24))
+        self.assertEqual(list(Update.construct_chunks(load_config(self.json_path))),
+                         list(Update.construct_chunks(msg_dict)))
+
+    def test_pickled_by_path(self):
+        convert(self.json_path, self.path)
+        table = SidSnapshot(self.path)
+        self.assertLess(len(pickle.dumps(table)), 200)
+        self.assertEqual(list(table.pairs()), list(pickle.loads(pickle.dumps(table)).pairs()))
+
+    def test_replaced_file(self):
+        convert(self.json_path, self.path)
+        table = SidSnapshot(self.path)
+        write_snapshot(self.path, config([]), [('10.9.0.0/24', 9)])
+        self.assertEqual(dict(ROUTES), dict(table.pairs()))
+        self.assertEqual({'10.9.0.0/24': 9}, dict(SidSnapshot(self.path).pairs()))
+
+    def test_invalid(self):
+        convert(self.json_path, self.path)
+        with open(self.path, 'rb') as data_file:
+            data = data_file.read()
+        for bad in (data[:-1], data[:4] + struct.pack('!H', 2) + data[6:]):
+            with open(self.path, 'wb') as data_file:
+                data_file.write(bad)
+            with self.assertRaises(ValueError):
+                SidSnapshot(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from core.timerwheel import TimerWheel
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.wheel = TimerWheel(resolution=0.5, clock=self.clock)
+        self.fired = []
+
+    def timer(self, name):
+        return self.wheel.timer(lambda: self.fired.append(name))
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+        return self.wheel.tick()
+
+    def test_fires_once_when_due(self):
+        timer = self.timer('a')
+        timer.reset(2)
+        self.assertTrue(timer.active())
+        self.assertEqual(0, self.advance(1.5))
+        self.assertEqual(1, self.advance(0.5))
+        self.assertEqual(['a'], self.fired)
+        self.assertFalse(timer.active())
+        self.assertEqual(0, self.advance(10))
+        self.assertEqual(0, self.wheel.count)
+
+    def test_partial_tick_rounds_up(self):
+        timer = self.timer('a')
+        timer.reset(0.1)
+        self.assertEqual(0, self.wheel.tick())
+        self.advance(0.5)
+        self.assertEqual(['a'], self.fired)
+
+    def test_reset_and_cancel(self):
+        a = self.timer('a')
+        b = self.timer('b')
+        a.reset(1)
+        b.reset(1)
+        a.reset(5)
+        b.cancel()
+        self.assertEqual(1, self.wheel.count)
+        self.advance(1)
+        self.assertEqual([], self.fired)
+        self.advance(4)
+        self.assertEqual(['a'], self.fired)
+
+    def test_timers_due_together(self):
+        timers = [self.timer(i) for i in range(1000)]
+        for timer in timers:
+            timer.reset(30)
+        self.assertEqual(1000, self.advance(30))
+        self.assertEqual(1000, self.wheel.fired)
+
+    def test_cascade_from_upper_levels(self):
+        # 0.5 s ticks: 200 s is past the first level, 2 days past the second and third
+        for seconds in (200, 3600, 2 * 86400):
+            timer = self.timer(seconds)
+            timer.reset(seconds)
+            self.advance(seconds - 0.5)
+            self.assertEqual([], self.fired)
+            self.advance(0.5)
+            self.assertEqual([seconds], self.fired)
+            self.fired = []
+
+    def test_cancelled_by_a_timer_due_in_the_same_tick(self):
+        # whichever fires first cancels the other, e.g. a hold timer expiry
+        # cancelling the same peer's keepalive
+        a = self.wheel.timer(lambda: (self.fired.append('a'), b.cancel()))
+        b = self.wheel.timer(lambda: (self.fired.append('b'), a.cancel()))
+        a.reset(1)
+        b.reset(1)
+        self.assertEqual(1, self.advance(1))
+        self.assertEqual(1, len(self.fired))
+        self.assertFalse(a.active() or b.active())
+        self.assertEqual(0, self.wheel.count)
+
+    def test_rearmed_by_a_timer_due_in_the_same_tick(self):
+        a = self.wheel.timer(lambda: (self.fired.append('a'), b.reset(2)))
+        b = self.wheel.timer(lambda: (self.fired.append('b'), a.reset(2)))
+        a.reset(1)
+        b.reset(1)
+        self.assertEqual(1, self.advance(1))
+        self.assertEqual(1, self.wheel.count)
+        self.advance(2)
+        self.assertEqual(['a', 'b'], sorted(self.fired))
+
+    def test_failing_callback(self):
+        self.wheel.timer(lambda: 1 / 0).reset(1)
+        self.timer('b').reset(1)
+        with self.assertLogs('core.timerwheel', 'ERROR'):
+            self.assertEqual(2, self.advance(1))
+        self.assertEqual(['b'], self.fired)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+from common import constants as bgp_cons
+from common import exception as excep
+from core import config
+from core.config import PrefixSidTable
+from core.framer import BGPFramer
+from message.attribute.bgpprefixsid import SRGB
+from message.attribute.nlri.prefix import IPv4Prefix
+from message.update import Update
+
+MSG_DICT = {
+    'attr': {1: 0, 2: [(2, [65001])], 5: 100,
+             14: {'afi_safi': (1, 4), 'next_hop': '10.0.0.1',
+                  'BGP_PREFIX_SID': [{'10.1.0.0/16': 100}, {'10.2.0.0/24': 200}]}},
+}
+
+
+class TestUpdateParse(unittest.TestCase):
+
+    def test_lazy_attributes_outlive_the_receive_buffer(self):
+        msg = next(Update.construct_chunks(MSG_DICT))
+        framer = BGPFramer()
+        framer.feed(msg)
+        [(_, body)] = list(framer.frames())
+        result = Update.parse(0, body, lazy_attr=True)
+        # the next message reuses the same buffer space
+        framer.feed(b'\xff' * 16 + b'\x00' * len(msg))
+        self.assertEqual(msg[19:], result['hex'])
+        self.assertEqual(100, result['attr'][5])
+        self.assertEqual([(2, [65001])], result['attr'][2])
+
+    def test_construct_chunks_roundtrip(self):
+        messages = list(Update.construct_chunks(MSG_DICT))
+        self.assertEqual(1, len(messages))
+        attr = Update.parse(0, messages[0][19:])['attr']
+        routes = attr[14]['nlri']
+        self.assertEqual(['10.1.0.0/16', '10.2.0.0/24'], [str(route.ipv4_prefix()) for route in routes])
+        self.assertEqual([100, 200], [route.labels[0] for route in routes])
+
+    def test_route_key(self):
+        attr = dict(MSG_DICT['attr'])
+        attr[14] = dict(attr[14], BGP_PREFIX_SID=[{'10.1.0.0/16': 7}])
+        [announce] = Update.construct_chunks({'attr': attr})
+        [withdraw] = Update.construct_chunks({'attr': {15: {'afi_safi': (1, 4), 'withdraw': ['10.1.0.0/16']}}})
+        self.assertEqual((1, 4, 16, b'\x0a\x01'), Update.route_key(announce))
+        # a withdrawal replaces the announcement of the same route
+        self.assertEqual(Update.route_key(announce), Update.route_key(withdraw))
+        [two] = Update.construct_chunks(MSG_DICT)
+        self.assertIsNone(Update.route_key(two))
+        self.assertIsNone(Update.route_key(announce[:-2]))
+
+
+class TestParsePrefixList(unittest.TestCase):
+
+    def test_default_and_host_routes(self):
+        self.assertEqual([IPv4Prefix(0, 0), IPv4Prefix.from_string('10.0.0.1/32')],
+                         Update.parse_prefix_list(b'\x00' + b'\x20\x0a\x00\x00\x01'))
+        self.assertEqual(['0.0.0.0/0', '255.255.255.255/32'],
+                         [str(prefix) for prefix in Update.parse_prefix_list(b'\x00\x20\xff\xff\xff\xff')])
+        self.assertEqual([], Update.parse_prefix_list(b''))
+
+    def test_non_octet_aligned(self):
+        prefixes = Update.parse_prefix_list(b'\x09\x0a\x80' + b'\x17\xc0\xa8\x03' + b'\x01\x80')
+        self.assertEqual(['10.128.0.0/9', '192.168.2.0/23', '128.0.0.0/1'], [str(prefix) for prefix in prefixes])
+        # bits past the prefix length are ignored
+        self.assertEqual(['10.0.0.0/9'], [str(prefix) for prefix in Update.parse_prefix_list(b'\x09\x0a\x7f')])
+
+    def test_addpath(self):
+        data = b'\x00\x00\x00\x01\x18\x0a\x00\x01' + b'\x00\x00\x00\x02\x00'
+        self.assertEqual([{'prefix': IPv4Prefix.from_string('10.0.1.0/24'), 'path_id': 1},
+                          {'prefix': IPv4Prefix(0, 0), 'path_id': 2}], Update.parse_prefix_list(data, addpath=True))
+
+    def test_truncated(self):
+        for data, addpath in ((b'\x18\x0a\x00', False), (b'\x20', False), (b'\x08\x0a\x01', False),
+                              (b'\x21\x0a\x00\x00\x00\x00', False), (b'\x00\x00\x00', True),
+                              (b'\x00\x00\x00\x01', True), (b'\x00\x00\x00\x01\x08', True)):
+            with self.assertRaises(excep.UpdateMessageError) as context:
+                Update.parse_prefix_list(data, addpath)
+            self.assertEqual(bgp_cons.ERR_MSG_UPDATE_INVALID_NETWORK_FIELD, context.exception.sub_error)
+
+
+ROUTES = [('10.0.%s.0/24' % i, i % 3) for i in range(10)] + [('10.1.0.0/16', 1)]
+
+
+def prefix_sid_config(routes, prefix_sid):
+    return {'attr': {1: 0, 2: [], bgp_cons.BGP_PREFIX_SID: prefix_sid,
+                     14: {'afi_safi': (1, 4), 'next_hop': '10.0.0.1', 'BGP_PREFIX_SID': routes}}}
+
+
+class TestPrefixSidGroups(unittest.TestCase):
+
+    def advertised(self, msg_dict):
+        """
+        :return: {prefix: (label index of the UPDATE's TLV, label)}, number of UPDATEs
+        """
+        routes = {}
+        messages = list(Update.construct_chunks(msg_dict))
+        for msg in messages:
+            self.assertLessEqual(len(msg), bgp_cons.BGP_MAX_PACKET_SIZE)
+            attr = Update.parse(0, msg[19:])['attr']
+            for route in attr[14]['nlri']:
+                routes[str(route.ipv4_prefix())] = (attr[bgp_cons.BGP_PREFIX_SID]['label_index'], route.labels[0])
+        return routes, len(messages)
+
+    def check(self, routes):
+        srgb = SRGB([(16000, 100)])
+        advertised, count = self.advertised(prefix_sid_config(routes, {'label_index': 10, 'srgb': [[16000, 100]]}))
+        self.assertEqual(dict((prefix, (index, srgb.label(index))) for prefix, index in ROUTES), advertised)
+        # one UPDATE per label index
+        self.assertEqual(3, count)
+        # a plain label index attribute is replaced as well
+        advertised, _ = self.advertised(prefix_sid_config(routes, 10))
+        self.assertEqual(dict((prefix, (index, index)) for prefix, index in ROUTES), advertised)
+
+    def test_list(self):
+        self.check([{prefix: index} for prefix, index in ROUTES])
+
+    def test_table(self):
+        self.check(PrefixSidTable.from_pairs(ROUTES))
+
+    def test_table_without_numpy(self):
+        numpy = config.numpy
+        config.numpy = None
+        try:
+            self.check(PrefixSidTable.from_pairs(ROUTES))
+        finally:
+            config.numpy = numpy
+
+    def test_large_group_is_chunked(self):
+        routes = [('10.%s.%s.0/24' % (i >> 8, i & 0xff), 7) for i in range(2000)]
+        msg_dict = prefix_sid_config(PrefixSidTable.from_pairs(routes), {'label_index': 0, 'srgb': [[16000, 100]]})
+        advertised, count = self.advertised(msg_dict)
+        self.assertGreater(count, 1)
+        self.assertEqual(set([(7, 16007)]), set(advertised.values()))
+        self.assertEqual(2000, len(advertised))
+
+
+if __name__ == '__main__':
+    unittest.main()
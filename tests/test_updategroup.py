@@ -0,0 +1,102 @@
+import unittest
+
+from common import constants as bgp_cons
+from core.config import PrefixSidTable
+from core.updategroup import UpdateGroupManager
+from core.updategroup import negotiated_capabilities
+from message.attribute.nlri.prefix import IPv4Prefix
+
+MP_REACH = str(bgp_cons.BGPTYPE_MP_REACH_NLRI)
+SRGB_ATTR = {'srgb': [[16000, 1000]]}
+SRGB = {str(bgp_cons.BGP_PREFIX_SID): SRGB_ATTR}
+
+
+def table_config(routes, **attr):
+    msg_attr = {'1': 0, MP_REACH: {'next_hop': '10.0.0.1',
+                                   'BGP_PREFIX_SID': PrefixSidTable.from_pairs(routes)}}
+    msg_attr.update(attr)
+    return {'attr': msg_attr}
+
+
+def label(rib, prefix):
+    entry = rib.get(IPv4Prefix.from_string(prefix))
+    return None if entry is None else entry.label
+
+
+class TestUpdateGroup(unittest.TestCase):
+
+    def setUp(self):
+        self.groups = UpdateGroupManager()
+        self.sent = {'a': [], 'b': []}
+
+    def join(self, peer_id, capabilities=None):
+        return self.groups.join(peer_id, self.sent[peer_id].append, capabilities or {'afi_safi': [(1, 4)]})
+
+    def test_members_share_encode_and_adj_rib_out(self):
+        msg_dict = table_config([('10.0.0.0/24', 1), ('10.0.1.0/24', 2)], **SRGB)
+        group = self.join('a')
+        self.assertIs(group, self.join('b'))
+        group.send_table('a', msg_dict)
+        group.send_table('b', msg_dict)
+        self.assertEqual(self.sent['a'], self.sent['b'])
+        self.assertEqual(len(self.sent['a']), group.encode_count)
+        self.assertEqual(2, len(group.adj_rib_out))
+        # label indexes are advertised as SRGB labels
+        self.assertEqual(16001, label(group.adj_rib_out, '10.0.0.0/24'))
+        self.assertEqual(16002, label(group.adj_rib_out, '10.0.1.0/24'))
+
+    def test_labels_without_srgb(self):
+        group = self.join('a')
+        group.send_table('a', table_config([('10.0.0.0/24', 1)]))
+        self.assertEqual(1, label(group.adj_rib_out, '10.0.0.0/24'))
+
+    def test_advertise_change(self):
+        group = self.join('a')
+        group.send_table('a', table_config([('10.0.0.0/24', 1), ('10.0.1.0/24', 2)], **SRGB))
+        attr = {1: 0, bgp_cons.BGP_PREFIX_SID: SRGB_ATTR,
+                bgp_cons.BGPTYPE_MP_REACH_NLRI: {'next_hop': '10.0.0.1', 'BGP_PREFIX_SID': [{'10.0.2.0/24': 5}]}}
+        self.groups.advertise({'attr': {bgp_cons.BGPTYPE_MP_UNREACH_NLRI: {'withdraw': ['10.0.0.0/24']}}})
+        self.groups.advertise({'attr': attr})
+        self.assertIsNone(label(group.adj_rib_out, '10.0.0.0/24'))
+        self.assertEqual(16005, label(group.adj_rib_out, '10.0.2.0/24'))
+        self.assertEqual(2, len(group.adj_rib_out))
+
+    def test_new_table_replaces_adj_rib_out(self):
+        group = self.join('a')
+        group.send_table('a', table_config([('10.0.0.0/24', 1)]))
+        group.seed(table_config([('10.0.1.0/24', 2)]), [])
+        self.assertEqual([IPv4Prefix.from_string('10.0.1.0/24')], [entry.prefix for entry in group.adj_rib_out])
+
+    def test_groups_by_capabilities(self):
+        group = self.join('a', {'afi_safi': [(1, 4)], 'four_bytes_as': True})
+        self.assertIsNot(group, self.join('b'))
+        self.groups.leave('a')
+        self.assertEqual(1, len(self.groups.groups))
+
+
+class TestNegotiatedCapabilities(unittest.TestCase):
+
+    LOCAL = {'four_bytes_as': False, 'afi_safi': [(1, 4)], 'route_refresh': False}
+
+    def test_intersection(self):
+        peer = {'four_bytes_as': True, 'afi_safi': [(1, 1), (1, 4)], 'add_path': 'bgplu_both'}
+        self.assertEqual({'four_bytes_as': False, 'add_path': False, 'afi_safi': [(1, 4)]},
+                         negotiated_capabilities(self.LOCAL, peer))
+        local = dict(self.LOCAL, four_bytes_as=True, add_path='bgplu_send')
+        self.assertEqual({'four_bytes_as': True, 'add_path': True, 'afi_safi': [(1, 4)]},
+                         negotiated_capabilities(local, peer))
+
+    def test_add_path_direction(self):
+        local = dict(self.LOCAL, add_path='bgplu_send')
+        for peer_add_path, add_path in (('bgplu_receive', True), ('bgplu_send', False), ('ipv4_both', False)):
+            self.assertEqual(add_path, negotiated_capabilities(local, {'add_path': peer_add_path})['add_path'])
+
+    def test_peers_grouped_by_negotiated_capabilities(self):
+        groups = UpdateGroupManager()
+        plain = negotiated_capabilities(self.LOCAL, {'afi_safi': [(1, 4)]})
+        extra = negotiated_capabilities(self.LOCAL, {'afi_safi': [(1, 4), (1, 1)], 'four_bytes_as': True})
+        self.assertIs(groups.join('a', None, plain), groups.join('b', None, extra))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import signal
+import threading
+import time
+import unittest
+
+from core import workers
+from core.workers import Supervisor
+
+
+def exit_now(worker_id):
+    pass
+
+
+class CountingSupervisor(Supervisor):
+
+    def __init__(self, target, workers=None):
+        super(CountingSupervisor, self).__init__(target, workers)
+        self.starts = {}
+
+    def start_worker(self, worker_id):
+        self.starts[worker_id] = self.starts.get(worker_id, 0) + 1
+        super(CountingSupervisor, self).start_worker(worker_id)
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.handlers = dict((signum, signal.getsignal(signum))
+                             for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP))
+        self.max_backoff = workers.MAX_BACKOFF
+
+    def tearDown(self):
+        workers.MAX_BACKOFF = self.max_backoff
+        for signum, handler in self.handlers.items():
+            signal.signal(signum, handler)
+
+    def run_supervisor(self, supervisor, seconds):
+        """
+        Run the supervisor until a SIGTERM sent after seconds
+        :return: seconds run() took to return after the SIGTERM
+        """
+        stopped = []
+
+        def terminate():
+            stopped.append(time.monotonic())
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        timer = threading.Timer(seconds, terminate)
+        timer.start()
+        try:
+            supervisor.run()
+        finally:
+            timer.cancel()
+        return time.monotonic() - stopped[0]
+
+    def test_crashing_workers_restart_after_backoff(self):
+        workers.MAX_BACKOFF = 0.1
+        supervisor = CountingSupervisor(exit_now, 2)
+        self.run_supervisor(supervisor, 1)
+        for worker_id in (0, 1):
+            self.assertGreater(supervisor.starts[worker_id], 2)
+            # the last exit may still be waiting for its restart
+            self.assertIn(supervisor.restarts[worker_id], (supervisor.starts[worker_id] - 1,
+                                                           supervisor.starts[worker_id]))
+
+    def test_backoff_does_not_block_sigterm(self):
+        # the first restart is held back 2 seconds per worker
+        supervisor = CountingSupervisor(exit_now, 2)
+        self.assertLess(self.run_supervisor(supervisor, 0.3), 1.5)
+        self.assertEqual({0: 1, 1: 1}, supervisor.starts)
+        self.assertEqual({0: 1, 1: 1}, supervisor.restarts)
+
+
+if __name__ == '__main__':
+    unittest.main()